@@ -0,0 +1,533 @@
+"""
+Benchmarks of the native python kernels.
+
+python bench.py [name ...]
+Runs the named benchmarks, or all of them if no name is given.
+"""
+import sys, time, random, tracemalloc, bisect, gc
+
+from pmatrix import DMatrix, DVec, set_executor, set_lazy
+from pmatrix.sparse import CSR, CSC, DIA, COO, BSR
+from pmatrix.linalg import lu_factor, cholesky, cho_solve, ldl_factor, cg, bicgstab, gmres, jacobi, ssor, ilu0, splu, spcholesky, analyze_cholesky, qr, lstsq, tsqr
+from pmatrix._core._executor import gil_enabled
+from pmatrix._core._broadcast import CHUNK_SIZE
+
+
+def timed(f, *args, **kwargs):
+    t1 = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - t1
+
+
+def random_dmatrix(shape, seed=69):
+    random.seed(seed)
+    random_data = [random.uniform(0.0, 10.0) for i in range(shape[0] * shape[1])]
+    return DMatrix(random_data).reshape(shape)
+
+
+def classic_matmul(X, Y):
+    # The matmul as it was done before the gemm kernel: one DVec dot product per element.
+    rows = [X.row(i).copy() for i in range(X.shape[0])]
+    cols = [Y.col(j).copy() for j in range(Y.shape[1])]
+    return DMatrix(data=[[row @ col for col in cols] for row in rows], dtype=X.dtype)
+
+
+def bench_gemm(n=500):
+    X = random_dmatrix((n, n))
+    A, t_classic = timed(classic_matmul, X, X.T)
+    B, t_gemm = timed(X.matmul, X.T, method="blocked")
+    err = max(abs(a - b) for a, b in zip(A._flat(), B._flat()))
+    print(f"gemm {n}x{n} @ {n}x{n}: classic {t_classic:.2f} s, gemm {t_gemm:.2f} s, speedup {t_classic / t_gemm:.2f}x, max abs diff {err:.2e}")
+
+
+def bench_strassen(sizes=(256, 512, 1024, 2048)):
+    for n in sizes:
+        X = random_dmatrix((n, n))
+        A, t_blocked = timed(X.matmul, X.T, method="blocked")
+        B, t_strassen = timed(X.matmul, X.T, method="strassen")
+        err = max(abs(a - b) for a, b in zip(A._flat(), B._flat()))
+        print(f"strassen {n}x{n}: blocked {t_blocked:.2f} s, strassen {t_strassen:.2f} s, speedup {t_blocked / t_strassen:.2f}x, max abs diff {err:.2e}")
+
+
+def bench_threads(n=1000, threads=(1, 2, 4, 8)):
+    X = random_dmatrix((n, n))
+    ops = {
+        "X + X": lambda: X + X,
+        "X * 2.0": lambda: X * 2.0,
+        "X.round(3)": lambda: X.round(3),
+        "X.sum()": lambda: X.sum(),
+    }
+    print(f"threads {n}x{n}, GIL {'enabled' if gil_enabled() else 'disabled'}")
+    base = {}
+    for t in threads:
+        set_executor(t)
+        for name, op in ops.items():
+            _, t_op = timed(op)
+            base.setdefault(name, t_op)
+            print(f"  {t} threads {name}: {t_op:.3f} s, speedup {base[name] / t_op:.2f}x")
+    set_executor(None)
+
+
+def bench_lazy(n=1000):
+    A, B, C = random_dmatrix((n, n), 1), random_dmatrix((n, n), 2), random_dmatrix((n, n), 3)
+    expr = lambda: abs(A * 2 + B - C) ** 0.5
+    for lazy in (False, True):
+        set_lazy(lazy)
+        run = (lambda: expr().eval()) if lazy else expr
+        _, t_expr = timed(run)
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"lazy={lazy} abs(A * 2 + B - C) ** 0.5 {n}x{n}: {t_expr:.2f} s, peak memory {peak / 2**20:.1f} MiB")
+    set_lazy(False)
+
+
+def bench_inplace(n=1000):
+    # An element wise result of CHUNK_SIZE python floats in a list, the in-place ops hold about one at a time.
+    chunk = CHUNK_SIZE * (sys.getsizeof(0.0) + 8)
+    A, B = random_dmatrix((n, n), 1), random_dmatrix((n, n), 2)
+    ops = {
+        "A = A + B": lambda: A + B,
+        "A += B": lambda: A.__iadd__(B),
+        "A.add(B, out=A)": lambda: A.add(B, out=A),
+        "A.round(2, out=A)": lambda: A.round(2, out=A),
+    }
+    peaks = {}
+    for name, op in ops.items():
+        _, t_op = timed(op)
+        tracemalloc.start()
+        op()
+        peaks[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name} {n}x{n}: {t_op:.2f} s, peak memory {peaks[name] / 2**10:.0f} KiB, {peaks[name] / chunk:.1f} chunks")
+    assert peaks["A = A + B"] >= n * n * 8, "A + B allocates the result"
+    for name in ("A += B", "A.add(B, out=A)", "A.round(2, out=A)"):
+        assert peaks[name] < 2 * chunk, f"{name} allocates more than one chunk at a time"
+
+
+def random_csr(n, degree, seed=69):
+    # A n x n matrix with degree nonzeros in every row, like the adjacency matrix of a random graph.
+    random.seed(seed)
+    indptr, indices, data = [0], [], []
+    for i in range(n):
+        indices.extend(sorted(random.sample(range(n), degree)))
+        data.extend(random.uniform(0.0, 1.0) for _ in range(degree))
+        indptr.append(len(indices))
+    return CSR._from_compressed(indptr, indices, data, (n, n), float)
+
+
+def svec_matmul(X, Y):
+    # The sparse matmul as it was done before SpGEMM: a merge of every row of X with every column of Y, into a dense matrix.
+    from pmatrix.sparse._svec import SVec
+    rows = [SVec(X.get_row_data(i), dtype=X.dtype, orientation='r', length=X.shape[1]) for i in range(X.shape[0])]
+    cols = [SVec(Y.get_col_data(i), dtype=Y.dtype, orientation='c', length=Y.shape[0]) for i in range(Y.shape[1])]
+    return DMatrix(data=[[row @ col for col in cols] for row in rows], dtype=X.dtype)
+
+
+def bench_spgemm(small=400, large=(10_000, 100_000, 1_000_000), degree=4):
+    X = random_csr(small, degree)
+    A, t_svec = timed(svec_matmul, X, X)
+    B, t_spgemm = timed(X.__matmul__, X)
+    err = max(abs(a - b) for a, b in zip(A._flat(), B.to_dmatrix()._flat()))
+    print(f"spgemm {small}x{small}: svec merge {t_svec:.2f} s, spgemm {t_spgemm:.3f} s, speedup {t_svec / t_spgemm:.0f}x, max abs diff {err:.2e}")
+    for n in large:
+        X = random_csr(n, degree)
+        B, t_spgemm = timed(X.__matmul__, X)
+        print(f"spgemm {n}x{n}, nnz {len(X.data)}: {t_spgemm:.2f} s, nnz of product {len(B.data)}")
+
+
+def svec_matvec(X, v):
+    # The sparse matrix vector product as it was done before matvec: a merge of every row with the vector, into a dense matrix.
+    from pmatrix.sparse._svec import SVec
+    col = SVec(v.get_col_data(0), dtype=v.dtype, orientation='c', length=v.length)
+    rows = [SVec(X.get_row_data(i), dtype=X.dtype, orientation='r', length=X.shape[1]) for i in range(X.shape[0])]
+    return DMatrix(data=[[row @ col] for row in rows], dtype=X.dtype)
+
+
+def bench_spmv(small=2000, n=1_000_000, degree=8):
+    X = random_csr(small, degree)
+    v = DVec([random.uniform(0.0, 1.0) for _ in range(small)])
+    A, t_svec = timed(svec_matvec, X, v)
+    y, t_csr = timed(X.__matmul__, v)
+    err = max(abs(a - b) for a, b in zip(A._flat(), y))
+    print(f"spmv {small}x{small}: svec merge {t_svec:.2f} s, csr gather {t_csr:.4f} s, speedup {t_svec / t_csr:.0f}x, max abs diff {err:.2e}")
+
+    X = random_csr(n, degree)
+    v = DVec([random.uniform(0.0, 1.0) for _ in range(n)])
+    _, t_csr = timed(X.__matmul__, v)
+    Xc = CSC._from_compressed(*X._compressed_as("CSC"), X.shape, X.dtype)
+    _, t_csc = timed(Xc.__matmul__, v)
+    print(f"spmv {n}x{n}, nnz {len(X.data)}: csr gather {t_csr:.2f} s, csc scatter {t_csc:.2f} s")
+    D = DIA((n, n), cons_diags=[(0, 4.0), (-1, -1.0), (1, -1.0)], repeat_diags=[(1000, [1.0, 2.0]), (-1000, [0.5])])
+    _, t_dia = timed(D.__matmul__, v)
+    print(f"spmv {n}x{n}, 5 diagonals: dia sweep {t_dia:.2f} s")
+
+
+def scan_transpose(X):
+    # The transpose as it was done before the counting sort: one scan over all nonzeros per column.
+    t_indptr, t_indices, t_data = [0], [], []
+    for j in range(X.shape[1]):
+        col_d = [(i, d) for i, (ind, d) in enumerate(zip(X.indices, X.data)) if ind == j]
+        t_indptr.append(t_indptr[-1] + len(col_d))
+        t_indices += [bisect.bisect_right(X.indptr, i) - 1 for i, _ in col_d]
+        t_data += [d for _, d in col_d]
+    return CSR._from_compressed(t_indptr, t_indices, t_data, (X.shape[1], X.shape[0]), X.dtype)
+
+
+def bench_transpose(small=2000, n=1_000_000, degree=8):
+    X = random_csr(small, degree)
+    A, t_scan = timed(scan_transpose, X)
+    B, t_sort = timed(X.T)
+    same = (A.indptr, A.indices, A.data) == (B.indptr, B.indices, B.data)
+    print(f"transpose {small}x{small}: column scans {t_scan:.2f} s, counting sort {t_sort:.4f} s, speedup {t_scan / t_sort:.0f}x, identical {same}")
+
+    X = random_csr(n, degree)
+    _, t_sort = timed(X.T)
+    cols = range(0, n, n // 10)
+    _, t_scan = timed(lambda: [X.get_col_data(j) for j in cols])
+    _, t_convert = timed(X.to_csc, cache=True)
+    _, t_cached = timed(lambda: [X.get_col_data(j) for j in cols])
+    print(f"transpose {n}x{n}, nnz {len(X.data)}: counting sort {t_sort:.2f} s, to_csc {t_convert:.2f} s")
+    print(f"10 columns of the csr: scans {t_scan:.2f} s, from the cached csc {t_cached:.5f} s")
+
+
+def bench_sparse_ops(small=2000, n=1_000_000, degree=8):
+    from pmatrix._core._broadcast import elementwise
+    import operator
+    X, Y = random_csr(small, degree, seed=1), random_csr(small, degree, seed=2)
+    A, t_dense = timed(elementwise, operator.__add__, X, Y)
+    B, t_merge = timed(X.__add__, Y)
+    err = max(abs(a - b) for a, b in zip(A._flat(), B.to_dmatrix()._flat()))
+    print(f"add {small}x{small}: dense {t_dense:.2f} s, sparse merge {t_merge:.4f} s, speedup {t_dense / t_merge:.0f}x, max abs diff {err:.2e}")
+
+    X, Y = random_csr(n, degree, seed=1), random_csr(n, degree, seed=2)
+    _, t_add = timed(X.__add__, Y)
+    _, t_mul = timed(X.__mul__, Y)
+    _, t_scale = timed(X.__mul__, 2.5)
+    _, t_cmp = timed(X.__gt__, 0.5)
+    print(f"{n}x{n}, nnz {len(X.data)}: add {t_add:.2f} s, mul {t_mul:.2f} s, scale {t_scale:.2f} s, compare {t_cmp:.2f} s")
+
+
+def fem_triplets(n):
+    # The 2x2 stiffness matrices of the n - 1 linear elements of a 1D mesh, neighbouring elements share a node,
+    # so every diagonal entry but the first and last is given twice.
+    for e in range(n - 1):
+        yield from ((e, e, 1.0), (e, e + 1, -1.0), (e + 1, e, -1.0), (e + 1, e + 1, 1.0))
+
+
+def bench_coo(small=2000, n=1_000_000):
+    D = DMatrix([0.0] * (small * small)).reshape((small, small))
+    for i, j, v in fem_triplets(small):
+        D[i, j] += v
+    A, t_dense = timed(CSR.from_dmatrix, D)
+    B, t_coo = timed(lambda: COO((small, small), fem_triplets(small)).to_csr())
+    same = (A.indptr, A.indices, A.data) == (B.indptr, B.indices, B.data)
+    print(f"assemble {small}x{small}: from_dmatrix {t_dense:.2f} s, coo {t_coo:.4f} s, speedup {t_dense / t_coo:.0f}x, identical {same}")
+
+    C, t_fill = timed(COO, (n, n), fem_triplets(n))
+    X, t_csr = timed(C.to_csr)
+    _, t_csc = timed(C.to_csc)
+    print(f"assemble {n}x{n} from {len(C.data)} triplets: fill {t_fill:.2f} s, to_csr {t_csr:.2f} s, to_csc {t_csc:.2f} s, nnz {len(X.data)}")
+
+
+def bench_getitem(small=2000, n=1_000_000, degree=8):
+    X = random_csr(small, degree)
+    A, t_dense = timed(lambda: CSR.from_dmatrix(X.to_dmatrix()[100:300, 500:1500]))
+    B, t_sparse = timed(X.__getitem__, (slice(100, 300), slice(500, 1500)))
+    same = (A.indptr, A.indices, A.data) == (B.indptr, B.indices, B.data)
+    print(f"block of {small}x{small}: through dmatrix {t_dense:.2f} s, sparse {t_sparse:.5f} s, speedup {t_dense / t_sparse:.0f}x, identical {same}")
+
+    X = random_csr(n, degree)
+    random.seed(3)
+    picked = random.sample(range(n), 1000)
+    _, t_rows = timed(X.__getitem__, slice(n // 4, n // 2))
+    _, t_cols = timed(X.__getitem__, (slice(None), slice(n // 4, n // 2)))
+    _, t_fancy = timed(X.__getitem__, (picked, picked))
+    print(f"{n}x{n}, nnz {len(X.data)}: {n // 4} rows {t_rows:.3f} s, {n // 4} columns {t_cols:.2f} s, 1000 x 1000 fancy {t_fancy:.3f} s")
+
+
+def rows_to_csr(X):
+    # The conversion to CSR as it could be done before DIA.to_csr: one get_row_data per row.
+    indptr, indices, data = [0], [], []
+    for i in range(X.shape[0]):
+        row = X.get_row_data(i)
+        indices.extend(j for j, _ in row)
+        data.extend(d for _, d in row)
+        indptr.append(len(indices))
+    return CSR._from_compressed(indptr, indices, data, X.shape, X.dtype)
+
+
+def bench_dia(small=400, n=1_000_000):
+    def banded(n):
+        return DIA((n, n), cons_diags=[(0, 4.0), (-1, -1.0), (1, -1.0)], repeat_diags=[(7, [1.0, 2.0]), (-7, [0.5, 0.25, 0.125])])
+    X = banded(small)
+    A, t_svec = timed(svec_matmul, X, X)
+    B, t_dia = timed(X.__matmul__, X)
+    err = max(abs(a - b) for a, b in zip(A._flat(), B.to_dmatrix()._flat()))
+    print(f"dia @ dia {small}x{small}: svec merge {t_svec:.2f} s, diagonal sums {t_dia:.4f} s, speedup {t_svec / t_dia:.0f}x, max abs diff {err:.2e}")
+
+    X = banded(n)
+    Y, t_mm = timed(X.__matmul__, X)
+    _, t_add = timed(X.__add__, X)
+    _, t_rows = timed(rows_to_csr, X)
+    _, t_csr = timed(X.to_csr)
+    stored = sum(len(d) if isinstance(d, list) else 1 for d in Y.data)
+    print(f"dia {n}x{n}, 5 diagonals: @ {t_mm:.2f} s ({len(Y.offsets)} diagonals, {stored} stored items), + {t_add:.5f} s")
+    print(f"dia {n}x{n} to csr: per row {t_rows:.2f} s, interleaved diagonals {t_csr:.2f} s")
+
+
+def bench_stencil(n=10_000_000, traced=1_000_000):
+    # A 1D Laplacian stencil applied without materialising its diagonals, memory is traced on a smaller size
+    # because tracing slows down every allocation.
+    def stencil(n):
+        return DIA((n, n), cons_diags=[(0, 2.0), (1, -1.0), (-1, -1.0)])
+    S, x = stencil(traced), DVec([1.0] * traced)
+    tracemalloc.start()
+    S @ x
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"stencil {traced}x{traced} @ x: peak {peak / 2**20:.1f} MiB, the result takes {8 * traced / 2**20:.1f} MiB")
+
+    S, x = stencil(n), DVec([1.0] * n)
+    _, t_mv = timed(S.__matmul__, x)
+    _, t_sum = timed(S.sum, axis=1)
+    _, t_scale = timed(S.__mul__, 0.5)
+    _, t_t = timed(S.T)
+    _, t_rows = timed(lambda: sum(len(row) for row in S.iter_rows()))
+    print(f"stencil {n}x{n}: @ x {t_mv:.2f} s, row sums {t_sum:.2f} s, scale {t_scale:.6f} s, transpose {t_t:.6f} s, streaming all rows {t_rows:.2f} s")
+
+
+class TupleSVec:
+    # The sparse vector as it was before the index and value buffers: a list of (index, value) tuples,
+    # with the dot product summed over an intermediate product vector.
+    def __init__(self, data, length):
+        self.data, self.length = data, length
+
+    def __mul__(self, other):
+        i, j, opp_list = 0, 0, []
+        while i < len(self.data) and j < len(other.data):
+            if self.data[i][0] == other.data[j][0]:
+                opp_list.append((self.data[i][0], self.data[i][1] * other.data[j][1]))
+                i += 1
+                j += 1
+            elif self.data[i][0] > other.data[j][0]:
+                j += 1
+            else:
+                i += 1
+        return TupleSVec(opp_list, self.length)
+
+    def __matmul__(self, other):
+        return sum([d[1] for d in (self * other).data])
+
+
+def random_svec_data(n, nnz, seed):
+    random.seed(seed)
+    return [(i, random.uniform(0.0, 1.0)) for i in sorted(random.sample(range(n), nnz))]
+
+
+def bench_svec(n=10_000_000, dense_nnz=1_000_000, sparse_nnz=1000):
+    from pmatrix.sparse._svec import SVec
+    a, b, c = random_svec_data(n, dense_nnz, 1), random_svec_data(n, dense_nnz, 2), random_svec_data(n, sparse_nnz, 3)
+
+    tracemalloc.start()
+    A_tuple = TupleSVec(random_svec_data(n, dense_nnz, 1), n)
+    tuple_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tracemalloc.start()
+    A = SVec._from_parts([i for i, _ in a], [v for _, v in a], float, 'r', n)
+    array_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"svec with {dense_nnz} nonzeros: tuples {tuple_bytes / dense_nnz:.0f} bytes per nonzero, arrays {array_bytes / dense_nnz:.0f} bytes per nonzero")
+
+    B_tuple, C_tuple = TupleSVec(b, n), TupleSVec(c, n)
+    B, C = SVec(b, length=n), SVec(c, length=n)
+    ref, t_tuple = timed(A_tuple.__matmul__, B_tuple)
+    dot, t_array = timed(A.__matmul__, B)
+    print(f"dot {dense_nnz} . {dense_nnz} nonzeros: tuples {t_tuple:.2f} s, arrays merge {t_array:.2f} s, speedup {t_tuple / t_array:.1f}x, diff {abs(ref - dot):.1e}")
+    ref, t_tuple = timed(C_tuple.__matmul__, A_tuple)
+    dot, t_array = timed(C.__matmul__, A)
+    print(f"dot {sparse_nnz} . {dense_nnz} nonzeros: tuples {t_tuple:.3f} s, arrays galloping {t_array:.5f} s, speedup {t_tuple / t_array:.0f}x, diff {abs(ref - dot):.1e}")
+
+
+def block_fem_csr(g, dofs=3, seed=69):
+    # The stiffness matrix of a g x g grid of nodes with dofs unknowns each: every node couples all its unknowns
+    # with those of itself and its 4 neighbours, a dense dofs x dofs block per pair of nodes.
+    random.seed(seed)
+    rows, cols, values = [], [], []
+    for node in range(g * g):
+        i, j = divmod(node, g)
+        for other in [node] + [(a * g + b) for a, b in ((i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)) if 0 <= a < g and 0 <= b < g]:
+            for u in range(dofs):
+                for v in range(dofs):
+                    rows.append(node * dofs + u)
+                    cols.append(other * dofs + v)
+                    values.append(random.uniform(-1.0, 1.0))
+    C = COO((g * g * dofs, g * g * dofs))
+    C.extend_arrays(rows, cols, values)
+    return C.to_csr()
+
+
+def bench_bsr(small=20, g=300, dofs=3):
+    X = block_fem_csr(small, dofs)
+    B = BSR.from_csr(X, (dofs, dofs))
+    P_csr, t_csr = timed(X.__matmul__, X)
+    P_bsr, t_bsr = timed(B.__matmul__, B)
+    diff = max(abs(a - b) for a, b in zip(P_csr.to_dmatrix()._flat(), P_bsr.to_dmatrix()._flat()))
+    print(f"spgemm {X.shape[0]}x{X.shape[0]}, nnz {len(X.data)}: csr {t_csr:.2f} s, bsr {t_bsr:.2f} s, speedup {t_csr / t_bsr:.1f}x, diff {diff:.1e}")
+
+    X = block_fem_csr(g, dofs)
+    n = X.shape[0]
+    B, t_convert = timed(BSR.from_csr, X, (dofs, dofs))
+    x = DVec([random.uniform(-1.0, 1.0) for _ in range(n)])
+    # A full collection of everything built above would otherwise land in whichever product runs first.
+    gc.collect()
+    y_csr, t_csr = timed(X.__matmul__, x)
+    y_bsr, t_bsr = timed(B.__matmul__, x)
+    diff = max(abs(a - b) for a, b in zip(y_csr.data, y_bsr.data))
+    print(f"spmv {n}x{n}, nnz {len(X.data)}, {B.nnzb} blocks: csr {t_csr:.2f} s, bsr {t_bsr:.2f} s, speedup {t_csr / t_bsr:.1f}x, diff {diff:.1e}, from_csr {t_convert:.2f} s")
+    print(f"index entries: csr {len(X.indices) + len(X.indptr)}, bsr {len(B.indices) + len(B.indptr)}")
+
+
+def bench_lu(n=400, solves=10):
+    A = random_dmatrix((n, n))
+    _, t_unblocked = timed(lu_factor, A, n)
+    F, t_blocked = timed(lu_factor, A)
+    print(f"lu {n}x{n}: unblocked {t_unblocked:.2f} s, blocked {t_blocked:.2f} s, speedup {t_unblocked / t_blocked:.1f}x")
+    random.seed(7)
+    rhs = [DVec([random.uniform(-1.0, 1.0) for _ in range(n)]) for _ in range(solves)]
+    _, t_fresh = timed(lambda: [lu_factor(A).solve(b) for b in rhs])
+    xs, t_reuse = timed(lambda: [F.solve(b) for b in rhs])
+    residual = max(abs(r - v) for x, b in zip(xs, rhs) for r, v in zip((A @ x)._flat(), b.data))
+    print(f"{solves} solves: factorizing every time {t_fresh:.2f} s, reusing the factor {t_reuse:.3f} s, speedup {t_fresh / t_reuse:.0f}x, residual {residual:.1e}")
+
+
+def bench_cholesky(n=400):
+    # The normal equations X @ X.T of test.py, symmetric positive definite.
+    X = random_dmatrix((n, n))
+    A = X @ X.T
+    F, t_lu = timed(lu_factor, A)
+    C, t_chol = timed(cholesky, A)
+    _, t_ldl = timed(ldl_factor, A)
+    print(f"factorize {n}x{n}: lu {t_lu:.2f} s ({2 * n**3 / 3:.1e} flops), cholesky {t_chol:.2f} s ({n**3 / 3:.1e} flops), "
+          f"ldl {t_ldl:.2f} s, cholesky speedup {t_lu / t_chol:.1f}x")
+    b = DVec([1.0] * n)
+    x_lu, t_lu = timed(F.solve, b)
+    x_chol, t_chol = timed(cho_solve, C, b)
+    diff = max(abs(u - v) for u, v in zip(x_lu.data, x_chol.data))
+    print(f"solve: lu {t_lu:.3f} s, cho_solve {t_chol:.3f} s, diff {diff:.1e}")
+
+
+def bench_krylov(g=150, matvecs=50):
+    # The 5-point stencil of a g x g grid with a varying diagonal, symmetric positive definite.
+    n = g * g
+    A = DIA((n, n), cons_diags=[(1, -1.0), (-1, -1.0), (g, -1.0), (-g, -1.0)], repeat_diags=[(0, [4.0 + 0.5 * (i % 7) for i in range(7)])]).to_csr()
+    b = DVec([1.0] * n, orientation='c')
+    x = DVec([0.5] * n, orientation='c')
+    out = DVec([0.0] * n, orientation='c')
+    gc.collect()
+    _, t_new = timed(lambda: [A.matvec(x) for _ in range(matvecs)])
+    _, t_out = timed(lambda: [A.matvec(x, out=out) for _ in range(matvecs)])
+    tracemalloc.start()
+    A.matvec(x)
+    _, peak_new = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    A.matvec(x, out=out)
+    _, peak_out = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{matvecs} matvecs n={n}: new vector {t_new:.2f} s (peak {peak_new / 1e6:.1f} MB), out= {t_out:.2f} s (peak {peak_out / 1e6:.2f} MB)")
+    for name, make in (("none", None), ("jacobi", jacobi), ("ssor", ssor), ("ilu0", ilu0)):
+        M, t_setup = timed(make, A) if make else (None, 0.0)
+        for solver in (cg, bicgstab, gmres):
+            iterations = []
+            (_, info), t = timed(solver, A, b, tol=1e-8, M=M, callback=lambda k, r: iterations.append(k))
+            print(f"{solver.__name__:>8} M={name:<6}: {len(iterations):4d} iterations, {t:.2f} s (setup {t_setup:.2f} s), info {info}")
+
+
+def laplacian_2d(g):
+    n = g * g
+    # The +-1 diagonals couple the ends of neighbouring grid rows too, which keeps the matrix positive definite.
+    return DIA((n, n), cons_diags=[(0, 4.0), (1, -1.0), (-1, -1.0), (g, -1.0), (-g, -1.0)]).to_csc()
+
+
+def bench_sparse_direct(small=20, g=100):
+    A = laplacian_2d(small)
+    n = small * small
+    b = DVec([1.0] * n, orientation='c')
+    D = A.to_dmatrix()
+    F, t_dense = timed(lu_factor, D)
+    S, t_sparse = timed(spcholesky, A)
+    diff = max(abs(u - v) for u, v in zip(F.solve(b).data, S.solve(b).data))
+    print(f"n={n}: dense lu_factor {t_dense:.2f} s ({n * n} stored), spcholesky {t_sparse:.3f} s ({S.nnz} in L), diff {diff:.1e}")
+    A = laplacian_2d(g)
+    n = g * g
+    b = DVec([1.0] * n, orientation='c')
+    for ordering in ("natural", "amd"):
+        S, t_chol = timed(spcholesky, A, ordering)
+        U, t_lu = timed(splu, A, "amd_symmetric" if ordering == "amd" else ordering)
+        print(f"n={n} {ordering:>7}: spcholesky {t_chol:.2f} s, nnz(L) {S.nnz}, splu {t_lu:.2f} s, nnz(L + U) {U.nnz}")
+    symbolic, t_analyze = timed(analyze_cholesky, A)
+    A2 = A * 2.0
+    _, t_numeric = timed(spcholesky, A2, symbolic=symbolic)
+    x, t_solve = timed(S.solve, b)
+    print(f"analysis {t_analyze:.2f} s, refactor with the analysis {t_numeric:.2f} s, solve {t_solve:.3f} s")
+
+
+def bench_qr(m=20_000, n=12, chunk=2_000, square=200):
+    # A polynomial fit on [0, 1] with all coefficients 1, its monomial columns are nearly dependent.
+    rows = [[(i / (m - 1)) ** j for j in range(n)] for i in range(m)]
+    y = [sum(row) for row in rows]
+    X = DMatrix(rows)
+    (x, _), t_qr = timed(lstsq, X, DVec(y, orientation='c'))
+    try:
+        z = cho_solve(cholesky(X.T @ X), X.T @ DMatrix([[v] for v in y]))
+        error_ne = f"{max(abs(r[0] - 1.0) for r in z.tolist()):.1e}"
+    except ValueError as e:
+        error_ne = f"failed, {e}"
+    print(f"lstsq {m}x{n}: {t_qr:.2f} s, coefficient error {max(abs(u - 1.0) for u in x.data):.1e}, normal equations error {error_ne}")
+    chunks = lambda: ((DMatrix(rows[i:i + chunk]), DVec(y[i:i + chunk], orientation='c')) for i in range(0, m, chunk))
+    factor, t_ts = timed(tsqr, chunks())
+    x_ts, _ = factor.lstsq()
+    # Peak memory of the factorizations alone, the chunks are made while they are read.
+    del X
+    gc.collect()
+    tracemalloc.start()
+    lstsq(DMatrix(rows), DVec(y, orientation='c'))
+    _, peak_full = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    tsqr(chunks())
+    _, peak_ts = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"tsqr in chunks of {chunk}: {t_ts:.2f} s, coefficient error {max(abs(u - 1.0) for u in x_ts.data):.1e}, "
+          f"peak {peak_ts / 1e6:.1f} MB, lstsq of the whole matrix {peak_full / 1e6:.1f} MB")
+    A = random_dmatrix((square, square))
+    _, t_blocked = timed(qr, A, "r")
+    _, t_unblocked = timed(qr, A, "r", 1)
+    print(f"qr {square}x{square} r mode: blocked {t_blocked:.2f} s, unblocked {t_unblocked:.2f} s")
+
+BENCHMARKS = {
+    "gemm": bench_gemm,
+    "strassen": bench_strassen,
+    "threads": bench_threads,
+    "lazy": bench_lazy,
+    "inplace": bench_inplace,
+    "spgemm": bench_spgemm,
+    "spmv": bench_spmv,
+    "transpose": bench_transpose,
+    "sparse_ops": bench_sparse_ops,
+    "coo": bench_coo,
+    "getitem": bench_getitem,
+    "dia": bench_dia,
+    "stencil": bench_stencil,
+    "svec": bench_svec,
+    "bsr": bench_bsr,
+    "lu": bench_lu,
+    "cholesky": bench_cholesky,
+    "krylov": bench_krylov,
+    "sparse_direct": bench_sparse_direct,
+    "qr": bench_qr,
+}
+
+if __name__=="__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
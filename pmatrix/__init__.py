@@ -9,7 +9,7 @@ submodules = ["sparse" , "linalg"]
 
 def __getattr__(name):
     if name in submodules:
-        return _importlib.import_module(f'PMatrix.{name}')
+        return _importlib.import_module(f'{__name__}.{name}')
     else:
         raise AttributeError(
             f"Module 'PMatrix' has no attribute '{name}'"
@@ -1,4 +1,8 @@
 from ._dmatrix import DMatrix
 from ._dvec import DVec
+from ._storage import set_storage, get_storage
+from ._parallel import set_parallel, get_parallel
+from ._executor import set_executor, get_executor
+from ._lazy import set_lazy, get_lazy
 
-__all__ = ["DMatrix", "DVec"]
\ No newline at end of file
+__all__ = ["DMatrix", "DVec", "set_storage", "get_storage", "set_parallel", "get_parallel", "set_executor", "get_executor", "set_lazy", "get_lazy"]
\ No newline at end of file
@@ -0,0 +1,232 @@
+"""
+Broadcasting of element wise operations over DVec, DMatrix and the sparse matrices.
+
+Every operand has a 2D shape: a DMatrix or sparse matrix its own, a row vector (1, m)
+and a column vector (n, 1). The result has the largest size along each axis, every
+operand must have that size or size 1 along it. So a (n, 1) column and a (1, m) row
+give a (n, m) result, and a scalar goes with any shape.
+A DVec and a vector shaped operand with the same number of elements are matched element by
+element whatever their orientation, and a DVec that does not fit in its own orientation is tried
+transposed. Two DVecs of the same length give a DVec.
+
+An operand is read through a leaf, a function leaf(start, stop) that returns an iterator
+over the elements start:stop of the operand broadcast to the result, counted row by row.
+Scalars, rows and columns are repeated by itertools and never expanded, sparse matrices are
+made dense one row at a time. All leaves are consumed by a single map, so the result is
+computed in one pass.
+"""
+
+import itertools
+
+from ._storage import cast_buffer, stream_buffer
+from ._executor import map_chunks, runs_serial
+
+# Number of elements that are computed and written at once by the in-place operators and out=.
+CHUNK_SIZE = 4096
+
+
+def _is_scalar(x):
+    return isinstance(x, (int, float, complex, bool))
+
+
+def rsub(a, b):
+    return b - a
+
+
+def rtruediv(a, b):
+    return b / a
+
+
+def rmod(a, b):
+    return b % a
+
+
+def rpow(a, b):
+    return b ** a
+
+
+def flat_leaf(flat):
+    # The elements start:stop of a flat buffer.
+    size = len(flat)
+    def leaf(start, stop):
+        return iter(flat) if start == 0 and stop == size else iter(flat[start:stop])
+    return leaf
+
+
+def scalar_leaf(value):
+    def leaf(start, stop):
+        return itertools.repeat(value, stop - start)
+    return leaf
+
+
+def row_leaf(o_data, m):
+    # A row vector repeated for every row of a matrix with m columns, without expanding it.
+    def leaf(start, stop):
+        return itertools.islice(itertools.cycle(o_data), start % m, start % m + stop - start)
+    return leaf
+
+
+def col_leaf(o_data, m):
+    # Every item of a column vector repeated m times, once per column of its row, without expanding it.
+    def leaf(start, stop):
+        i0 = start // m
+        items = itertools.chain.from_iterable(map(itertools.repeat, itertools.islice(o_data, i0, None), itertools.repeat(m)))
+        return itertools.islice(items, start - i0 * m, stop - i0 * m)
+    return leaf
+
+
+def sparse_leaf(matrix):
+    # The rows of a sparse matrix, every row is made dense only while it is read.
+    m = matrix.shape[1]
+    zero = matrix.dtype(0)
+    def dense_row(i):
+        row = [zero] * m
+        for j, d in matrix.get_row_data(i):
+            row[j] = d
+        return row
+    def leaf(start, stop):
+        i0 = start // m
+        items = itertools.chain.from_iterable(map(dense_row, range(i0, (stop - 1) // m + 1)))
+        return itertools.islice(items, start - i0 * m, stop - i0 * m)
+    return leaf
+
+
+def _kind(x):
+    # 'scalar', 'dvec', 'dmat', 'sparse', or None for unsupported operands. Lazy expressions count as what they evaluate to.
+    if _is_scalar(x):
+        return "scalar"
+    fmt = getattr(x, "_format", None)
+    if fmt == "lazy":
+        return "dvec" if x._is_vector() else "dmat"
+    if fmt in ("dvec", "dmat"):
+        return fmt
+    if fmt is not None and hasattr(x, "get_row_data") and hasattr(x, "shape"):
+        return "sparse"
+    return None
+
+
+def _shape(x, kind, flip=False):
+    if kind == "scalar":
+        return (1, 1)
+    if kind == "dvec":
+        return (1, x.length) if (x.orientation == 'r') != flip else (x.length, 1)
+    return tuple(x.shape)
+
+
+def _broadcast_shapes(shapes):
+    n, m = max(s[0] for s in shapes), max(s[1] for s in shapes)
+    if any(s[0] not in (1, n) or s[1] not in (1, m) for s in shapes):
+        return None
+    return n, m
+
+
+def _flat(x, kind):
+    # The elements of a non scalar operand as a flat row by row buffer.
+    if kind == "sparse":
+        return list(sparse_leaf(x)(0, x.shape[0] * x.shape[1]))
+    if getattr(x, "_format", None) == "lazy":
+        x = x.eval()
+    return x._items() if kind == "dvec" else x._flat()
+
+
+def _leaf(x, kind, shape, result):
+    # The leaf of an operand with the given shape, broadcast to the result shape.
+    if kind == "scalar":
+        return scalar_leaf(x)
+    if shape == result:
+        if getattr(x, "_format", None) == "lazy":
+            return x._iter
+        if kind == "sparse":
+            return sparse_leaf(x)
+        return flat_leaf(_flat(x, kind))
+    flat = _flat(x, kind)
+    if shape == (1, 1):
+        return scalar_leaf(flat[0])
+    if shape[0] == 1 and result[0] != 1:
+        return row_leaf(flat, result[1])
+    if shape[1] == 1 and result[1] != 1:
+        return col_leaf(flat, result[1])
+    # A vector shaped operand with as many elements as the result.
+    return flat_leaf(flat)
+
+
+def broadcast(operands):
+    """
+    broadcast(operands)
+    Broadcasts the operands of an element wise operation, where operands[0] is the
+    DVec, DMatrix, sparse matrix or LazyExpr the operation is done on.
+
+    Returns
+    -------
+    (shape, orientation, leaves)
+        shape is (length,) with the orientation of operands[0] for a vector result, else (n, m) with orientation None.
+    None
+        If one of the operands is not supported.
+    """
+    kinds = [_kind(x) for x in operands]
+    if None in kinds:
+        return None
+    target = operands[0]
+
+    if kinds[0] == "dvec" and all(k == "scalar" or k == "dvec" and x.length == target.length for x, k in zip(operands, kinds)):
+        shape = (target.length, 1)
+        leaves = [_leaf(x, k, _shape(x, k) if k == "scalar" else shape, shape) for x, k in zip(operands, kinds)]
+        return (target.length,), target.orientation, leaves
+
+    shapes = [_shape(x, k) for x, k in zip(operands, kinds)]
+    result = shapes[0]
+    size = result[0] * result[1]
+    if 1 in result and all(k == "scalar" or s == result or "dvec" in (k, kinds[0]) and 1 in s and s[0] * s[1] == size for s, k in zip(shapes, kinds)):
+        # A DVec and a vector shaped operand of the same size, matched element by element.
+        shapes = [s if k == "scalar" else result for s, k in zip(shapes, kinds)]
+    else:
+        result = _broadcast_shapes(shapes)
+        if result is None and "dvec" in kinds:
+            flipped = [_shape(x, k, flip=True) for x, k in zip(operands, kinds)]
+            result = _broadcast_shapes(flipped)
+            shapes = flipped
+        if result is None: raise ValueError(f"Can not broadcast shapes {' and '.join(str(_shape(x, k)) for x, k in zip(operands, kinds) if k != 'scalar')} together")
+    return result, None, [_leaf(x, k, s, result) for x, k, s in zip(operands, kinds, shapes)]
+
+
+def evaluate(opp, leaves, size):
+    """
+    evaluate(opp, leaves, size)
+    Computes opp element wise over the leaves in one pass.
+    Returns the buffer of results and its dtype, which is the type of the first result.
+    """
+    if runs_serial(size):
+        return stream_buffer(map(opp, *[leaf(0, size) for leaf in leaves]))
+    opp_data = map_chunks(lambda start, stop: list(map(opp, *[leaf(start, stop) for leaf in leaves])), size)
+    dtype = type(opp_data[0])
+    return cast_buffer(opp_data, dtype), dtype
+
+
+def elementwise(opp, *operands):
+    """
+    elementwise(opp, *operands)
+    opp(*operands) element wise with broadcasting, as a new DVec or DMatrix.
+    Returns NotImplemented if one of the operands is not supported.
+    """
+    from ._dvec import DVec
+    from ._dmatrix import DMatrix
+    operands = broadcast(operands)
+    if operands is None:
+        return NotImplemented
+    shape, orientation, leaves = operands
+    if len(shape) == 1:
+        buf, dtype = evaluate(opp, leaves, shape[0])
+        return DVec._from_buffer(buf, dtype, orientation)
+    buf, dtype = evaluate(opp, leaves, shape[0] * shape[1])
+    return DMatrix._from_buffer(buf, shape, dtype)
+
+
+def apply_into(opp, leaves, size, step, write):
+    """
+    apply_into(opp, leaves, size, step, write)
+    Computes opp element wise over the leaves, step elements at a time,
+    and hands every chunk to write(start, stop, items). Only one chunk of results exists at a time.
+    """
+    for start in range(0, size, step):
+        stop = min(start + step, size)
+        write(start, stop, map(opp, *[leaf(start, stop) for leaf in leaves]))
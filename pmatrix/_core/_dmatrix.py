@@ -1,7 +1,13 @@
 from __future__ import annotations
 from ._logiccore import LogicCore
 from ._dvec import DVec
-import operator, functools, itertools, copy
+from ._storage import cast_buffer, empty_like, chain_buffers, strided_slice, store_into
+from . import _gemm
+from ._parallel import parallel_matmul, use_parallel
+from ._executor import map_elements, map_rows, sum_elements
+from ._lazy import get_lazy, lazy_operator
+from ._broadcast import CHUNK_SIZE, broadcast, elementwise, apply_into, rsub, rtruediv, rmod, rpow
+import array, operator, functools, itertools
 
 class DMatrix(LogicCore):
     """
@@ -9,10 +15,10 @@ class DMatrix(LogicCore):
     To initialize a matrix:
 
     DVec(data, [dtype=None])
-    
+
     Parameters
     ----------
-    data : 
+    data :
         List((int, float, complex)),
             A single list will be a column vector.
         List(List((int, float, complex))),
@@ -31,8 +37,15 @@ class DMatrix(LogicCore):
     -------
     X : DMatrix
 
-    DVec is at its core a simple python list of DVecs, 
-    the matrix allows some element wise unary operators:
+    DMatrix is at its core one flat buffer with a shape and strides,
+    element (i, j) is stored at buffer[offset + i * strides[0] + j * strides[1]].
+    Rows and columns are strided views on this buffer, so transposing
+    and changing the orientation only swap the strides.
+    The transpose, slices, row and column selections and reshapes are views
+    that share the buffer, until one of them is written to, then the written
+    matrix copies its elements first (copy-on-write).
+    Use DMatrix.copy() for an explicit copy.
+    The matrix allows some element wise unary operators:
         subtraction (-)
         muliplication (*)
         division (/)
@@ -47,8 +60,10 @@ class DMatrix(LogicCore):
 
     The matrix supports some fancy printing by print(DVec)
     """
+    __slots__ = ("_buf", "_offset", "_strides", "_share", "shape", "dtype", "__weakref__")
+    _format = "dmat"
+
     def __init__(self, data=None, dtype=None):
-        self._format = "dmat"
         if data is None:
             return
 
@@ -56,83 +71,189 @@ class DMatrix(LogicCore):
             self._from_dvec(data)
             return
 
-        elif not isinstance(data, list): 
+        elif not isinstance(data, list):
             raise ValueError("Can only make a dense matrix from list or DVec")
-        
+
         elif isinstance(data[0], DVec):
             self._from_dvecs(data)
             return
 
         else:
             self._from_data(data, dtype)
-    
+
+    @classmethod
+    def _from_buffer(cls, buf, shape, dtype, strides=None, offset=0) -> DMatrix:
+        """
+        Wraps a flat buffer without casting or copying it,
+        by default the buffer is read row by row.
+        """
+        new = cls.__new__(cls)
+        new._buf = buf
+        new._offset = offset
+        new._share = None
+        new._strides = (shape[1], 1) if strides is None else strides
+        new.shape = shape
+        new.dtype = dtype
+        return new
+
     def _from_data(self, data, dtype=None):
         # Column vector
-        if not isinstance(data[0], list): 
-            self.shape = (len(data), 1)
-            self.data = DVec(data, dtype=dtype, orientation='c')
+        if not isinstance(data[0], list):
+            vec = DVec(data, dtype=dtype, orientation='c')
+            self._set_layout(vec._buf, (vec.length, 1), vec.dtype)
             return
-        
+
         cols = len(data[0])
         rows = len(data)
 
         # Row vector
         if rows == 1:
-            self.data = DVec(data[0], orientation='r')
-            self.shape = (len(data[0]), 1)
+            vec = DVec(data[0], dtype=dtype, orientation='r')
+            self._set_layout(vec._buf, (1, cols), vec.dtype)
             return
 
         # Col vector
         if cols == 1:
-            self.data = DVec([d[0] for d in data], orientation='c')
-            self.shape = (rows, 1)
+            vec = DVec([d[0] for d in data], dtype=dtype, orientation='c')
+            self._set_layout(vec._buf, (rows, 1), vec.dtype)
             return
-        
+
         # 2D vector
-        self.data = [DVec(d, dtype=dtype, orientation='r') for d in data]
-        self.shape = (rows, cols)
-        if len(set([vec.dtype for vec in self.data])) != 1: raise ValueError(f"Inconsistent dtypes found: {set([vec.dtype.__name__ for vec in self.data])}")
-        if any([vec.length != self.shape[1] for vec in self.data]): raise ValueError(f"""The following rows do not have length {self.shape[1]}: \n{", ".join([f'row {i} with length {vec.length}' for i, vec in enumerate(self.data) if vec.length != self.shape[1]])}""")
+        vecs = [DVec(d, dtype=dtype, orientation='r') for d in data]
+        if len(set([vec.dtype for vec in vecs])) != 1: raise ValueError(f"Inconsistent dtypes found: {set([vec.dtype.__name__ for vec in vecs])}")
+        if any([vec.length != cols for vec in vecs]): raise ValueError(f"""The following rows do not have length {cols}: \n{", ".join([f'row {i} with length {vec.length}' for i, vec in enumerate(vecs) if vec.length != cols])}""")
+        self._set_layout(self._stack([vec._buf for vec in vecs], cols, vecs[0].dtype), (rows, cols), vecs[0].dtype)
 
     def _from_dvec(self, dvec):
         if not isinstance(dvec, DVec): raise TypeError("Not DVec type")
-        self.data = dvec
         if dvec.orientation == 'c':
-            self.shape = (dvec.length, 1)
+            self._set_layout(dvec._buf, (dvec.length, 1), dvec.dtype, (dvec._stride, 1), dvec._offset)
         else:
-            self.shape = (1, dvec.length)
+            self._set_layout(dvec._buf, (1, dvec.length), dvec.dtype, (1, dvec._stride), dvec._offset)
+        dvec._share_buf(self)
 
     def _from_dvecs(self, dvecs):
         if not isinstance(dvecs, list):
             raise TypeError("Can only initiate from a list of DVecs")
         if any([not isinstance(vec, DVec) for vec in dvecs]):
             raise TypeError("Not a list of DVecs")
-        
-        self.data = dvecs
-        if len(set([vec.dtype for vec in self.data])) != 1: raise ValueError(f"Inconsistent dtypes found: {set([vec.dtype.__name__ for vec in self.data])}")
-        if any([vec.length != self.data[0].length for vec in self.data]): raise ValueError(f"""The following DVecs do not have length {self.data[0].length}: \n{", ".join([f'row {i} with length {vec.length}' for i, vec in enumerate(self.data) if vec.length != self.data[0].length])}""")
-        
-        for vec in self.data:
-            vec.orientation = self.orientation
-
-        if self.orientation == 'r':
-            self.shape = (len(self.data), self.data[0].length)
+
+        if len(set([vec.dtype for vec in dvecs])) != 1: raise ValueError(f"Inconsistent dtypes found: {set([vec.dtype.__name__ for vec in dvecs])}")
+        if any([vec.length != dvecs[0].length for vec in dvecs]): raise ValueError(f"""The following DVecs do not have length {dvecs[0].length}: \n{", ".join([f'row {i} with length {vec.length}' for i, vec in enumerate(dvecs) if vec.length != dvecs[0].length])}""")
+
+        length = dvecs[0].length
+        buf = self._stack([vec._items() for vec in dvecs], length, dvecs[0].dtype)
+        if dvecs[0].orientation == 'r':
+            self._set_layout(buf, (len(dvecs), length), dvecs[0].dtype)
         else:
-            self.shape = (self.data[0].length, len(self.data))
+            self._set_layout(buf, (length, len(dvecs)), dvecs[0].dtype, (1, length))
 
-        self._fix_split_vector()
-        
-    @property
-    def dtype(self):
-        if isinstance(self.data, DVec):
-            return self.data.dtype
-        return self.data[0].dtype        
+    def _set_layout(self, buf, shape, dtype, strides=None, offset=0):
+        self._leave_share()
+        self._buf = buf
+        self._offset = offset
+        self._strides = (shape[1], 1) if strides is None else strides
+        self.shape = shape
+        self.dtype = dtype
+
+    @staticmethod
+    def _stack(bufs, length, dtype):
+        # Copies equally long buffers one after another into a new flat buffer.
+        if any(type(buf) is not type(bufs[0]) for buf in bufs) or isinstance(bufs[0], tuple):
+            return chain_buffers(bufs, dtype)
+        out = empty_like(bufs[0], len(bufs) * length)
+        for i, buf in enumerate(bufs):
+            out[i * length: (i + 1) * length] = buf
+        return out
 
     @property
     def orientation(self):
-        if isinstance(self.data, DVec):
-            return self.data.orientation
-        return self.data[0].orientation
+        """
+        DMatrix.orientation
+        'r' if the rows are the contiguous axis of the buffer, else 'c'.
+        """
+        if self.shape[0] == 1:
+            return 'r'
+        if self.shape[1] == 1:
+            return 'c'
+        return 'r' if abs(self._strides[1]) <= abs(self._strides[0]) else 'c'
+
+    def _row_slice(self, row_i):
+        return strided_slice(self._offset + row_i * self._strides[0], self._strides[1], self.shape[1])
+
+    def _col_slice(self, col_i):
+        return strided_slice(self._offset + col_i * self._strides[1], self._strides[0], self.shape[0])
+
+    def _is_contiguous(self, order='r'):
+        n, m = self.shape
+        if len(self._buf) != n * m or self._offset != 0:
+            return False
+        if order == 'r':
+            return (m == 1 or self._strides[1] == 1) and (n == 1 or self._strides[0] == m)
+        return (n == 1 or self._strides[0] == 1) and (m == 1 or self._strides[1] == n)
+
+    def _flat(self, order='r'):
+        """
+        The elements as one flat buffer, read row by row ('r') or column by column ('c').
+        This is the buffer itself when it is already laid out in that order.
+        """
+        if self._is_contiguous(order):
+            return self._buf
+        n, m = self.shape
+        out = empty_like(self._buf, n * m)
+        if order == 'r':
+            if n <= m:
+                for i in range(n):
+                    out[i * m: (i + 1) * m] = self._buf[self._row_slice(i)]
+            else:
+                for j in range(m):
+                    out[j::m] = self._buf[self._col_slice(j)]
+        else:
+            if m <= n:
+                for j in range(m):
+                    out[j * n: (j + 1) * n] = self._buf[self._col_slice(j)]
+            else:
+                for i in range(n):
+                    out[i::n] = self._buf[self._row_slice(i)]
+        return out
+
+    def _rows(self):
+        """
+        The rows as a list of flat buffers.
+        """
+        return [self._buf[self._row_slice(i)] for i in range(self.shape[0])]
+
+    def _cols(self):
+        """
+        The columns as a list of flat buffers.
+        """
+        return [self._buf[self._col_slice(j)] for j in range(self.shape[1])]
+
+    def row(self, row_i) -> DVec:
+        """
+        DMatrix.row(row_i)
+        The i'th row as a row DVec, which is a (copy-on-write) view on the matrix buffer.
+        """
+        if row_i < 0:
+            row_i += self.shape[0]
+        if not 0 <= row_i < self.shape[0]: raise IndexError(f"Row {row_i} out of range for matrix with {self.shape[0]} rows")
+        return self._share_buf(DVec._from_buffer(self._buf, self.dtype, 'r', self._offset + row_i * self._strides[0], self._strides[1], self.shape[1]))
+
+    def col(self, col_i) -> DVec:
+        """
+        DMatrix.col(col_i)
+        The i'th column as a column DVec, which is a (copy-on-write) view on the matrix buffer.
+        """
+        if col_i < 0:
+            col_i += self.shape[1]
+        if not 0 <= col_i < self.shape[1]: raise IndexError(f"Column {col_i} out of range for matrix with {self.shape[1]} columns")
+        return self._share_buf(DVec._from_buffer(self._buf, self.dtype, 'c', self._offset + col_i * self._strides[1], self._strides[0], self.shape[0]))
+
+    def _as_dvec(self) -> DVec:
+        # A vector shaped matrix as a DVec view.
+        if self.shape[0] == 1:
+            return self.row(0)
+        return self.col(0)
 
     def index(self, a):
         """
@@ -148,190 +269,352 @@ class DMatrix(LogicCore):
         --------
         If the matrix is 2D:
             (x,y) with the index of the first match,
-            note that the search patern depends on 
-            the orientation, where the orientation
-            is searched first.
+            the rows are searched one by one.
         If the matrix is 1D:
             x the index of the first match
         """
-        if isinstance(self.data, DVec):
-            return self.data.index(a)
+        if 1 in self.shape:
+            return self._as_dvec().index(a)
 
-        for vec_i, vec in enumerate(self.data):
+        for row_i, row in enumerate(self._rows()):
             try:
-                vec_j = vec.index(a)
-                if self.orientation == 'r':
-                    return vec_i, vec_j
-                return vec_j, vec_i
+                return row_i, row.index(a)
             except ValueError:
                 continue
         raise ValueError(f"{a} not in matrix")
 
     def __getitem__(self, key) -> DMatrix:
-        if isinstance(self.data, DVec):
-            return self.data.__getitem__(key)
-
-        self._force_orientation('r')
         key = self._parse_getkey(key)
-        row_data = self._get_item_logic(key[0])
-        if isinstance(row_data, DVec):
-            slc_data = row_data[key[1]]
+        rows, cols = (self._key_range(k, self.shape[axis]) for axis, k in enumerate(key))
+        s0, s1 = self._strides
+        if isinstance(rows, int) and isinstance(cols, int):
+            return self._buf[self._offset + rows * s0 + cols * s1]
+
+        rows = range(rows, rows + 1) if isinstance(rows, int) else rows
+        cols = range(cols, cols + 1) if isinstance(cols, int) else cols
+        if isinstance(rows, range) and isinstance(cols, range):
+            offset = self._offset + rows.start * s0 + cols.start * s1
+            return self._share_buf(DMatrix._from_buffer(self._buf, (len(rows), len(cols)), self.dtype, (rows.step * s0, cols.step * s1), offset))
+
+        if isinstance(cols, range):
+            slc_data = [self._buf[strided_slice(self._offset + i * s0 + cols.start * s1, cols.step * s1, len(cols))] for i in rows]
         else:
-            slc_data = [row[key[1]] for row in row_data]
+            slc_data = [operator.itemgetter(*cols)(self._buf[self._row_slice(i)]) for i in rows]
+            if len(cols) == 1:
+                slc_data = [(d,) for d in slc_data]
+        return DMatrix._from_buffer(self._stack(slc_data, len(cols), self.dtype), (len(rows), len(cols)), self.dtype)
+
+    @staticmethod
+    def _key_range(key, length):
+        # Turns a parsed key of one axis into an int, range or list of indices.
+        if key is None:
+            return 0
+        if isinstance(key, int):
+            return key + length if key < 0 else key
+        if isinstance(key, slice):
+            return range(*key.indices(length))
+        return [k + length if k < 0 else k for k in key]
 
-        if isinstance(slc_data, (int, float, complex)):
-            return slc_data
-        return DMatrix(data=slc_data)
-    
     def __setitem__(self, key, val):
         key = self._parse_getkey(key)
-        raise NotImplementedError
-        
+        rows, cols = (self._key_range(k, self.shape[axis]) for axis, k in enumerate(key))
+        rows = [rows] if isinstance(rows, int) else rows
+        cols = [cols] if isinstance(cols, int) else cols
+        shape = (len(rows), len(cols))
+
+        if isinstance(val, (int, float, complex, bool)):
+            val_rows = itertools.repeat([val] * shape[1], shape[0])
+        else:
+            if not isinstance(val, DMatrix):
+                val = DMatrix(val)
+            if val.shape != shape:
+                if not (1 in shape and 1 in val.shape and shape[0] * shape[1] == val.shape[0] * val.shape[1]):
+                    raise ValueError(f"Can not set values of shape {val.shape} into a selection of shape {shape}")
+                val = val.reshape(shape)
+            val_rows = val._rows()
+
+        self._prepare_write()
+        s0, s1 = self._strides
+        for i, val_row in zip(rows, val_rows):
+            val_row = cast_buffer(val_row, self.dtype)
+            if isinstance(cols, range):
+                self._buf[strided_slice(self._offset + i * s0 + cols.start * s1, cols.step * s1, len(cols))] = val_row
+            else:
+                for j, v in zip(cols, val_row):
+                    self._buf[self._offset + i * s0 + j * s1] = v
+
+    def _prepare_write(self):
+        # Copy-on-write, gives this matrix its own buffer if the current one is shared.
+        if self._buf_shared():
+            self._set_layout(self._flat_copy(), self.shape, self.dtype)
+
+    def _view(self):
+        # A view of the whole matrix, in the share group of its buffer.
+        return self._share_buf(DMatrix._from_buffer(self._buf, self.shape, self.dtype, self._strides, self._offset))
+
+    def _flat_view(self, new):
+        # new is built on _flat, which is the buffer itself when it is already in order, then new is a view.
+        return self._share_buf(new) if new._buf is self._buf else new
+
+    def _flat_copy(self):
+        flat = self._flat('r')
+        return flat[:] if flat is self._buf else flat
+
+    def copy(self) -> DMatrix:
+        """
+        DMatrix.copy()
+        A copy of the matrix with its own contiguous buffer.
+        """
+        return DMatrix._from_buffer(self._flat_copy(), self.shape, self.dtype)
+
     def __add__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__add__)
-    
-    __iadd__ = __add__
+
     __radd__ = __add__
-    
+
+    def __iadd__(self, other) -> DMatrix:
+        return self._apply(operator.__add__, (other,), self)
+
     def __sub__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__sub__)
-    
-    __isub__ = __sub__
-    
-    def __rsub__(self, other):
-        return (-1 *self).__match_operator(other, operator.__add__)
-    
+
+    def __isub__(self, other) -> DMatrix:
+        return self._apply(operator.__sub__, (other,), self)
+
+    def __rsub__(self, other) -> DMatrix:
+        return self.__match_operator(other, rsub)
+
     def __mul__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__mul__)
-        
+
     __rmul__ = __mul__
-    __imul__ = __mul__
+
+    def __imul__(self, other) -> DMatrix:
+        return self._apply(operator.__mul__, (other,), self)
 
     def __truediv__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__truediv__)
-        
+
     def __rtruediv__(self, other) -> DMatrix:
         try:
-            self = self ** -1
+            return self.__match_operator(other, rtruediv)
         except ZeroDivisionError:
             raise ZeroDivisionError("Can not divide by 0")
-        return self.__match_operator(other, operator.__mul__)
 
     def __mod__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__mod__)
-    
-    def __rmod__(self, other):
-        left = DMatrix(data = [[other] * self.shape[1]] * self.shape[0])
-        
-        return left.__match_operator(self, operator.__mod__)
+
+    def __rmod__(self, other) -> DMatrix:
+        return self.__match_operator(other, rmod)
 
     def __pow__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__pow__)
-    
-    def __rpow__(self, other):
-        left = DMatrix(data = [[other] * self.shape[1]] * self.shape[0])
-        return left.__match_operator(self, operator.__pow__)
-        
+
+    def __rpow__(self, other) -> DMatrix:
+        return self.__match_operator(other, rpow)
+
     def __lt__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__lt__)
-    
+
     def __le__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__le__)
-    
+
     def __eq__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__eq__)
-    
+
     def __ne__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__ne__)
-    
+
     def __ge__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__ge__)
-    
+
     def __gt__(self, other) -> DMatrix:
         return self.__match_operator(other, operator.__gt__)
-    
+
     __rlt__ = __ge__
     __rle__ = __gt__
     __req__ = __eq__
     __rne__ = __ne__
     __rge__ = __lt__
     __rgt__ = __le__
-    
+
     def __abs__(self) -> DMatrix:
         return self.__self_operator(operator.__abs__)
-    
-    def __match_operator(self, other, opp):
-        if isinstance(self.data, DVec) and hasattr(other, '_format') and isinstance(other.data, DVec):
-            opp_data = opp(self.data, other.data)
 
-        elif isinstance(self.data, DVec):
-            opp_data = opp(self.data, other)
+    def add(self, other, out=None) -> DMatrix:
+        """
+        DMatrix.add(other, out=None)
+        Element wise self + other.
+
+        Parameters
+        ----------
+        other: DMatrix, DVec, sparse matrix, int, float or complex, broadcast against self
+        out: DMatrix, optional
+            A matrix of the same shape that the result is written into, instead of a new matrix.
+            It may be self or other. The results must fit its dtype,
+            floats can not be written into an int matrix.
+
+        Returns
+        -------
+        DMatrix, out if it is given.
+        """
+        return self.__out_operator(other, operator.__add__, out)
+
+    def sub(self, other, out=None) -> DMatrix:
+        """
+        DMatrix.sub(other, out=None)
+        Element wise self - other, see DMatrix.add for out.
+        """
+        return self.__out_operator(other, operator.__sub__, out)
 
-        elif isinstance(other, DMatrix):
-            if self.shape != other.shape:
-                raise ValueError(f"Matrices are not the same size: {self.shape} and {other.shape}")
-            other._force_orientation(orientation=self.orientation)
-            opp_data = [opp(s_vec, o_vec) for s_vec, o_vec in zip(self.data, other.data)]
+    def mul(self, other, out=None) -> DMatrix:
+        """
+        DMatrix.mul(other, out=None)
+        Element wise self * other, see DMatrix.add for out.
+        """
+        return self.__out_operator(other, operator.__mul__, out)
 
-        elif isinstance(other, (int, float, complex)):
-            opp_data = [opp(vec, other) for vec in self.data]
+    def truediv(self, other, out=None) -> DMatrix:
+        """
+        DMatrix.truediv(other, out=None)
+        Element wise self / other, see DMatrix.add for out.
+        """
+        return self.__out_operator(other, operator.__truediv__, out)
 
-        elif isinstance(other, DVec):
-            opp_data = [opp(vec, other) for vec in self.data]
+    def pow(self, other, out=None) -> DMatrix:
+        """
+        DMatrix.pow(other, out=None)
+        Element wise self ** other, see DMatrix.add for out.
+        """
+        return self.__out_operator(other, operator.__pow__, out)
 
-        elif hasattr(other, "_format"):
+    def abs(self, out=None) -> DMatrix:
+        """
+        DMatrix.abs(out=None)
+        Element wise abs(self), see DMatrix.add for out.
+        """
+        if out is None:
+            return self.__self_operator(operator.__abs__)
+        return self._apply(operator.__abs__, (), out)
+
+    def __out_operator(self, other, opp, out):
+        if out is None:
+            return self.__match_operator(other, opp)
+        result = self._apply(opp, (other,), out)
+        if result is NotImplemented: raise TypeError(f"Unsupported operand type {type(other).__name__}")
+        return result
+
+    def _apply(self, opp, others, out) -> DMatrix:
+        """
+        Writes opp(self, *others) element wise into the DMatrix out, CHUNK_SIZE elements at a time,
+        so no result matrix is allocated. Returns out, or NotImplemented for an unsupported operand.
+        """
+        if not isinstance(out, DMatrix): raise TypeError(f"out must be a DMatrix, not {type(out).__name__}")
+        # Detach out before the operands are read, so out never shares its buffer with one of them.
+        out._prepare_write()
+        operands = broadcast((self,) + others)
+        if operands is None:
             return NotImplemented
-        
+        shape, _, leaves = operands
+        if shape != out.shape: raise ValueError(f"The result has shape {shape}, it can not be written into out with shape {out.shape}")
+
+        n, m = shape
+        s0, s1 = out._strides
+        if m == 1 or n == 1 or s0 == m * s1:
+            # The elements of out are evenly spaced row by row, so any range of them is one strided slice.
+            step = s0 if m == 1 else s1
+            write = lambda start, stop, items: store_into(out._buf, strided_slice(out._offset + start * step, step, stop - start), items, out.dtype)
+            apply_into(opp, leaves, n * m, CHUNK_SIZE, write)
         else:
-            return NotImplementedError
-        
-        return DMatrix(data=opp_data)
-        
+            write = lambda start, stop, items: store_into(out._buf, out._row_slice(start // m), items, out.dtype)
+            apply_into(opp, leaves, n * m, m, write)
+        return out
+
+    def _result(self, opp_data, shape) -> DMatrix:
+        # Stores a row by row list of results as a new matrix.
+        dtype = type(opp_data[0])
+        return DMatrix._from_buffer(cast_buffer(opp_data, dtype), shape, dtype)
+
+    def __match_operator(self, other, opp):
+        # Element wise with broadcasting of scalars, vectors, (n, 1) and (1, m) matrices and sparse matrices, see _broadcast.
+        if get_lazy():
+            return lazy_operator(self, opp, other)
+        return elementwise(opp, self, other)
+
     def __self_operator(self, opp) -> DMatrix:
-        if isinstance(self.data, DVec):
-            opp_data = opp(self.data)
+        if get_lazy():
+            return lazy_operator(self, opp)
+        return self._result(map_elements(opp, self._flat()), self.shape)
+
+    def __matmul_self(self, other, method="auto") -> DMatrix:
+        if method == "auto":
+            if use_parallel(self, other):
+                method = "parallel"
+            elif min(self.shape[0], self.shape[1], other.shape[1]) >= _gemm.STRASSEN_THRESHOLD:
+                method = "strassen"
+            else:
+                method = "blocked"
+
+        if method == "blocked":
+            dot_data = _gemm.gemm_dmatrix(self, other)
+        elif method == "strassen":
+            dot_data = _gemm.strassen_dmatrix(self, other)
+        elif method == "parallel":
+            dot_data = parallel_matmul(self, other)
+            if isinstance(dot_data, array.array):
+                # The float array from the shared output block becomes the result without another copy.
+                return DMatrix._from_buffer(dot_data, (self.shape[0], other.shape[1]), float)
         else:
-            opp_data = [opp(vec) for vec in self.data]
-        return DMatrix(data=opp_data)
-
-    def __matmul_self(self, other) -> DMatrix:
-        self._force_orientation('r')
-        other._force_orientation('c')
-
-        if isinstance(other.data, DVec) and isinstance(self.data, DVec):
-            dot_data = self.data @ other.data
-        elif isinstance(other.data, DVec):
-            dot_data = [row @ other.data for row in self.data]
-        elif isinstance(self.data, DVec):
-            dot_data = [[self.data @ col] for col in other.data]
-        else:
-            dot_data = [[row @ col for col in other.data] for row in self.data]
-        return dot_data
-    
+            raise ValueError(f"Unknown matmul method {method}, use 'auto', 'blocked', 'strassen' or 'parallel'")
+        return self._result(dot_data, (self.shape[0], other.shape[1]))
+
     def __matmul__(self, other) -> DMatrix:
+        return self.matmul(other)
+
+    def matmul(self, other, method="auto") -> DMatrix:
+        """
+        DMatrix.matmul(other, method='auto')
+        The matrix product self @ other.
+
+        Parameters:
+        -----------
+        other: DMatrix or DVec
+        method: {'auto', 'blocked', 'strassen', 'parallel'}
+            'blocked' uses the tiled gemm kernel.
+            'strassen' uses Strassen's recursive algorithm, which needs
+            fewer multiplications for large matrices.
+            'parallel' splits the rows of the product over worker processes,
+            see set_parallel for the worker count and size threshold.
+            'auto' uses the parallel matmul when more than one worker is set
+            and the product is above the parallel threshold, else Strassen when all
+            dimensions are at least pmatrix._core._gemm.STRASSEN_THRESHOLD.
+
+        Returns:
+        --------
+        DMatrix, or a scalar if both operands are vectors.
+        """
         if not hasattr(other, "_format"): return NotImplemented
-        if not isinstance(other, DVec) and self.shape[1] != other.shape[0] : raise ValueError(f"Can not do a dot product with between matrices with size {self.shape} and {other.shape}")
-        if isinstance(other, DMatrix):
-            dot_data = self.__matmul_self(other)
-        elif isinstance(other, DVec):
-            dot_data = self.__matmul_self(DMatrix(other))
-        else:
+        if isinstance(other, DVec):
+            other = DMatrix(other)
+        if self.shape[1] != other.shape[0] : raise ValueError(f"Can not do a dot product with between matrices with size {self.shape} and {other.shape}")
+        if not isinstance(other, DMatrix):
             return NotImplemented
-            
-        if isinstance(dot_data, list):
-            return DMatrix(data=dot_data)
-        return dot_data
-    
+
+        dot = self.__matmul_self(other, method)
+        if dot.shape == (1, 1) and 1 in self.shape and 1 in other.shape:
+            return dot._buf[0]
+        return dot
+
     def __rmatmul__(self, other):
         return (self.T.__matmul__(other.T)).T
-    
+
     def get_row_data(self, row_i):
         """
         DMatrix.get_row_data(row_i)
         Gets the i'th row of the matrix,
         where the row gets indexed and 0 values are skipped.
         Is used for dot products with sparse matrices.
-        
+
         Parameters:
         -----------
         row_i: int,
@@ -343,21 +626,15 @@ class DMatrix(LogicCore):
         Where the first item of the tuple is the index,
         and the second the data on that index.
         """
-        if isinstance(self.data, DVec):
-            return self.data.get_row_data(row_i)
-        
-        if self.orientation == 'r':
-            return [d for d in enumerate(self.data[row_i]) if d[1]]
-        else:
-            return [d for d in enumerate([col[row_i] for col in self.data]) if d[1]]      
-        
+        return [d for d in enumerate(self._buf[self._row_slice(row_i)]) if d[1]]
+
     def get_col_data(self, col_i):
         """
         DMatrix.get_col_data(col_i)
         Gets the i'th column of the matrix,
         where the column gets indexed and 0 values are skipped.
         Is used for dot products with sparse matrices.
-        
+
         Parameters:
         -----------
         col_i: int,
@@ -369,61 +646,21 @@ class DMatrix(LogicCore):
         Where the first item of the tuple is the index,
         and the second the data on that index.
         """
-        if isinstance(self.data, DVec):
-            return self.data.get_col_data(col_i)
-        
-        if self.orientation == 'c':
-            return [d for d in enumerate(self.data[col_i]) if d[1]]
-        else:
-            return [d for d in enumerate([row[col_i] for row in self.data]) if d[1]]    
-    
+        return [d for d in enumerate(self._buf[self._col_slice(col_i)]) if d[1]]
+
     @property
     def T(self) -> DMatrix:
         """
         DMatrix.T
 
-        Returns a tranposed copy of itself.
+        Returns the transposed matrix, this only swaps the strides,
+        the data buffer is shared with the original matrix.
         """
-        new = copy.deepcopy(self)
-        if isinstance(new.data, DVec):
-            new.data = new.data.T
-        else:
-            new.data = [vec.T for vec in new.data]
-        new.shape = (new.shape[1], new.shape[0])
-        return new
-    
+        return self._share_buf(DMatrix._from_buffer(self._buf, (self.shape[1], self.shape[0]), self.dtype, (self._strides[1], self._strides[0]), self._offset))
+
     def _T_inplace(self):
-        if isinstance(self.data, DVec):
-            self.data = self.data.T
-        else:
-            self.data = [vec.T for vec in self.data]
+        self._strides = (self._strides[1], self._strides[0])
         self.shape = (self.shape[1], self.shape[0])
-    
-    def _force_orientation(self, orientation):
-        if self.orientation == orientation: 
-            return
-        if isinstance(self.data, DVec):
-            f_data = [[d] for d in self.data]
-        else:
-            f_data = [[vec[i] for vec in self.data] for i in range(self.data[0].length)]
-        if len(f_data) == 1:
-            self.data = DVec(f_data[0], dtype=self.dtype, orientation=orientation)
-        else:
-            self.data = [DVec(f, dtype=self.dtype, orientation=orientation) for f in f_data]
-
-    def _fix_split_vector(self):
-        if not 1 in self.shape:
-            return
-        if isinstance(self.data, DVec):
-            return
-        
-        if self.shape[0]==1:
-            self._force_orientation('r')
-        else:
-            self._force_orientation('c')
-        
-        if isinstance(self.data, list):
-            self.data - self.data[0]
 
     def reshape(self, shape, order='R') -> DMatrix:
         """
@@ -438,22 +675,20 @@ class DMatrix(LogicCore):
             of the old matrix need to match the amount in the new
             matrix.
         order: {'C', 'R'}
-            The order which the elements are read from the old matrix.
+            The order which the elements are read from the old matrix,
+            and placed in the new matrix.
             'R' denotes row by row, and 'C' column by column.
 
         Returns
-        A reshaped DMatrix, the old matrix is consumed in the process.
+        A reshaped DMatrix, which shares the buffer with the old matrix
+        when its elements are already stored in the given order.
         """
         if functools.reduce(operator.__mul__, shape) != functools.reduce(operator.__mul__, self.shape): raise ValueError(f"Cannot cast ({self.shape}) into {shape}")
-        if not isinstance(self.data, DVec):
-            self.flatten()
-
-        if self.orientation != 'r':
-            self._T_inplace()
-
-        self.data = [self.data[s:s+shape[1]] for s in range(0, self.shape[1], shape[1])]
-        self.shape = shape
-        return self
+        if order == 'R':
+            return self._flat_view(DMatrix._from_buffer(self._flat('r'), tuple(shape), self.dtype))
+        elif order == 'C':
+            return self._flat_view(DMatrix._from_buffer(self._flat('c'), tuple(shape), self.dtype, (1, shape[0])))
+        raise ValueError("Order not valid")
 
     def flatten(self, order="R") -> DMatrix:
         """
@@ -468,28 +703,27 @@ class DMatrix(LogicCore):
             'R' denotes row by row, and 'C' column by column.
 
         Returns
-        A flattend DMatrix
+        A flattend (1, N) DMatrix, which shares the buffer with the old matrix
+        when its elements are already stored in the given order.
         """
         if order=="R":
-            self._force_orientation('r')
+            flat = self._flat('r')
         elif order=="C":
-            self._force_orientation('c')
+            flat = self._flat('c')
         else:
             raise ValueError("Order not valid")
-        self.data = DVec(list(itertools.chain(*self.data)), orientation='c')
-        self.shape = (1, self.data.length)
-        return self
+        return self._flat_view(DMatrix._from_buffer(flat, (1, len(flat)), self.dtype))
 
-    def round(self, r=2) -> DMatrix:
+    def round(self, r=2, out=None) -> DMatrix:
         """
-        DMatrix.round(r):
-        Rounds all elements in data to r digits.
+        DMatrix.round(r, out=None):
+        Rounds all elements in data to r digits, see DMatrix.add for out.
         """
-        if isinstance(self.data, DVec):
-            r_data = self.data.round(2)
-        else:
-            r_data = [row.round(r) for row in self.data]
-        return DMatrix(data=r_data)
+        if out is not None:
+            return self._apply(round, (r,), out)
+        if get_lazy():
+            return lazy_operator(self, round, r)
+        return self._result(map_elements(round, self._flat(), r), self.shape)
 
     def sum(self, axis=None):
         """
@@ -498,26 +732,25 @@ class DMatrix(LogicCore):
         This will sum the matrix along an axis if given.
         Else the sum of all elements if axis is None.
         """
-        if isinstance(self.data, DVec):
-            return sum(self.data)
-        elif axis is None:
-            return sum([sum(vec) for vec in self.data])
+        if 1 in self.shape or axis is None:
+            return sum_elements(self._flat())
         elif axis == 0:
-            self._force_orientation('r')
-            return DMatrix(sum(self.data))
+            rows = self._rows()
+            col_sums = list(rows[0])
+            for row in rows[1:]:
+                col_sums = list(map(operator.__add__, col_sums, row))
+            return self._result(col_sums, (1, self.shape[1]))
         else:
-            self._force_orientation('c')
-            return DMatrix(sum(self.data))
-        
+            return self._result(map_rows(lambda row: (sum(row),), self._rows(), self.shape[1]), (self.shape[0], 1))
+
     def tolist(self):
-        self._force_orientation('r')
-        return [row_vec.tolist() for row_vec in self.data]
-    
+        return [list(row) for row in self._rows()]
+
     @classmethod
     def arange(cls, *args):
         """
         DMatrix.arange([start], stop, [step])
-        
+
         Parameters
         ----------
         start: int,
@@ -533,15 +766,13 @@ class DMatrix(LogicCore):
             A column vector with items in the given range.
         """
         return DMatrix(DVec.arange(*args))
-        
+
     def __str__(self):
-        if isinstance(self.data, DVec):
-            return self.data.__str__()
-        self._force_orientation('r')
-        if isinstance(self.data, DVec):
-            return self.data.__str__()
-        
-        p_data = [vec._get_str_items() for vec in (self.data if len(self.data) < 6 else self.data[:3] + self.data[-3:])]
+        if 1 in self.shape:
+            return self._as_dvec().__str__()
+
+        rows = range(self.shape[0]) if self.shape[0] < 6 else [0, 1, 2, self.shape[0] - 3, self.shape[0] - 2, self.shape[0] - 1]
+        p_data = [self.row(i)._get_str_items() for i in rows]
         i_size = max([p[1] for p in p_data])
         p_data =  [[" "*(i_size - len(item)) + item for item in line] for line in [p[0] for p in p_data]]
         row_txt = [DVec._format_row_str(p, row_length=self.shape[1], items=i==0) for i, p in enumerate(p_data)]
@@ -550,7 +781,7 @@ class DMatrix(LogicCore):
             v_lines_right = "|" + "|".join([" " * (i_size + 1)] * min(3, (self.shape[1] - 1)//2  + 1))
             gap_txt = v_lines_left + ("" if self.shape[1]<6 else " "*5) + v_lines_right + "\n"
             txt = "\n".join(row_txt[:3])+ "\n" + gap_txt + gap_txt[:i_size] + f"{self.shape[0] - 6}" + gap_txt[i_size + 1:]  + gap_txt + "\n".join(row_txt[-3:])
-        else: 
+        else:
             txt = "\n".join(row_txt)
-        
-        return txt
\ No newline at end of file
+
+        return txt
@@ -1,5 +1,9 @@
-import operator, itertools, copy
-from ._logiccore import LogicCore, Timer
+import operator, itertools
+from ._logiccore import LogicCore
+from ._storage import cast_buffer, buffer_dtype, strided_slice, store_into
+from ._executor import map_elements
+from ._lazy import get_lazy, lazy_operator
+from ._broadcast import CHUNK_SIZE, broadcast, elementwise, apply_into, rsub, rtruediv, rmod, rpow
 
 class DVec(LogicCore):
     """
@@ -21,7 +25,7 @@ class DVec(LogicCore):
     -------
     X : Dvec
 
-    DVec is at its core a simple python list, but changes some behaviour to act more like a vector.
+    DVec is at its core a compact array of its items (see set_storage), but changes some behaviour to act more like a vector.
     This means that (DVec) + (DVec) is element wise addition instead of the normal extend behaviour.
     Besides addition it supports element wise:
         subtraction (-)
@@ -33,10 +37,17 @@ class DVec(LogicCore):
     Furthermore it supports the dot product with X @ Y.
 
     The vector supports some fancy printing by print(DVec)
+
+    The items are stored in a flat buffer, read from an offset with a stride.
+    This way a DVec can be a strided view on the rows or columns of a DMatrix.
+    Slices and the transpose are views as well, they share the buffer until
+    one of them is written to, then the written vector copies its items first (copy-on-write).
+    Use DVec.copy() for an explicit copy.
     """
+    __slots__ = ("_buf", "_offset", "_stride", "_share", "dtype", "orientation", "length", "__weakref__")
+    _format = "dvec"
+
     def __init__(self, data, dtype=None, orientation='c') -> None:
-        self.timer = Timer()
-        self._format = "dvec"
         self.orientation = orientation
 
         if not isinstance(data, list) or not data: raise TypeError(f"Vector data must be an non empty list")
@@ -46,61 +57,133 @@ class DVec(LogicCore):
 
         if not dtype in (int, float, complex, bool): raise TypeError(f"Data must be of type int, float or complex, not {dtype}")
 
-        try:
-            self.data = list(map(self.dtype, data))
-        except (ValueError, TypeError)  as e:
-            raise TypeError(f"Not all data can be converted into {self.dtype.__name__}, {e}")
+        self.data = cast_buffer(data, self.dtype)
+
+    @classmethod
+    def _from_buffer(cls, buf, dtype=None, orientation='c', offset=0, stride=1, length=None):
+        """
+        Wraps a storage buffer without casting or copying it,
+        the vector holds the items buf[offset + i * stride] for i in range(length).
+        """
+        new = cls.__new__(cls)
+        new._buf = buf
+        new._offset = offset
+        new._stride = stride
+        new._share = None
+        new.length = len(buf) if length is None else length
+        new.dtype = buffer_dtype(buf) if dtype is None else dtype
+        new.orientation = orientation
+        return new
 
-        self.length = len(data)
-        self.timer.time("reset")
+    @property
+    def data(self):
+        """
+        DVec.data
+        The items of the vector as one contiguous buffer,
+        for a strided view this is a copy of the viewed items.
+        A shared buffer is copied before it is handed out, so writing into it only changes this vector.
+        """
+        if self._offset == 0 and self._stride == 1 and len(self._buf) == self.length:
+            self._prepare_write()
+            return self._buf
+        return self._buf[strided_slice(self._offset, self._stride, self.length)]
+
+    @data.setter
+    def data(self, buf):
+        self._leave_share()
+        self._buf = buf
+        self._offset = 0
+        self._stride = 1
+        self.length = len(buf)
+
+    def _items(self):
+        # The items as one buffer without copy-on-write, only to be read.
+        if self._offset == 0 and self._stride == 1 and len(self._buf) == self.length:
+            return self._buf
+        return self._buf[strided_slice(self._offset, self._stride, self.length)]
+
+    def _prepare_write(self):
+        # Copy-on-write, gives this vector its own buffer if the current one is shared.
+        if self._buf_shared():
+            self.data = self._buf[strided_slice(self._offset, self._stride, self.length)]
+
+    def _view(self):
+        # A view of the whole vector, in the share group of its buffer.
+        return self._share_buf(DVec._from_buffer(self._buf, self.dtype, self.orientation, self._offset, self._stride, self.length))
+
+    def copy(self):
+        """
+        DVec.copy()
+        A copy of the vector with its own contiguous buffer.
+        """
+        return DVec._from_buffer(self._buf[strided_slice(self._offset, self._stride, self.length)], self.dtype, self.orientation)
+
+    def _buf_index(self, key):
+        # Translates an index or slice of the vector into one of the buffer.
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            return strided_slice(self._offset + start * self._stride, step * self._stride, len(range(start, stop, step)))
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length: raise IndexError(f"Index {key} out of range for vector with length {self.length}")
+        return self._offset + key * self._stride
 
-    
     def __len__(self):
         return self.length
 
+    def __iter__(self):
+        return iter(self._items())
+
     def __add__(self, other):
         return self.__match_operator(other, operator.__add__)
     
-    __iadd__ = __add__
     __radd__ = __add__
+
+    def __iadd__(self, other):
+        return self._apply(operator.__add__, (other,), self)
     
     def __sub__(self, other):
         return self.__match_operator(other, operator.__sub__)
     
-    __isub__ = __sub__
+    def __isub__(self, other):
+        return self._apply(operator.__sub__, (other,), self)
+
     def __rsub__(self, other):
-        return (-1 *self).__match_operator(other, operator.__sub__)
+        return self.__match_operator(other, rsub)
     
     def __mul__(self, other):
         return self.__match_operator(other, operator.__mul__)
         
     __rmul__ = __mul__
 
+    def __imul__(self, other):
+        return self._apply(operator.__mul__, (other,), self)
+
     def __matmul__(self, other):
-        self.timer.time("reset")
         if not isinstance(other, DVec):
             return NotImplemented
-        dot_sum = 0
-        for s, o in zip(self.data, other.data):
-            dot_sum += s * o
-        self.timer.time("dot sum")
-        return dot_sum
+        return sum(map(operator.__mul__, self._items(), other._items()))
 
     def __truediv__(self, other):
         return self.__match_operator(other, operator.__truediv__)
         
     def __rtruediv__(self, other) :
         try:
-            self = self ** -1
+            return self.__match_operator(other, rtruediv)
         except ZeroDivisionError:
             raise ZeroDivisionError("Can not divide by 0")
-        return self.__match_operator(other, operator.__mul__)
 
     def __mod__(self, other):
         return self.__match_operator(other, operator.__mod__)
 
+    def __rmod__(self, other):
+        return self.__match_operator(other, rmod)
+
     def __pow__(self, other):
         return self.__match_operator(other, operator.__pow__)
+
+    def __rpow__(self, other):
+        return self.__match_operator(other, rpow)
     
     def __lt__(self, other):
         return self.__match_operator(other, operator.__lt__)
@@ -128,43 +211,130 @@ class DVec(LogicCore):
     __rgt__ = __le__
 
     def __match_operator(self, other, opp):
-        if isinstance(other, DVec):
-            if self.length != other.length:
-                raise ValueError(f"Vector lengths {self.length} and {other.length} do not match")
-            opp_data = [opp(s, o) for s,o in zip(self.data, other.data)]
-
-        elif isinstance(other, (float, int, complex)):
-            opp_data = [opp(s, other) for s in self.data]
-
-        elif hasattr(other, "_format"):
-            return NotImplemented
-        else:
-            return NotImplementedError
-        return DVec(data=opp_data, orientation=self.orientation)
+        # Element wise with broadcasting, a DVec for vectors of the same length and scalars, else a DMatrix, see _broadcast.
+        if get_lazy():
+            return lazy_operator(self, opp, other)
+        return elementwise(opp, self, other)
 
     def __abs__(self):
         return self.__self_operator(operator.__abs__)
+
+    def add(self, other, out=None):
+        """
+        DVec.add(other, out=None)
+        Element wise self + other.
+
+        Parameters
+        ----------
+        other: DVec, DMatrix, sparse matrix, int, float or complex, broadcast against self
+        out: DVec, optional
+            A vector of the same length that the result is written into, instead of a new vector,
+            only if the result is a vector.
+            It may be self or other. The results must fit its dtype,
+            floats can not be written into an int vector.
+
+        Returns
+        -------
+        DVec, out if it is given.
+        """
+        return self.__out_operator(other, operator.__add__, out)
+
+    def sub(self, other, out=None):
+        """
+        DVec.sub(other, out=None)
+        Element wise self - other, see DVec.add for out.
+        """
+        return self.__out_operator(other, operator.__sub__, out)
+
+    def mul(self, other, out=None):
+        """
+        DVec.mul(other, out=None)
+        Element wise self * other, see DVec.add for out.
+        """
+        return self.__out_operator(other, operator.__mul__, out)
+
+    def truediv(self, other, out=None):
+        """
+        DVec.truediv(other, out=None)
+        Element wise self / other, see DVec.add for out.
+        """
+        return self.__out_operator(other, operator.__truediv__, out)
+
+    def pow(self, other, out=None):
+        """
+        DVec.pow(other, out=None)
+        Element wise self ** other, see DVec.add for out.
+        """
+        return self.__out_operator(other, operator.__pow__, out)
+
+    def abs(self, out=None):
+        """
+        DVec.abs(out=None)
+        Element wise abs(self), see DVec.add for out.
+        """
+        if out is None:
+            return self.__self_operator(operator.__abs__)
+        return self._apply(operator.__abs__, (), out)
+
+    def __out_operator(self, other, opp, out):
+        if out is None:
+            return self.__match_operator(other, opp)
+        result = self._apply(opp, (other,), out)
+        if result is NotImplemented: raise TypeError(f"Unsupported operand type {type(other).__name__}")
+        return result
+
+    def _apply(self, opp, others, out):
+        """
+        Writes opp(self, *others) element wise into the DVec out, CHUNK_SIZE elements at a time,
+        so no result vector is allocated. Returns out, or NotImplemented for an unsupported operand.
+        """
+        if not isinstance(out, DVec): raise TypeError(f"out must be a DVec, not {type(out).__name__}")
+        if out.length != self.length: raise ValueError(f"out has length {out.length}, the result has length {self.length}")
+        # Detach out before the operands are read, so out never shares its buffer with one of them.
+        out._prepare_write()
+        operands = broadcast((self,) + others)
+        # A matrix result does not fit in a vector.
+        if operands is None or len(operands[0]) != 1:
+            return NotImplemented
+        leaves = operands[2]
+        write = lambda start, stop, items: store_into(out._buf, out._buf_index(slice(start, stop)), items, out.dtype)
+        apply_into(opp, leaves, self.length, CHUNK_SIZE, write)
+        return out
  
     def __self_operator(self, opp):
-        opp_data = list(map(opp, self.data))
-        return DVec(opp_data, orientation=self.orientation)
+        if get_lazy():
+            return lazy_operator(self, opp)
+        opp_data = map_elements(opp, self._items())
+        return DVec._from_buffer(cast_buffer(opp_data, type(opp_data[0])), orientation=self.orientation)
 
-    def round(self, r=2):
+    def round(self, r=2, out=None):
         """
-        DVec.round(r):
-        Rounds all elements in data to r digits.
+        DVec.round(r, out=None):
+        Rounds all elements in data to r digits, see DVec.add for out.
         """
-        r_data = [round(i,r) for i in self.data]
-        return DVec(data=r_data)
+        if out is not None:
+            return self._apply(round, (r,), out)
+        if get_lazy():
+            return lazy_operator(self, round, r)
+        r_data = map_elements(round, self._items(), r)
+        return DVec._from_buffer(cast_buffer(r_data, type(r_data[0])), orientation=self.orientation)
     
     def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._buf[self._buf_index(key)]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            return self._share_buf(DVec._from_buffer(self._buf, self.dtype, self.orientation, self._offset + start * self._stride, step * self._stride, len(range(start, stop, step))))
         get_data = self._get_item_logic(key)
         if isinstance(get_data, list):
             return DVec(get_data, orientation=self.orientation)
         return get_data
     
     def __setitem__(self, key, val):
-        return self.data.__setitem__(key, val)
+        self._prepare_write()
+        if isinstance(key, slice):
+            return self._buf.__setitem__(self._buf_index(key), cast_buffer(val, self.dtype))
+        return self._buf.__setitem__(self._buf_index(key), self.dtype(val))
     
     def index(self, item):
         """
@@ -172,7 +342,7 @@ class DVec(LogicCore):
         Gets the index of the item if it is in the list,
         else returns ValueError.
         """
-        return self.data.index(item)
+        return self._items().index(item)
 
     def get_row_data(self, row_i):
         """
@@ -196,9 +366,9 @@ class DVec(LogicCore):
         if self.orientation == 'r' and row_i != 0:
             raise IndexError("Row vector only has 1 row")
         elif self.orientation == 'r':
-            return [(i, d) for i,d in enumerate(self.data) if d]
+            return [(i, d) for i,d in enumerate(self._items()) if d]
         else:
-            return [(0, self.data[row_i])] if self.data[row_i] else []
+            return [(0, self[row_i])] if self[row_i] else []
         
     def get_col_data(self, col_i):
         """
@@ -221,9 +391,9 @@ class DVec(LogicCore):
         if self.orientation == 'c' and col_i != 0:
             raise IndexError("column vector only has 1 column")
         elif self.orientation == 'c':
-            return [(i, d) for i,d in enumerate(self.data) if d]
+            return [(i, d) for i,d in enumerate(self._items()) if d]
         else:
-            return [(0, self.data[col_i])] if self.data[col_i] else []
+            return [(0, self[col_i])] if self[col_i] else []
 
     @property
     def shape(self):
@@ -251,24 +421,23 @@ class DVec(LogicCore):
 
         returns
         -------
-        A copy with transposed orientation.
+        A view with transposed orientation, sharing the buffer of this vector.
         """
-        new = copy.deepcopy(self)
-        if new.orientation == 'c':
-            new.orientation = 'r'
-        else:
-            new.orientation = 'c'
-        return new
+        return self._share_buf(DVec._from_buffer(self._buf, self.dtype, 'r' if self.orientation == 'c' else 'c', self._offset, self._stride, self.length))
 
     def _get_str_items(self):
         if self.length > 6:
-            str_items =  list(map(str, self.data[:3] + self.data[-3:]))
+            items = self._items()
+            str_items =  list(map(str, items[:3] + items[-3:]))
         else:
-            str_items = list(map(str, self.data))
+            str_items = list(map(str, self._items()))
         return str_items, max(map(len, str_items))
     
     def tolist(self):
-        return self.data
+        items = self._items()
+        if isinstance(items, list):
+            return list(items)
+        return items.tolist()
     
     @classmethod
     def arange(cls, *args):
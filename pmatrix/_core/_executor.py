@@ -0,0 +1,145 @@
+"""
+Execution policy for the element wise and reduction loops of DVec and DMatrix.
+
+By default every loop runs serially. With set_executor the loops are cut into
+chunks that run on a thread pool, which only scales on free-threaded CPython
+builds (3.13t and later). When the GIL is enabled the loops stay serial.
+"""
+
+import math, os, sys, itertools
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+_POLICY = {"executor": None, "workers": 1, "min_chunk": 16384, "owned": False}
+
+
+def gil_enabled():
+    """
+    gil_enabled()
+    False on free-threaded builds running without the GIL, else True.
+    """
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def set_executor(executor=None, min_chunk=None):
+    """
+    set_executor(executor=None, min_chunk=None)
+    Sets the global execution policy for element wise operations, round and sum.
+
+    Parameters
+    ----------
+    executor: {None, 'serial', 'threads', int, concurrent.futures.Executor}
+        None or 'serial' runs every loop serially,
+        'threads' uses a thread pool with os.cpu_count() threads,
+        an int uses a thread pool with that many threads,
+        an Executor is used as is, its _max_workers sets the number of chunks.
+    min_chunk: int, optional
+        Loops over fewer than 2 * min_chunk elements always run serially.
+    """
+    if _POLICY["owned"]:
+        _POLICY["executor"].shutdown(wait=False)
+    _POLICY["owned"] = False
+
+    if executor is None or executor == "serial":
+        _POLICY["executor"], _POLICY["workers"] = None, 1
+    elif executor == "threads" or isinstance(executor, int):
+        workers = (os.cpu_count() or 1) if executor == "threads" else executor
+        if workers < 1: raise ValueError(f"Number of threads must be positive, not {workers}")
+        _POLICY["executor"], _POLICY["workers"], _POLICY["owned"] = ThreadPoolExecutor(workers), workers, True
+    elif isinstance(executor, Executor):
+        _POLICY["executor"], _POLICY["workers"] = executor, getattr(executor, "_max_workers", os.cpu_count() or 1)
+    else:
+        raise ValueError(f"Executor must be None, 'serial', 'threads', an int or an Executor, not {executor}")
+
+    if min_chunk is not None:
+        if not isinstance(min_chunk, int) or min_chunk < 1: raise ValueError(f"min_chunk must be a positive int, not {min_chunk}")
+        _POLICY["min_chunk"] = min_chunk
+
+
+def get_executor():
+    """
+    get_executor()
+    Returns the executor of the execution policy, None when running serially.
+    """
+    return _POLICY["executor"]
+
+
+def _chunks(length, weight=1):
+    # The (start, stop) chunks of range(length) for items of weight elements each,
+    # or None when the loop should run serially.
+    executor, workers, min_chunk = _POLICY["executor"], _POLICY["workers"], _POLICY["min_chunk"]
+    if executor is None or workers < 2 or length * weight < 2 * min_chunk or gil_enabled():
+        return None
+    step = max(math.ceil(min_chunk / weight), math.ceil(length / workers))
+    return [(start, min(start + step, length)) for start in range(0, length, step)]
+
+
+def runs_serial(length):
+    """
+    runs_serial(length)
+    Whether a loop over length elements runs serially under the current policy.
+    """
+    return _chunks(length) is None
+
+
+def _run(func, chunks):
+    # Runs func(start, stop) for all chunks in the executor, and concatenates the resulting lists.
+    parts = _POLICY["executor"].map(func, *zip(*chunks))
+    return list(itertools.chain.from_iterable(parts))
+
+
+def _is_scalar(x):
+    return isinstance(x, (int, float, complex, bool))
+
+
+def map_elements(opp, a, b=None):
+    """
+    map_elements(opp, a, [b])
+    list(map(opp, a)) or list(map(opp, a, b)), where b is a sequence as long as a, or a scalar.
+    """
+    chunks = _chunks(len(a))
+    if b is None:
+        if chunks is None:
+            return list(map(opp, a))
+        return _run(lambda start, stop: list(map(opp, a[start:stop])), chunks)
+    if _is_scalar(b):
+        if chunks is None:
+            return list(map(opp, a, itertools.repeat(b, len(a))))
+        return _run(lambda start, stop: list(map(opp, a[start:stop], itertools.repeat(b, stop - start))), chunks)
+    if chunks is None:
+        return list(map(opp, a, b))
+    return _run(lambda start, stop: list(map(opp, a[start:stop], b[start:stop])), chunks)
+
+
+def map_rows(func, rows, row_length):
+    """
+    map_rows(func, rows, row_length)
+    Concatenation of func(row) over the rows, where func returns an iterable per row.
+    """
+    chunks = _chunks(len(rows), row_length)
+    if chunks is None:
+        return list(itertools.chain.from_iterable(map(func, rows)))
+    return _run(lambda start, stop: list(itertools.chain.from_iterable(map(func, rows[start:stop]))), chunks)
+
+
+def sum_elements(a):
+    """
+    sum_elements(a)
+    The sum of all elements of a, as partial sums per chunk when running in the executor.
+    """
+    chunks = _chunks(len(a))
+    if chunks is None:
+        return sum(a)
+    return sum(_POLICY["executor"].map(lambda start, stop: sum(a[start:stop]), *zip(*chunks)))
+
+
+def map_chunks(func, length):
+    """
+    map_chunks(func, length)
+    func(0, length), or the concatenation of func(start, stop) over the chunks when running in the executor,
+    where func returns the list of results of the elements start:stop.
+    """
+    chunks = _chunks(length)
+    if chunks is None:
+        return func(0, length)
+    return _run(func, chunks)
@@ -0,0 +1,136 @@
+"""
+Dense matrix multiplication kernels.
+
+The operands are copied once into python lists, the left matrix row by row
+and the right matrix column by column, so every element of the product is
+a single dot product over two contiguous lists. The inputs are never modified.
+
+For large matrices Strassen's algorithm trades one of the eight block
+products for extra additions, which are cheap C-level map calls here.
+"""
+
+import math, operator, itertools
+
+# Number of columns of the right matrix that are multiplied with every row of the left matrix at once.
+BLOCK_SIZE = 64
+# Below this size the Strassen recursion falls back to the blocked kernel.
+STRASSEN_CUTOFF = 64
+# method='auto' uses Strassen when all dimensions are at least this large.
+STRASSEN_THRESHOLD = 512
+
+if hasattr(math, "sumprod"):
+    _dot = math.sumprod
+else:
+    def _dot(a, b):
+        return sum(map(operator.__mul__, a, b))
+
+
+def gemm(a_rows, b_cols, block=None):
+    """
+    gemm(a_rows, b_cols, [block])
+    The matrix product of A and B, where A is given as a list of its rows
+    and B as a list of its columns.
+
+    Parameters
+    ----------
+    a_rows: list of lists,
+        The rows of A.
+    b_cols: list of lists,
+        The columns of B, the transposed copy of B.
+    block: int, optional
+        The width of the column tiles of B, defaults to BLOCK_SIZE.
+
+    Returns
+    -------
+    list
+        The product row by row, as one flat list.
+    """
+    block = BLOCK_SIZE if block is None else block
+    n, m = len(a_rows), len(b_cols)
+    out = [0] * (n * m)
+    # A tile of columns of B is reused for all rows of A before the next tile is read.
+    for j0 in range(0, m, block):
+        col_tile = b_cols[j0: j0 + block]
+        j1 = j0 + len(col_tile)
+        for i, row in enumerate(a_rows):
+            out[i * m + j0: i * m + j1] = map(_dot, itertools.repeat(row, j1 - j0), col_tile)
+    return out
+
+
+def gemm_dmatrix(a, b, block=None):
+    """
+    gemm_dmatrix(a, b, [block])
+    The product of DMatrix a and DMatrix b as a flat row by row list.
+    """
+    return gemm([list(row) for row in a._rows()], [list(col) for col in b._cols()], block)
+
+
+def _add(a, b):
+    return [list(map(operator.__add__, ra, rb)) for ra, rb in zip(a, b)]
+
+
+def _sub(a, b):
+    return [list(map(operator.__sub__, ra, rb)) for ra, rb in zip(a, b)]
+
+
+def _pad(rows, n, m):
+    # Pads a list of rows with zeros up to n rows of length m.
+    if len(rows[0]) < m:
+        rows = [row + [0] * (m - len(row)) for row in rows]
+    if len(rows) < n:
+        rows = rows + [[0] * m for _ in range(n - len(rows))]
+    return rows
+
+
+def strassen(a_rows, b_rows, cutoff=None):
+    """
+    strassen(a_rows, b_rows, [cutoff])
+    The matrix product of A and B with Strassen's recursive algorithm,
+    where both A and B are given as lists of their rows.
+    Odd dimensions are padded with a zero row or column at every level,
+    below the cutoff the blocked gemm kernel is used.
+
+    Returns
+    -------
+    list of lists
+        The rows of the product.
+    """
+    cutoff = STRASSEN_CUTOFF if cutoff is None else cutoff
+    n, k, m = len(a_rows), len(b_rows), len(b_rows[0])
+    if min(n, k, m) <= cutoff:
+        flat = gemm(a_rows, [list(col) for col in zip(*b_rows)])
+        return [flat[i * m: (i + 1) * m] for i in range(n)]
+
+    hn, hk, hm = (n + 1) // 2, (k + 1) // 2, (m + 1) // 2
+    a = _pad(a_rows, 2 * hn, 2 * hk)
+    b = _pad(b_rows, 2 * hk, 2 * hm)
+    a11, a12 = [row[:hk] for row in a[:hn]], [row[hk:] for row in a[:hn]]
+    a21, a22 = [row[:hk] for row in a[hn:]], [row[hk:] for row in a[hn:]]
+    b11, b12 = [row[:hm] for row in b[:hk]], [row[hm:] for row in b[:hk]]
+    b21, b22 = [row[:hm] for row in b[hk:]], [row[hm:] for row in b[hk:]]
+
+    p1 = strassen(_add(a11, a22), _add(b11, b22), cutoff)
+    p2 = strassen(_add(a21, a22), b11, cutoff)
+    p3 = strassen(a11, _sub(b12, b22), cutoff)
+    p4 = strassen(a22, _sub(b21, b11), cutoff)
+    p5 = strassen(_add(a11, a12), b22, cutoff)
+    p6 = strassen(_sub(a21, a11), _add(b11, b12), cutoff)
+    p7 = strassen(_sub(a12, a22), _add(b21, b22), cutoff)
+
+    c11 = _add(_sub(_add(p1, p4), p5), p7)
+    c12 = _add(p3, p5)
+    c21 = _add(p2, p4)
+    c22 = _add(_add(_sub(p1, p2), p3), p6)
+
+    rows = [r1 + r2 for r1, r2 in zip(c11, c12)] + [r1 + r2 for r1, r2 in zip(c21, c22)]
+    return [row[:m] for row in rows[:n]]
+
+
+
+def strassen_dmatrix(a, b, cutoff=None):
+    """
+    strassen_dmatrix(a, b, [cutoff])
+    The product of DMatrix a and DMatrix b with Strassen's algorithm as a flat row by row list.
+    """
+    rows = strassen([list(row) for row in a._rows()], [list(row) for row in b._rows()], cutoff)
+    return list(itertools.chain.from_iterable(rows))
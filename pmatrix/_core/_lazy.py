@@ -0,0 +1,215 @@
+"""
+Lazy evaluation of element wise expressions on DMatrix and DVec.
+
+With set_lazy(True) the element wise operators, abs and round do not compute
+anything, they return a LazyExpr node of the expression tree instead. The tree is
+evaluated on LazyExpr.eval(), or on the first access of anything else than its shape.
+Evaluating nests one map per node over the flat operand buffers, so the whole
+expression is computed in a single pass and only the result is allocated.
+
+The operands are referenced, not copied: a later write to an operand copies
+its buffer first (copy-on-write), so the expression still sees the old values.
+"""
+
+import operator
+
+from ._broadcast import broadcast, evaluate, flat_leaf, rsub, rtruediv, rmod, rpow
+
+_LAZY = {"enabled": False}
+
+
+def set_lazy(enabled=True):
+    """
+    set_lazy(enabled=True)
+    Turns lazy evaluation of element wise operations on or off.
+
+    Parameters
+    ----------
+    enabled: bool
+        If True the element wise operators on DMatrix and DVec return
+        a LazyExpr, which is computed in one fused pass on .eval() or first access.
+    """
+    if not isinstance(enabled, bool): raise TypeError(f"enabled must be a bool, not {type(enabled)}")
+    _LAZY["enabled"] = enabled
+
+
+def get_lazy():
+    """
+    get_lazy()
+    Whether lazy evaluation of element wise operations is on.
+    """
+    return _LAZY["enabled"]
+
+
+def _operand_view(x):
+    # A view of a DMatrix, DVec or the result of an evaluated LazyExpr, other operands are kept as they are.
+    if getattr(x, "_format", None) == "lazy" and x._value is not None:
+        x = x._value
+    return x._view() if getattr(x, "_format", None) in ("dvec", "dmat") else x
+
+
+def lazy_operator(target, opp, *others):
+    """
+    lazy_operator(target, opp, *others)
+    The LazyExpr of opp(target, *others), element wise with broadcasting, where target is a DMatrix, DVec or LazyExpr.
+    Returns NotImplemented if one of the others is not supported, like the eager operators do.
+    """
+    # The leaves read the buffers of the dense operands, which views of them keep in the share groups.
+    views = tuple(map(_operand_view, (target,) + others))
+    operands = broadcast(views)
+    if operands is None:
+        return NotImplemented
+    shape, orientation, leaves = operands
+    return LazyExpr(opp, leaves, shape, orientation, views)
+
+
+class LazyExpr:
+    """
+    A node of a lazily evaluated element wise expression on DMatrix or DVec,
+    created by the operators while set_lazy(True) is on.
+
+    LazyExpr.eval() computes the expression in one pass and returns the DMatrix or DVec,
+    the result is cached. Any other attribute, indexing, iteration or printing
+    evaluates the expression first and is then done on the result.
+    Assigning items is not supported, other expressions may still read this one.
+    Operators on a LazyExpr extend the expression tree.
+
+    The shape of the result is known without evaluating, for a vector it is (length,).
+    """
+    __slots__ = ("opp", "operands", "shape", "orientation", "_value", "_views")
+    _format = "lazy"
+
+    def __init__(self, opp, operands, shape, orientation=None, views=()):
+        self.opp = opp
+        self.operands = operands
+        self.shape = shape
+        self.orientation = orientation
+        self._value = None
+        self._views = views
+
+    def _is_vector(self):
+        return len(self.shape) == 1
+
+    @property
+    def length(self):
+        if not self._is_vector(): raise AttributeError("A matrix expression has no length, use shape")
+        return self.shape[0]
+
+    def _iter(self, start, stop):
+        # The elements start:stop of the result, row by row, as one chain of maps.
+        if self._value is not None:
+            flat = self._value._items() if self._is_vector() else self._value._flat()
+            return flat_leaf(flat)(start, stop)
+        return map(self.opp, *[leaf(start, stop) for leaf in self.operands])
+
+    def eval(self):
+        """
+        LazyExpr.eval()
+        Computes the expression, only the first call does the work.
+
+        Returns
+        -------
+        DMatrix or DVec
+        """
+        if self._value is None:
+            from ._dvec import DVec
+            from ._dmatrix import DMatrix
+            size = self.shape[0] if self._is_vector() else self.shape[0] * self.shape[1]
+            buf, dtype = evaluate(self.opp, self.operands, size)
+            if self._is_vector():
+                self._value = DVec._from_buffer(buf, dtype, self.orientation)
+            else:
+                self._value = DMatrix._from_buffer(buf, self.shape, dtype)
+            self.operands = self._views = None
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.eval(), name)
+
+    def __getitem__(self, key):
+        return self.eval()[key]
+
+    def __setitem__(self, key, val):
+        raise TypeError("A LazyExpr is read only, assign to the DMatrix or DVec of LazyExpr.eval() instead")
+
+    def __iter__(self):
+        return iter(self.eval())
+
+    def __len__(self):
+        return len(self.eval())
+
+    def __str__(self):
+        return str(self.eval())
+
+    def __repr__(self):
+        return f"LazyExpr(shape={self.shape})"
+
+    def __matmul__(self, other):
+        return self.eval() @ other
+
+    def __rmatmul__(self, other):
+        return other @ self.eval()
+
+    def __add__(self, other):
+        return lazy_operator(self, operator.__add__, other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return lazy_operator(self, operator.__sub__, other)
+
+    def __rsub__(self, other):
+        return lazy_operator(self, rsub, other)
+
+    def __mul__(self, other):
+        return lazy_operator(self, operator.__mul__, other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return lazy_operator(self, operator.__truediv__, other)
+
+    def __rtruediv__(self, other):
+        return lazy_operator(self, rtruediv, other)
+
+    def __mod__(self, other):
+        return lazy_operator(self, operator.__mod__, other)
+
+    def __rmod__(self, other):
+        return lazy_operator(self, rmod, other)
+
+    def __pow__(self, other):
+        return lazy_operator(self, operator.__pow__, other)
+
+    def __rpow__(self, other):
+        return lazy_operator(self, rpow, other)
+
+    def __lt__(self, other):
+        return lazy_operator(self, operator.__lt__, other)
+
+    def __le__(self, other):
+        return lazy_operator(self, operator.__le__, other)
+
+    def __eq__(self, other):
+        return lazy_operator(self, operator.__eq__, other)
+
+    def __ne__(self, other):
+        return lazy_operator(self, operator.__ne__, other)
+
+    def __ge__(self, other):
+        return lazy_operator(self, operator.__ge__, other)
+
+    def __gt__(self, other):
+        return lazy_operator(self, operator.__gt__, other)
+
+    __hash__ = None
+
+    def __abs__(self):
+        return lazy_operator(self, operator.__abs__)
+
+    def round(self, r=2):
+        """
+        LazyExpr.round(r)
+        Rounds all elements to r digits, lazily.
+        """
+        return lazy_operator(self, round, r)
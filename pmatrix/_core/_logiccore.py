@@ -1,9 +1,31 @@
-import operator
+import operator, weakref
+
+class _ShareGroup(dict):
+    """
+    The vectors and matrices that use one buffer, as weak references keyed by their id.
+    Vectors and matrices compare element wise and are not hashable, so this is no WeakSet,
+    a reference removes itself when its object is gone.
+    """
+    __slots__ = ()
+
+    def add(self, x):
+        ref = weakref.ref(x, self._remove)
+        self[id(ref)] = ref
+
+    def _remove(self, ref):
+        self.pop(id(ref), None)
+
+    def discard(self, x):
+        for key, ref in list(self.items()):
+            if ref() is x:
+                del self[key]
 
 class LogicCore:
     """
     This handles some global logic
     """
+    __slots__ = ()
+
     def _parse_getkey(self, key):
         def parse_part(key_part, axis):
             if isinstance(key_part, int):
@@ -14,7 +36,7 @@ class LogicCore:
             elif isinstance(key_part, (list, tuple)):
                 if any([not isinstance(k, int) for k in key_part]): raise ValueError(f"Can only index with list of int")
                 if any([k>= self.shape[axis] for k in key_part]): raise ValueError(f"IndexError {key_part} out of range for axis {axis} with length {self.shape[axis]}")
-                return operator.itemgetter(*key_part)
+                return list(key_part)
             else:
                 raise ValueError(f"Cannot index using {type(key_part)}, only int, slice or list of int are allowed.")
             
@@ -39,15 +61,35 @@ class LogicCore:
             parsed_key = tuple([None] * index + [parse_part(key, index)] + [slice(None)] * (len(self.shape) - index - 1))
         return parsed_key
     
+    def _share_buf(self, view):
+        # Views share the buffer of their parent, which is only copied when one of them is written to.
+        # Everything that uses one buffer is in one share group, made when the first view is.
+        if self._share is None:
+            self._share = _ShareGroup()
+            self._share.add(self)
+        self._share.add(view)
+        view._share = self._share
+        return view
+
+    def _leave_share(self):
+        # Called when the buffer is replaced, the slot is unset while the object is being built.
+        share = getattr(self, "_share", None)
+        if share is not None:
+            share.discard(self)
+        self._share = None
+
+    def _buf_shared(self):
+        return self._share is not None and len(self._share) > 1
+
     def _get_item_logic(self, key):
         if isinstance(key, int):
-            return self.data[key]
+            return self._items()[key]
         elif isinstance(key, slice):
-            return self.data[key]
+            return self._items()[key]
         elif isinstance(key, list):
-            return list(operator.itemgetter(*key)(self.data))
+            return list(operator.itemgetter(*key)(self._items()))
         elif isinstance(key, operator.itemgetter):
-            return list(key(self.data))
+            return list(key(self._items()))
         elif isinstance(key, tuple):
             raise ValueError(f"Vector is 1D, can not use tuple")
         else:
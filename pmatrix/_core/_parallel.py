@@ -0,0 +1,140 @@
+"""
+Multi-process matrix multiplication.
+
+The output is split in blocks of rows, every block is computed by a worker of a
+ProcessPoolExecutor. The operands are placed once in multiprocessing.shared_memory,
+the left matrix row by row and the right matrix column by column, so the workers
+read them without pickling. Every worker writes its rows straight into a shared
+output buffer, which is copied once into the result.
+
+Only float matrices are multiplied in parallel, other dtypes are done serially.
+"""
+
+import array, atexit, os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from ._gemm import gemm, gemm_dmatrix
+
+_PARALLEL = {"workers": 1, "threshold": 256}
+_EXECUTOR = {"pool": None, "workers": 0}
+
+
+def set_parallel(workers=None, threshold=None):
+    """
+    set_parallel(workers=None, threshold=None)
+    Configures the multi-process matmul, used by DMatrix.matmul(method='parallel')
+    and by method='auto' when more than one worker is set.
+
+    Parameters
+    ----------
+    workers: int, optional
+        The number of worker processes, 0 uses os.cpu_count(),
+        1 keeps the matmul serial.
+    threshold: int, optional
+        Products where all dimensions are smaller than this stay serial.
+    """
+    if workers is not None:
+        if not isinstance(workers, int) or workers < 0: raise ValueError(f"Workers must be a non negative int, not {workers}")
+        _PARALLEL["workers"] = workers or os.cpu_count() or 1
+    if threshold is not None:
+        if not isinstance(threshold, int) or threshold < 0: raise ValueError(f"Threshold must be a non negative int, not {threshold}")
+        _PARALLEL["threshold"] = threshold
+
+
+def get_parallel():
+    """
+    get_parallel()
+    Returns the (workers, threshold) of the multi-process matmul.
+    """
+    return _PARALLEL["workers"], _PARALLEL["threshold"]
+
+
+def use_parallel(a, b, workers=None):
+    """
+    Whether the product of DMatrix a and DMatrix b is large enough, and of the right dtype,
+    to be computed by multiple processes.
+    """
+    workers = _PARALLEL["workers"] if workers is None else workers
+    return (
+        workers > 1
+        and a.dtype is float and b.dtype is float
+        and isinstance(a._buf, array.array) and isinstance(b._buf, array.array)
+        and max(a.shape[0], a.shape[1], b.shape[1]) >= _PARALLEL["threshold"]
+    )
+
+
+def _pool(workers):
+    if _EXECUTOR["workers"] != workers:
+        if _EXECUTOR["pool"] is not None:
+            _EXECUTOR["pool"].shutdown()
+        _EXECUTOR["pool"] = ProcessPoolExecutor(workers)
+        _EXECUTOR["workers"] = workers
+    return _EXECUTOR["pool"]
+
+
+def _shutdown():
+    if _EXECUTOR["pool"] is not None:
+        _EXECUTOR["pool"].shutdown()
+
+atexit.register(_shutdown)
+
+
+def _shared_copy(buf):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(buf) * buf.itemsize))
+    shm.buf[:len(buf) * buf.itemsize] = memoryview(buf).cast('B')
+    return shm
+
+
+def _matmul_rows(a_name, b_name, out_name, n, k, m, row_start, row_stop):
+    # Worker: computes rows row_start:row_stop of the product and writes them into the output block.
+    a_shm = shared_memory.SharedMemory(name=a_name)
+    b_shm = shared_memory.SharedMemory(name=b_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        # The views are released before the blocks are closed, also when the product raises.
+        with a_shm.buf.cast('d') as a_view, b_shm.buf.cast('d') as b_view, out_shm.buf.cast('d') as out_view:
+            a_rows = [a_view[i * k: (i + 1) * k].tolist() for i in range(row_start, row_stop)]
+            b_cols = [b_view[j * k: (j + 1) * k].tolist() for j in range(m)]
+            out_view[row_start * m: row_stop * m] = array.array('d', gemm(a_rows, b_cols))
+    finally:
+        a_shm.close()
+        b_shm.close()
+        out_shm.close()
+    return row_stop - row_start
+
+
+def parallel_matmul(a, b, workers=None):
+    """
+    parallel_matmul(a, b, workers=None)
+    The product of DMatrix a and DMatrix b as a flat row by row buffer,
+    computed by worker processes when use_parallel(a, b, workers) holds,
+    else by the serial gemm kernel.
+    """
+    workers = _PARALLEL["workers"] if workers is None else workers
+    if not use_parallel(a, b, workers):
+        return gemm_dmatrix(a, b)
+
+    n, k, m = a.shape[0], a.shape[1], b.shape[1]
+    a_shm = _shared_copy(a._flat('r'))
+    b_shm = _shared_copy(b._flat('c'))
+    out_shm = shared_memory.SharedMemory(create=True, size=max(1, n * m * 8))
+    try:
+        step = -(-n // workers)
+        blocks = [(i, min(i + step, n)) for i in range(0, n, step)]
+        futures = [
+            _pool(workers).submit(_matmul_rows, a_shm.name, b_shm.name, out_shm.name, n, k, m, start, stop)
+            for start, stop in blocks
+        ]
+        for future in futures:
+            future.result()
+        # The segment is unlinked below, so the rows are copied out of it once, through a memoryview
+        # of the block, straight into the array the result wraps.
+        out = array.array('d')
+        with out_shm.buf[:n * m * 8] as block:
+            out.frombytes(block)
+    finally:
+        for shm in (a_shm, b_shm, out_shm):
+            shm.close()
+            shm.unlink()
+    return out
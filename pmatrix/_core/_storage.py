@@ -0,0 +1,266 @@
+"""
+Storage backends for the dense containers.
+
+By default the data of a DVec or DMatrix lives in a stdlib array:
+    int     -> array('q')
+    float   -> array('d')
+    complex -> ComplexArray, an array('d') with interleaved real and imaginary parts.
+Bools, and ints that do not fit in 64 bits, are kept in a python list.
+
+The old list backend can be selected with set_storage('list').
+"""
+
+import array, itertools
+
+_TYPECODES = {int: 'q', float: 'd'}
+# The dtypes that results of each type can be written into without losing information.
+_SAFE_CASTS = {bool: (bool, int, float, complex), int: (int, float, complex), float: (float, complex), complex: (complex,)}
+_STORAGE = {"mode": "array"}
+
+
+def set_storage(mode):
+    """
+    set_storage(mode)
+    Sets the storage backend used for new vectors and matrices.
+
+    Parameters
+    ----------
+    mode: {'array', 'list'}
+        'array' stores the data in compact stdlib arrays (8 bytes per float),
+        'list' stores the data in a python list of boxed numbers.
+    """
+    if mode not in ("array", "list"): raise ValueError(f"Storage mode must be 'array' or 'list', not {mode}")
+    _STORAGE["mode"] = mode
+
+
+def get_storage():
+    """
+    get_storage()
+    Returns the name of the current storage backend.
+    """
+    return _STORAGE["mode"]
+
+
+class ComplexArray:
+    """
+    Compact complex storage, a sequence of complex numbers kept as an
+    array('d') of interleaved real and imaginary parts (16 bytes per item).
+    """
+    __slots__ = ("parts",)
+    typecode = 'D'
+    itemsize = 16
+
+    def __init__(self, data=()):
+        if isinstance(data, ComplexArray):
+            self.parts = array.array('d', data.parts)
+            return
+        data = list(map(complex, data))
+        parts = array.array('d', bytes(16 * len(data)))
+        parts[0::2] = array.array('d', [d.real for d in data])
+        parts[1::2] = array.array('d', [d.imag for d in data])
+        self.parts = parts
+
+    @classmethod
+    def from_parts(cls, parts):
+        new = cls.__new__(cls)
+        new.parts = parts
+        return new
+
+    def _part_slices(self, key):
+        # The slices of self.parts that hold the real and imaginary parts of self[key].
+        start, stop, step = key.indices(len(self))
+        n = len(range(start, stop, step))
+        if n == 0:
+            return slice(0, 0), slice(0, 0)
+        last = 2 * (start + step * (n - 1))
+        end = last + 1 if step > 0 else (last - 1 if last > 0 else None)
+        return slice(2 * start, end, 2 * step), slice(2 * start + 1, last + 2 if step > 0 else last, 2 * step)
+
+    def __len__(self):
+        return len(self.parts) // 2
+
+    def __iter__(self):
+        return map(complex, self.parts[0::2], self.parts[1::2])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            real, imag = self._part_slices(key)
+            real, imag = self.parts[real], self.parts[imag]
+            parts = array.array('d', bytes(16 * len(real)))
+            parts[0::2] = real
+            parts[1::2] = imag
+            return ComplexArray.from_parts(parts)
+        if key < 0:
+            key += len(self)
+        return complex(self.parts[2 * key], self.parts[2 * key + 1])
+
+    def __setitem__(self, key, val):
+        if isinstance(key, slice):
+            if not isinstance(val, ComplexArray):
+                val = ComplexArray(val)
+            if key.step is None or key.step == 1:
+                start, stop, _ = key.indices(len(self))
+                self.parts[2 * start: 2 * max(start, stop)] = val.parts
+                return
+            real, imag = self._part_slices(key)
+            self.parts[real] = val.parts[0::2]
+            self.parts[imag] = val.parts[1::2]
+            return
+        if key < 0:
+            key += len(self)
+        val = complex(val)
+        self.parts[2 * key] = val.real
+        self.parts[2 * key + 1] = val.imag
+
+    def __eq__(self, other):
+        if isinstance(other, ComplexArray):
+            return self.parts == other.parts
+        return list(self) == other
+
+    def __add__(self, other):
+        if not isinstance(other, ComplexArray):
+            other = ComplexArray(other)
+        return ComplexArray.from_parts(self.parts + other.parts)
+
+    def __mul__(self, n):
+        return ComplexArray.from_parts(self.parts * n)
+
+    def __copy__(self):
+        return ComplexArray.from_parts(array.array('d', self.parts))
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+    def __reduce__(self):
+        return (ComplexArray.from_parts, (self.parts,))
+
+    def index(self, item):
+        for i, d in enumerate(self):
+            if d == item:
+                return i
+        raise ValueError(f"{item} is not in array")
+
+    def tolist(self):
+        return list(self)
+
+    def __repr__(self):
+        return f"ComplexArray({self.tolist()})"
+
+
+def make_buffer(data, dtype):
+    """
+    make_buffer(data, dtype)
+    Stores an iterable of items that are already of type dtype in the current backend.
+    """
+    if _STORAGE["mode"] == "list" or dtype is bool:
+        return data if isinstance(data, list) else list(data)
+    if dtype is complex:
+        return ComplexArray(data)
+    if dtype is int and not isinstance(data, (list, array.array)):
+        data = list(data)
+    try:
+        return array.array(_TYPECODES[dtype], data)
+    except OverflowError:
+        return list(data)
+
+
+def cast_buffer(data, dtype):
+    """
+    cast_buffer(data, dtype)
+    Casts all items of data to dtype and stores them in the current backend.
+    Raises a TypeError when an item can not be converted.
+    """
+    if _STORAGE["mode"] != "list" and dtype in _TYPECODES:
+        try:
+            return array.array(_TYPECODES[dtype], data)
+        except (TypeError, OverflowError):
+            pass
+    try:
+        return make_buffer(list(map(dtype, data)), dtype)
+    except (ValueError, TypeError) as e:
+        raise TypeError(f"Not all data can be converted into {dtype.__name__}, {e}")
+
+
+def stream_buffer(items):
+    """
+    stream_buffer(items)
+    Stores an iterator of results in the current backend, the type of the first item is the dtype.
+    Floats are written into the buffer as they are produced, without a list in between.
+    Returns the buffer and its dtype.
+    """
+    first = next(items)
+    dtype = type(first)
+    items = itertools.chain((first,), items)
+    if _STORAGE["mode"] != "list" and dtype is float:
+        try:
+            return array.array('d', items), dtype
+        except TypeError as e:
+            raise TypeError(f"Not all data can be converted into float, {e}")
+    return cast_buffer(list(items), dtype), dtype
+
+
+def store_into(buf, key, items, dtype):
+    """
+    store_into(buf, key, items, dtype)
+    Writes an iterator of results into buf[key], where buf holds items of type dtype.
+    Raises a TypeError when the results do not fit dtype, like floats in an int buffer.
+    """
+    items = list(items)
+    if dtype not in _SAFE_CASTS.get(type(items[0]), ()): raise TypeError(f"Results of type {type(items[0]).__name__} can not be written into a buffer of dtype {dtype.__name__}")
+    buf[key] = cast_buffer(items, dtype)
+
+
+def zeros(length, dtype):
+    """
+    zeros(length, dtype)
+    A buffer of length zeros of type dtype.
+    """
+    # Repeating a one item array does not need a temporary bytes object as large as the buffer.
+    if _STORAGE["mode"] != "list" and dtype is complex:
+        return ComplexArray.from_parts(array.array('d', [0.0]) * (2 * length))
+    if _STORAGE["mode"] != "list" and dtype in _TYPECODES:
+        return array.array(_TYPECODES[dtype], [0]) * length
+    return [dtype(0)] * length
+
+
+def empty_like(buf, length):
+    """
+    empty_like(buf, length)
+    A buffer of the same kind as buf with room for length items, to be filled by slice assignment.
+    """
+    if isinstance(buf, ComplexArray):
+        return ComplexArray.from_parts(array.array('d', [0.0]) * (2 * length))
+    if isinstance(buf, array.array):
+        return array.array(buf.typecode, [0]) * length
+    return [0] * length
+
+
+def buffer_dtype(data):
+    """
+    buffer_dtype(data)
+    The python type of the items in data, based on the first item.
+    """
+    if isinstance(data, ComplexArray):
+        return complex
+    if isinstance(data, array.array):
+        return float if data.typecode == 'd' else int
+    return type(data[0])
+
+
+def strided_slice(offset, stride, length):
+    """
+    strided_slice(offset, stride, length)
+    The slice of a flat buffer that holds the length items starting at offset, stride apart.
+    """
+    stop = offset + stride * length
+    if stop < 0:
+        stop = None
+    return slice(offset, stop, stride)
+
+
+def chain_buffers(buffers, dtype):
+    """
+    chain_buffers(buffers, dtype)
+    Concatenates buffers into one buffer of the current backend.
+    """
+    return make_buffer(itertools.chain.from_iterable(buffers), dtype)
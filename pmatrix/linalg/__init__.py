@@ -1 +1,19 @@
-print("importing linear algorithms")
\ No newline at end of file
+"""
+Dense linear algebra on DMatrix.
+lu_factor: LU factorization with partial pivoting, the LUFactor solves, and gives det and inv.
+cholesky, cho_solve: Cholesky factorization of symmetric positive definite matrices and solves with it.
+ldl_factor: LDL.T factorization of symmetric indefinite matrices with Bunch-Kaufman pivoting.
+cg, bicgstab, gmres: Krylov solvers for sparse matrices, DMatrix or functions, with preallocated work vectors.
+jacobi, ssor, ilu0: preconditioners for the Krylov solvers.
+splu, spcholesky: sparse LU and Cholesky factorizations over CSC, with a reusable symbolic analysis.
+amd: the approximate minimum degree ordering of a sparse matrix.
+qr, lstsq: blocked Householder QR and least squares without forming Q, tsqr for tall matrices given as row chunks.
+"""
+
+from ._cholesky import cholesky, cho_solve, ldl_factor, LDLFactor
+from ._lu import lu_factor, LUFactor
+from ._qr import qr, lstsq, tsqr, TSQR
+from ._preconditioners import jacobi, ssor, ilu0, Preconditioner, Jacobi, SSOR, ILU0
+from ._krylov import cg, bicgstab, gmres
+from ._ordering import amd
+from ._sparse_direct import splu, spcholesky, analyze_lu, analyze_cholesky, SparseLU, SparseCholesky, LUSymbolic, CholeskySymbolic
@@ -0,0 +1,315 @@
+"""
+Cholesky and LDL.T factorizations of symmetric matrices.
+
+Both read only the lower triangle and take about n**3 / 3 flops, half of the 2 n**3 / 3 of an LU.
+"""
+
+from __future__ import annotations
+from .._core._dmatrix import DMatrix
+from .._core._gemm import _dot
+from ._triangular import lower_rows, rhs_columns, forward_substitution, transposed_back_substitution, lower_update, rows_to_dmatrix
+import math
+
+# Number of columns factorized as one panel before the trailing lower triangle is updated with the gemm kernel.
+CHOLESKY_BLOCK_SIZE = 64
+# The Bunch-Kaufman threshold, a 1x1 pivot is kept while it is at least ALPHA times the largest entry below it.
+ALPHA = (1 + math.sqrt(17)) / 8
+
+
+def cholesky_rows(rows, dtype, block=None):
+    """
+    cholesky_rows(rows, dtype, [block])
+    Factorizes the lower triangle in rows in place into L, with A = L L.H.
+    A panel of block columns is factorized column by column, every entry one dot product over the panel,
+    then the trailing lower triangle is updated with the gemm kernel, see lower_update.
+    Raises a ValueError if the matrix is not positive definite.
+    """
+    block = CHOLESKY_BLOCK_SIZE if block is None else block
+    n = len(rows)
+    conjugate = dtype is complex
+    for k0 in range(0, n, block):
+        k1 = min(k0 + block, n)
+        for j in range(k0, k1):
+            row_j = rows[j]
+            l_j = list(map(complex.conjugate, row_j[k0:j])) if conjugate else row_j[k0:j]
+            d = row_j[j] - _dot(row_j[k0:j], l_j) if j > k0 else row_j[j]
+            if conjugate:
+                d = d.real
+            if not d > 0: raise ValueError(f"Matrix is not positive definite, pivot {j} is {d}")
+            d = math.sqrt(d)
+            row_j[j] = dtype(d)
+            for row in rows[j + 1:]:
+                row[j] = (row[j] - _dot(row[k0:j], l_j)) / d if j > k0 else row[j] / d
+        if k1 < n:
+            w = [list(map(complex.conjugate, row[k0:k1])) if conjugate else row[k0:k1] for row in rows[k1:]]
+            lower_update(rows, w, k0, k1, block)
+    return rows
+
+
+def cholesky(a, lower=True, block=None) -> DMatrix:
+    """
+    cholesky(a, lower=True, [block])
+    The Cholesky factor of a symmetric, or hermitian, positive definite DMatrix, in about n**3 / 3 flops.
+    Only the lower triangle of a is read.
+
+    Parameters
+    ----------
+    a: DMatrix
+        A square matrix, int and float matrices are factorized in floats.
+    lower: bool
+        If True the lower triangular L with A = L @ L.H is returned, else the upper triangular U = L.H with A = U.H @ U.
+    block: int, optional
+        The panel width of the blocked algorithm, defaults to CHOLESKY_BLOCK_SIZE.
+
+    Returns
+    -------
+    DMatrix, with zeros in the other triangle.
+    """
+    rows, dtype = lower_rows(a)
+    cholesky_rows(rows, dtype, block)
+    zero = dtype(0)
+    n = len(rows)
+    if lower:
+        return rows_to_dmatrix([row + [zero] * (n - i - 1) for i, row in enumerate(rows)], dtype)
+    upper = [[zero] * n for _ in range(n)]
+    for i, row in enumerate(rows):
+        for j, v in enumerate(row):
+            upper[j][i] = v.conjugate() if dtype is complex else v
+    return rows_to_dmatrix(upper, dtype)
+
+
+def cho_solve(c, b, lower=True):
+    """
+    cho_solve(c, b, lower=True)
+    Solves A x = b with the Cholesky factor c of A made by cholesky, by forward and back substitution, O(n**2) per column.
+
+    Parameters
+    ----------
+    c: DMatrix
+        The factor, lower triangular L or upper triangular U like cholesky returned it, the other triangle is not read.
+    b: DVec or DMatrix
+        One right hand side, or one per column of a DMatrix.
+    lower: bool
+        Whether c is the lower factor L.
+
+    Returns
+    -------
+    DVec or DMatrix, like b.
+    """
+    if lower:
+        rows, dtype = lower_rows(c, "Factor")
+    else:
+        rows, dtype = lower_rows(c.T, "Factor")
+        if dtype is complex:
+            rows = [list(map(complex.conjugate, row)) for row in rows]
+    cols, wrap = rhs_columns(b, len(rows), dtype)
+    for col in cols:
+        forward_substitution(rows, col)
+        transposed_back_substitution(rows, col, conjugate=dtype is complex)
+    return wrap(cols)
+
+
+def _swap_symmetric(rows, p, q):
+    # Swaps rows and columns p < q of the symmetric matrix whose lower triangle is in rows.
+    # The entries left of p are whole row prefixes, the others move between row q and column p.
+    rows[p][:p], rows[q][:p] = rows[q][:p], rows[p][:p]
+    rows[p][p], rows[q][q] = rows[q][q], rows[p][p]
+    for j in range(p + 1, q):
+        rows[j][p], rows[q][j] = rows[q][j], rows[j][p]
+    for row in rows[q + 1:]:
+        row[p], row[q] = row[q], row[p]
+
+
+def ldl_rows(rows, block=None):
+    """
+    ldl_rows(rows, [block])
+    Factorizes the symmetric matrix, whose lower triangle is in rows, in place into P A P.T = L D L.T
+    with the Bunch-Kaufman pivoting, where D has 1x1 and 2x2 blocks. Afterwards rows holds D on the diagonal
+    and L below it, the off diagonal entry of a 2x2 block of D is returned separately.
+
+    Like LAPACK's sytrf a panel of columns is factorized first. Every panel column is brought up to date with
+    one dot product per entry over W = L D of the panel, the pivot is chosen on it and stored as a column of W.
+    The trailing lower triangle is then updated at once with L W.T by the gemm kernel.
+
+    Returns
+    -------
+    (perm, offdiag, singular), row i of the factors belongs to row perm[i] of A, offdiag maps the first index
+    of every 2x2 block to its off diagonal entry, singular is True when D has a zero 1x1 pivot.
+    """
+    block = CHOLESKY_BLOCK_SIZE if block is None else block
+    n = len(rows)
+    perm = list(range(n))
+    offdiag, singular = {}, False
+    k = 0
+    while k < n:
+        k0 = k
+        # w[i - k0] holds row i of W for the panel columns so far.
+        w = [[] for _ in range(n - k0)]
+
+        def column(j):
+            # Column j of the matrix, from row k down, updated with the panel columns so far.
+            values = [rows[j][i] for i in range(k, j)] + [row[j] for row in rows[j:]]
+            if k > k0:
+                w_j = w[j - k0]
+                values = [v - _dot(row[k0:k], w_j) for v, row in zip(values, rows[k:])]
+            return values
+
+        while k < n and k - k0 < block:
+            col_k = column(k)
+            abs_kk = abs(col_k[0])
+            col_max, i_max = 0, k
+            if k + 1 < n:
+                below = list(map(abs, col_k[1:]))
+                col_max = max(below)
+                i_max = k + 1 + below.index(col_max)
+            size, kp = 1, k
+            if max(abs_kk, col_max) == 0:
+                singular = True
+            elif abs_kk < ALPHA * col_max:
+                col_i = column(i_max)
+                row_max = max(abs(v) for i, v in enumerate(col_i) if i != i_max - k)
+                # Column k stays a 1x1 pivot when it is large enough against row_max, the largest off diagonal of column i_max.
+                if abs_kk * row_max < ALPHA * col_max * col_max:
+                    if abs(col_i[i_max - k]) >= ALPHA * row_max:
+                        kp, col_k = i_max, col_i
+                    else:
+                        size, kp = 2, i_max
+            kk = k + size - 1
+            if kp != kk:
+                _swap_symmetric(rows, kk, kp)
+                perm[kk], perm[kp] = perm[kp], perm[kk]
+                w[kk - k0], w[kp - k0] = w[kp - k0], w[kk - k0]
+                col_k[kk - k], col_k[kp - k] = col_k[kp - k], col_k[kk - k]
+                if size == 2:
+                    col_i[kk - k], col_i[kp - k] = col_i[kp - k], col_i[kk - k]
+            if size == 1:
+                for w_i, v in zip(w[k - k0:], col_k):
+                    w_i.append(v)
+                d = col_k[0]
+                rows[k][k] = d
+                for row, v in zip(rows[k + 1:], col_k[1:]):
+                    row[k] = v / d if d else v
+            else:
+                for w_i, v, u in zip(w[k - k0:], col_k, col_i):
+                    w_i.extend((v, u))
+                d11, d21, d22 = col_k[0], col_k[1], col_i[1]
+                det = d11 * d22 - d21 * d21
+                rows[k][k], rows[k + 1][k + 1], rows[k + 1][k] = d11, d22, 0 * d21
+                offdiag[k] = d21
+                for row, v, u in zip(rows[k + 2:], col_k[2:], col_i[2:]):
+                    row[k], row[k + 1] = (v * d22 - u * d21) / det, (u * d11 - v * d21) / det
+            k += size
+        if k < n:
+            lower_update(rows, w[k - k0:], k0, k, block)
+    return perm, offdiag, singular
+
+
+def ldl_factor(a, block=None) -> LDLFactor:
+    """
+    ldl_factor(a, [block])
+    The factorization P A P.T = L D L.T of a symmetric, possibly indefinite, DMatrix with Bunch-Kaufman pivoting,
+    where L is unit lower triangular and D block diagonal with 1x1 and 2x2 blocks, in about n**3 / 3 flops.
+    Only the lower triangle of a is read. A complex matrix is taken as complex symmetric, not hermitian.
+
+    Parameters
+    ----------
+    a: DMatrix
+        A square matrix, int and float matrices are factorized in floats.
+    block: int, optional
+        The panel width of the blocked algorithm, defaults to CHOLESKY_BLOCK_SIZE.
+
+    Returns
+    -------
+    LDLFactor
+    """
+    rows, dtype = lower_rows(a)
+    perm, offdiag, singular = ldl_rows(rows, block)
+    return LDLFactor(rows, perm, offdiag, singular, dtype)
+
+
+class LDLFactor:
+    """
+    The factorization P A P.T = L D L.T of a symmetric matrix, made by ldl_factor.
+
+    LDLFactor.L
+        The unit lower triangular DMatrix L.
+    LDLFactor.D
+        The block diagonal DMatrix D.
+    LDLFactor.perm
+        Row i of the factors belongs to row perm[i] of A.
+    """
+    def __init__(self, rows, perm, offdiag, singular, dtype):
+        self._rows = rows
+        self.perm = perm
+        self._offdiag = offdiag
+        self.singular = singular
+        self.shape = (len(rows), len(rows))
+        self.dtype = dtype
+
+    @property
+    def L(self) -> DMatrix:
+        n, zero, one = self.shape[0], self.dtype(0), self.dtype(1)
+        return rows_to_dmatrix([row[:i] + [one] + [zero] * (n - i - 1) for i, row in enumerate(self._rows)], self.dtype)
+
+    @property
+    def D(self) -> DMatrix:
+        n = self.shape[0]
+        d = [[self.dtype(0)] * n for _ in range(n)]
+        for i, row in enumerate(self._rows):
+            d[i][i] = row[i]
+        for k, v in self._offdiag.items():
+            d[k + 1][k] = d[k][k + 1] = v
+        return rows_to_dmatrix(d, self.dtype)
+
+    def solve(self, b):
+        """
+        LDLFactor.solve(b)
+        Solves A x = b by substitution with L, the 1x1 and 2x2 blocks of D and L.T, O(n**2) per column.
+
+        Parameters
+        ----------
+        b: DVec or DMatrix
+            One right hand side, or one per column of a DMatrix.
+
+        Returns
+        -------
+        DVec or DMatrix, like b.
+        """
+        if self.singular: raise ValueError("Matrix is singular")
+        cols, wrap = rhs_columns(b, self.shape[0], self.dtype)
+        n = self.shape[0]
+        for col in cols:
+            col[:] = map(col.__getitem__, self.perm)
+            forward_substitution(self._rows, col, unit=True)
+            i = 0
+            while i < n:
+                if i in self._offdiag:
+                    d11, d21, d22 = self._rows[i][i], self._offdiag[i], self._rows[i + 1][i + 1]
+                    det = d11 * d22 - d21 * d21
+                    col[i], col[i + 1] = (col[i] * d22 - col[i + 1] * d21) / det, (col[i + 1] * d11 - col[i] * d21) / det
+                    i += 2
+                else:
+                    col[i] /= self._rows[i][i]
+                    i += 1
+            transposed_back_substitution(self._rows, col, unit=True)
+            x = col[:]
+            for i, p in enumerate(self.perm):
+                x[p] = col[i]
+            col[:] = x
+        return wrap(cols)
+
+    def det(self):
+        """
+        LDLFactor.det()
+        The determinant of A, the product of the determinants of the blocks of D.
+        """
+        det = self.dtype(1)
+        i, n = 0, self.shape[0]
+        while i < n:
+            if i in self._offdiag:
+                det *= self._rows[i][i] * self._rows[i + 1][i + 1] - self._offdiag[i] ** 2
+                i += 2
+            else:
+                det *= self._rows[i][i]
+                i += 1
+        return det
@@ -0,0 +1,335 @@
+"""
+Krylov solvers for A x = b: conjugate gradients, BiCGSTAB and restarted GMRES.
+
+A is only used through matrix vector products, so it can be a sparse matrix, a
+DMatrix or a function. All work vectors are allocated once before the first
+iteration, every iteration writes into them CHUNK_SIZE items at a time.
+"""
+
+from __future__ import annotations
+from .._core._dmatrix import DMatrix
+from .._core._dvec import DVec
+from .._core._gemm import _dot
+from .._core._storage import zeros
+from ..sparse._cbase import CBase
+from ..sparse._compressed import write_chunks
+from ._preconditioners import Preconditioner
+import itertools, operator, math
+
+
+def _operator(a, n, name="A"):
+    """
+    _operator(a, n, [name])
+    The product a @ x as a function apply(x, out, dtype) that writes it into the buffer out,
+    for a sparse matrix, a DMatrix or a function of a DVec that returns a DVec, list or array.
+
+    Returns
+    -------
+    (apply, dtype), dtype is None for a function.
+    """
+    if isinstance(a, CBase):
+        if a.shape != (n, n): raise ValueError(f"{name} of shape {a.shape} does not match a right hand side of length {n}")
+        return a._matvec, a.dtype
+    if isinstance(a, DMatrix):
+        if a.shape != (n, n): raise ValueError(f"{name} of shape {a.shape} does not match a right hand side of length {n}")
+        rows = a._rows()
+        def apply(x, out, dtype):
+            return write_chunks(map(_dot, rows, itertools.repeat(x)), n, out, dtype)
+        return apply, a.dtype
+    if isinstance(a, Preconditioner):
+        if a.shape != (n, n): raise ValueError(f"{name} of shape {a.shape} does not match a right hand side of length {n}")
+        return a._solve_into, a.dtype
+    if callable(a):
+        def apply(x, out, dtype):
+            y = a(DVec._from_buffer(x, dtype, 'c'))
+            y = y._items() if isinstance(y, DVec) else y
+            if len(y) != n: raise ValueError(f"{name} returned a vector of length {len(y)}, not {n}")
+            return write_chunks(iter(y), n, out, dtype)
+        return apply, None
+    raise TypeError(f"{name} must be a sparse matrix, DMatrix or callable, not {type(a)}")
+
+
+class _Problem:
+    """
+    The buffers and vector kernels shared by the solvers. Every kernel works on whole
+    buffers of length n and writes in place, in chunks of CHUNK_SIZE items.
+    """
+    def __init__(self, a, b, x0, tol, atol, maxiter, M):
+        b = b._items() if isinstance(b, DVec) else b
+        self.n = n = len(b)
+        if n == 0: raise ValueError("Right hand side is empty")
+        self.apply_a, a_dtype = _operator(a, n)
+        self.apply_m, m_dtype = _operator(M, n, "M") if M is not None else (None, None)
+        dtype = float
+        if complex in (a_dtype, m_dtype) or isinstance(b[0], complex):
+            dtype = complex
+        self.dtype = dtype
+        self.b = self.buffer(b)
+        self.x = self.buffer()
+        if x0 is not None:
+            x0 = x0._items() if isinstance(x0, DVec) else x0
+            if len(x0) != n: raise ValueError(f"x0 of length {len(x0)} does not match a right hand side of length {n}")
+            self.copy(x0, self.x)
+        self.target = max(tol * self.norm(self.b), atol)
+        self.maxiter = 10 * n if maxiter is None else maxiter
+
+    def buffer(self, items=None):
+        # A new work buffer of length n, zeros or a copy of items.
+        buf = zeros(self.n, self.dtype)
+        if items is not None:
+            self.copy(items, buf)
+        return buf
+
+    def copy(self, x, y):
+        # y = x
+        write_chunks(iter(x), self.n, y, self.dtype)
+
+    def dot(self, x, y):
+        # The inner product, conjugating x for complex vectors.
+        if self.dtype is complex:
+            return sum(map(operator.__mul__, map(complex.conjugate, x), y))
+        return _dot(x, y)
+
+    def norm(self, x):
+        return math.sqrt(abs(self.dot(x, x)))
+
+    def axpy(self, a, x, y):
+        # y += a * x
+        write_chunks(map(operator.__add__, y, map(operator.__mul__, itertools.repeat(a), x)), self.n, y, self.dtype)
+
+    def xpay(self, x, a, y):
+        # y = x + a * y
+        write_chunks(map(operator.__add__, x, map(operator.__mul__, itertools.repeat(a), y)), self.n, y, self.dtype)
+
+    def scale(self, a, x, y):
+        # y = a * x
+        write_chunks(map(operator.__mul__, itertools.repeat(a), x), self.n, y, self.dtype)
+
+    def matvec(self, x, out):
+        self.apply_a(x, out, self.dtype)
+
+    def precondition(self, r, z):
+        # z = M^-1 r, a copy of r without a preconditioner.
+        if self.apply_m is None:
+            self.copy(r, z)
+        else:
+            self.apply_m(r, z, self.dtype)
+
+    def residual(self, r):
+        # r = b - A x, the norm of r.
+        self.matvec(self.x, r)
+        self.xpay(self.b, -1, r)
+        return self.norm(r)
+
+    def result(self, info):
+        return DVec._from_buffer(self.x, self.dtype, 'c'), info
+
+
+def cg(A, b, x0=None, tol=1e-5, atol=0.0, maxiter=None, M=None, callback=None):
+    """
+    cg(A, b, [x0, tol, atol, maxiter, M, callback])
+    Solves A x = b with the preconditioned conjugate gradient method, for a symmetric,
+    or Hermitian, positive definite A. Every iteration is one product with A, one
+    application of M^-1 and O(n) vector work on five preallocated buffers.
+
+    Parameters
+    ----------
+    A: CSR, CSC, DIA, BSR, DMatrix or callable
+        The matrix, or a function that maps a DVec x to A @ x.
+    b: DVec, list or array
+        The right hand side.
+    x0: DVec, list or array, optional
+        The starting guess, defaults to zeros.
+    tol, atol: float
+        The iteration stops when the residual norm is at most max(tol * norm(b), atol).
+    maxiter: int, optional
+        The maximum number of iterations, defaults to 10 * n.
+    M: Preconditioner, CSR, CSC, DIA, BSR, DMatrix or callable, optional
+        The preconditioner, applied as M^-1 r: one of jacobi, ssor or ilu0, or an approximation
+        of the inverse of A. It must be symmetric positive definite as well.
+    callback: callable, optional
+        Called as callback(k, residual_norm) after iteration k.
+
+    Returns
+    -------
+    (x, info), x is a column DVec, info is 0 when converged, else the number of iterations done.
+    """
+    problem = _Problem(A, b, x0, tol, atol, maxiter, M)
+    r, p, ap = problem.buffer(), problem.buffer(), problem.buffer()
+    z = problem.buffer() if M is not None else r
+    rnorm = problem.residual(r) if x0 is not None else problem.norm(problem.b)
+    if x0 is None:
+        problem.copy(problem.b, r)
+    if rnorm <= problem.target:
+        return problem.result(0)
+    problem.precondition(r, z)
+    problem.copy(z, p)
+    rz = problem.dot(r, z)
+    for k in range(1, problem.maxiter + 1):
+        problem.matvec(p, ap)
+        pap = problem.dot(p, ap)
+        if pap == 0:
+            return problem.result(k)
+        alpha = rz / pap
+        problem.axpy(alpha, p, problem.x)
+        problem.axpy(-alpha, ap, r)
+        rnorm = problem.norm(r)
+        if callback is not None:
+            callback(k, rnorm)
+        if rnorm <= problem.target:
+            return problem.result(0)
+        if z is not r:
+            problem.precondition(r, z)
+        rz, rz_old = problem.dot(r, z), rz
+        problem.xpay(z, rz / rz_old, p)
+    return problem.result(problem.maxiter)
+
+
+def bicgstab(A, b, x0=None, tol=1e-5, atol=0.0, maxiter=None, M=None, callback=None):
+    """
+    bicgstab(A, b, [x0, tol, atol, maxiter, M, callback])
+    Solves A x = b with the stabilized biconjugate gradient method, for a general square A.
+    Every iteration is two products with A and two applications of M^-1, as a right
+    preconditioner, on at most eight preallocated buffers. See cg for the parameters.
+
+    Returns
+    -------
+    (x, info), x is a column DVec, info is 0 when converged, else the number of iterations done,
+    also after a breakdown.
+    """
+    problem = _Problem(A, b, x0, tol, atol, maxiter, M)
+    r, v, p, t = problem.buffer(), problem.buffer(), problem.buffer(), problem.buffer()
+    rnorm = problem.residual(r) if x0 is not None else problem.norm(problem.b)
+    if x0 is None:
+        problem.copy(problem.b, r)
+    if rnorm <= problem.target:
+        return problem.result(0)
+    r_hat = problem.buffer(r)
+    p_hat, s_hat = (problem.buffer(), problem.buffer()) if M is not None else (p, r)
+    rho = alpha = omega = 1
+    for k in range(1, problem.maxiter + 1):
+        rho, rho_old = problem.dot(r_hat, r), rho
+        if rho == 0:
+            return problem.result(k)
+        # p = r + beta * (p - omega * v)
+        problem.axpy(-omega, v, p)
+        problem.xpay(r, (rho / rho_old) * (alpha / omega), p)
+        if p_hat is not p:
+            problem.precondition(p, p_hat)
+        problem.matvec(p_hat, v)
+        r_hat_v = problem.dot(r_hat, v)
+        if r_hat_v == 0:
+            return problem.result(k)
+        alpha = rho / r_hat_v
+        # s = r - alpha * v, kept in r.
+        problem.axpy(-alpha, v, r)
+        rnorm = problem.norm(r)
+        if rnorm <= problem.target:
+            problem.axpy(alpha, p_hat, problem.x)
+            if callback is not None:
+                callback(k, rnorm)
+            return problem.result(0)
+        if s_hat is not r:
+            problem.precondition(r, s_hat)
+        problem.matvec(s_hat, t)
+        tt = problem.dot(t, t)
+        omega = problem.dot(t, r) / tt if tt else 0
+        problem.axpy(alpha, p_hat, problem.x)
+        problem.axpy(omega, s_hat, problem.x)
+        problem.axpy(-omega, t, r)
+        rnorm = problem.norm(r)
+        if callback is not None:
+            callback(k, rnorm)
+        if rnorm <= problem.target:
+            return problem.result(0)
+        if omega == 0:
+            return problem.result(k)
+    return problem.result(problem.maxiter)
+
+
+def _givens(a, b):
+    # The rotation (c, s) with c * a + s * b = r and -conj(s) * a + c * b = 0, c real.
+    if a == 0:
+        return 0.0, 1.0
+    t = math.hypot(abs(a), abs(b))
+    return abs(a) / t, a / abs(a) * b.conjugate() / t
+
+
+def gmres(A, b, x0=None, tol=1e-5, atol=0.0, maxiter=None, M=None, callback=None, restart=20):
+    """
+    gmres(A, b, [x0, tol, atol, maxiter, M, callback, restart])
+    Solves A x = b with the restarted generalized minimal residual method GMRES(restart), for a general square A.
+    Every iteration is one product with A and one application of M^-1, as a right preconditioner, then the
+    new basis vector is orthogonalized by modified Gram-Schmidt and the least squares problem is updated with
+    a Givens rotation, which gives the residual norm without computing the residual. The restart + 1 basis
+    vectors are allocated once. See cg for the parameters.
+
+    Parameters
+    ----------
+    maxiter: int, optional
+        The maximum number of iterations over all restarts, defaults to 10 * n.
+    callback: callable, optional
+        Called as callback(k, residual_norm) after iteration k, with the residual norm of the least squares problem.
+    restart: int
+        The number of iterations before the basis is discarded, it bounds the memory to restart + 3 vectors.
+
+    Returns
+    -------
+    (x, info), x is a column DVec, info is 0 when converged, else the number of iterations done.
+    """
+    if restart < 1: raise ValueError(f"restart must be at least 1, not {restart}")
+    problem = _Problem(A, b, x0, tol, atol, maxiter, M)
+    m = min(restart, problem.n)
+    basis = [problem.buffer() for _ in range(m + 1)]
+    w = problem.buffer()
+    z = problem.buffer() if M is not None else None
+    k = 0
+    while True:
+        rnorm = problem.residual(basis[0])
+        if rnorm <= problem.target:
+            return problem.result(0)
+        if k >= problem.maxiter:
+            return problem.result(k)
+        problem.scale(1 / rnorm, basis[0], basis[0])
+        # The columns of the Hessenberg matrix, rotated into the triangle R, and the rotated right hand side g.
+        h, rotations, g = [], [], [rnorm]
+        for j in range(m):
+            if z is None:
+                problem.matvec(basis[j], w)
+            else:
+                problem.precondition(basis[j], z)
+                problem.matvec(z, w)
+            column = []
+            for v in basis[:j + 1]:
+                hij = problem.dot(v, w)
+                problem.axpy(-hij, v, w)
+                column.append(hij)
+            h_next = problem.norm(w)
+            if h_next:
+                problem.scale(1 / h_next, w, basis[j + 1])
+            for i, (c, s) in enumerate(rotations):
+                column[i], column[i + 1] = c * column[i] + s * column[i + 1], -s.conjugate() * column[i] + c * column[i + 1]
+            c, s = _givens(column[j], h_next)
+            column[j] = c * column[j] + s * h_next
+            rotations.append((c, s))
+            g.append(-s.conjugate() * g[j])
+            g[j] = c * g[j]
+            h.append(column)
+            k += 1
+            if callback is not None:
+                callback(k, abs(g[j + 1]))
+            if abs(g[j + 1]) <= problem.target or k >= problem.maxiter or not h_next:
+                break
+        # Back substitution R y = g, then x += M^-1 (V y), M is applied once per restart.
+        size = len(h)
+        y = g[:size]
+        for i in range(size - 1, -1, -1):
+            y[i] = (y[i] - sum(h[j][i] * y[j] for j in range(i + 1, size))) / h[i][i]
+        problem.scale(y[0], basis[0], w)
+        for yi, v in zip(y[1:], basis[1:size]):
+            problem.axpy(yi, v, w)
+        if z is None:
+            problem.axpy(1, w, problem.x)
+        else:
+            problem.precondition(w, z)
+            problem.axpy(1, z, problem.x)
@@ -0,0 +1,157 @@
+"""
+LU factorization with partial pivoting.
+"""
+
+from __future__ import annotations
+from .._core._dmatrix import DMatrix
+from .._core._gemm import gemm
+from ._triangular import square_rows, rhs_columns, forward_substitution, back_substitution, columns_of, rows_to_dmatrix
+import operator, itertools
+
+# Number of columns factorized as one panel before the trailing matrix is updated with the gemm kernel.
+LU_BLOCK_SIZE = 64
+
+
+def lu_rows(rows, block=None):
+    """
+    lu_rows(rows, [block])
+    Factorizes the square matrix of the python lists rows in place into P A = L U, with partial pivoting.
+    Afterwards rows holds U on and above the diagonal and the multipliers of the unit lower triangular L below it.
+
+    The blocked right-looking algorithm factorizes a panel of block columns with rank one updates of the
+    panel only, solves the block row of U to its right, and then updates the whole trailing matrix at once
+    with one gemm call, where the O(n**3) work is done. Rows are swapped by reference.
+
+    Returns
+    -------
+    (perm, swaps, singular), row i of the factors is row perm[i] of A, swaps is the number of row swaps
+    and singular is True when a pivot column was all zero.
+    """
+    block = LU_BLOCK_SIZE if block is None else block
+    n = len(rows)
+    perm = list(range(n))
+    swaps, singular = 0, False
+    sub, mul = operator.__sub__, operator.__mul__
+    for k0 in range(0, n, block):
+        k1 = min(k0 + block, n)
+        for j in range(k0, k1):
+            column = list(map(abs, map(operator.itemgetter(j), rows[j:])))
+            p = j + column.index(max(column))
+            if p != j:
+                rows[j], rows[p] = rows[p], rows[j]
+                perm[j], perm[p] = perm[p], perm[j]
+                swaps += 1
+            pivot = rows[j][j]
+            if pivot == 0:
+                singular = True
+                continue
+            pivot_row = rows[j][j + 1:k1]
+            for row in rows[j + 1:]:
+                factor = row[j] / pivot
+                row[j] = factor
+                if factor:
+                    row[j + 1:k1] = map(sub, row[j + 1:k1], map(mul, itertools.repeat(factor), pivot_row))
+        if k1 == n:
+            break
+        # U12 = L11^-1 A12, a unit lower triangular solve on the block row right of the panel.
+        for j in range(k0, k1):
+            u_row = rows[j][k1:]
+            for row in rows[j + 1:k1]:
+                if row[j]:
+                    row[k1:] = map(sub, row[k1:], map(mul, itertools.repeat(row[j]), u_row))
+        # A22 -= L21 @ U12
+        m = n - k1
+        update = gemm([row[k0:k1] for row in rows[k1:]], columns_of(rows[k0:k1], k1))
+        for i, row in enumerate(rows[k1:]):
+            row[k1:] = map(sub, row[k1:], update[i * m:(i + 1) * m])
+    return perm, swaps, singular
+
+
+def lu_factor(a, block=None) -> LUFactor:
+    """
+    lu_factor(a, [block])
+    The LU factorization P A = L U of a square DMatrix with partial pivoting, in O(n**3).
+    The factor object solves systems with A in O(n**2) per right hand side, so a matrix that is solved
+    against many times is only factorized once.
+
+    Parameters
+    ----------
+    a: DMatrix
+        A square matrix, int and float matrices are factorized in floats.
+    block: int, optional
+        The panel width of the blocked algorithm, defaults to LU_BLOCK_SIZE.
+
+    Returns
+    -------
+    LUFactor
+    """
+    rows, dtype = square_rows(a)
+    perm, swaps, singular = lu_rows(rows, block)
+    return LUFactor(rows, perm, swaps, singular, dtype)
+
+
+class LUFactor:
+    """
+    The LU factorization P A = L U of a square matrix, made by lu_factor.
+
+    LUFactor.lu
+        DMatrix with U on and above the diagonal and L below it, the unit diagonal of L is not stored.
+    LUFactor.perm
+        Row i of lu belongs to row perm[i] of A.
+    """
+    def __init__(self, rows, perm, swaps, singular, dtype):
+        self._rows = rows
+        self.perm = perm
+        self.shape = (len(rows), len(rows))
+        self.dtype = dtype
+        self._swaps = swaps
+        self.singular = singular
+
+    @property
+    def lu(self) -> DMatrix:
+        return rows_to_dmatrix(self._rows, self.dtype)
+
+    def solve(self, b):
+        """
+        LUFactor.solve(b)
+        Solves A x = b by permuting b, then forward substitution with L and back substitution with U, O(n**2) per column.
+
+        Parameters
+        ----------
+        b: DVec or DMatrix
+            One right hand side, or one per column of a DMatrix.
+
+        Returns
+        -------
+        DVec or DMatrix, like b.
+        """
+        if self.singular: raise ValueError("Matrix is singular")
+        cols, wrap = rhs_columns(b, self.shape[0], self.dtype)
+        for col in cols:
+            col[:] = map(col.__getitem__, self.perm)
+            forward_substitution(self._rows, col, unit=True)
+            back_substitution(self._rows, col)
+        return wrap(cols)
+
+    def det(self):
+        """
+        LUFactor.det()
+        The determinant of A, the product of the diagonal of U, negated for an odd number of row swaps.
+        """
+        det = self.dtype(-1 if self._swaps % 2 else 1)
+        for i, row in enumerate(self._rows):
+            det *= row[i]
+        return det
+
+    def inv(self) -> DMatrix:
+        """
+        LUFactor.inv()
+        The inverse of A, solved column by column against the identity in O(n**3).
+
+        Returns
+        -------
+        DMatrix
+        """
+        n = self.shape[0]
+        identity = DMatrix._from_buffer([self.dtype(i == j) for i in range(n) for j in range(n)], self.shape, self.dtype)
+        return self.solve(identity)
@@ -0,0 +1,210 @@
+"""
+Fill reducing orderings and elimination trees for the sparse factorizations.
+
+Everything here only reads the pattern, the (indptr, indices) arrays of a CSC
+matrix, and returns python lists of ints.
+"""
+
+from __future__ import annotations
+from ..sparse._cbase import CBase
+import heapq, itertools
+
+
+def sparse_pattern(a, name="Matrix"):
+    """
+    sparse_pattern(a, [name])
+    The CSC matrix of a square sparse matrix, other formats are converted with to_csc.
+
+    Returns
+    -------
+    CSC
+    """
+    if not isinstance(a, CBase): raise TypeError(f"{name} must be a sparse matrix, not {type(a)}")
+    if a.shape[0] != a.shape[1]: raise ValueError(f"{name} must be square, not of shape {a.shape}")
+    return a.to_csc()
+
+
+def minimum_degree(n, adjacency, elements=()):
+    """
+    minimum_degree(n, adjacency, [elements])
+    The approximate minimum degree ordering of the graph with n variables, on the quotient graph of AMD.
+    adjacency[i] is the set of neighbours of variable i, every set in elements is a clique, like the
+    columns of one row of A for the graph of A.T @ A, which never has to be formed.
+
+    Eliminating a variable p turns it and all elements it is in into one new element, whose variables
+    are the neighbours of p. Elements inside the new one are absorbed. The degree of a neighbour i is
+    bounded by its variables, the new element and the external size |L_e \\ L_p| of its other elements,
+    which one pass over the new element gives for all of them, so no fill graph is built.
+
+    Returns
+    -------
+    list, perm[k] is the variable eliminated k-th.
+    """
+    variables = [set(a) for a in adjacency]
+    cliques = {e: set(clique) for e, clique in enumerate(elements)}
+    element_of = [set() for _ in range(n)]
+    for e, clique in cliques.items():
+        for i in clique:
+            element_of[i].add(e)
+    degree = []
+    for i in range(n):
+        reach = set(variables[i]).union(*map(cliques.__getitem__, element_of[i]))
+        reach.discard(i)
+        degree.append(len(reach))
+    heap = list(zip(degree, range(n)))
+    heapq.heapify(heap)
+    eliminated = [False] * n
+    perm = []
+    next_element = len(cliques)
+    while heap:
+        d, p = heapq.heappop(heap)
+        if eliminated[p] or d != degree[p]:
+            continue
+        eliminated[p] = True
+        perm.append(p)
+        absorbed = element_of[p]
+        new = variables[p].union(*map(cliques.pop, absorbed))
+        new.discard(p)
+        e_new, next_element = next_element, next_element + 1
+        cliques[e_new] = new
+        # |L_e \ new| for every element of a variable in new, elements that are inside new are absorbed.
+        external = {}
+        for i in new:
+            for e in element_of[i]:
+                if e not in absorbed:
+                    external[e] = external.get(e, len(cliques[e])) - 1
+        inside = {e for e, w in external.items() if w == 0}
+        for e in inside:
+            del cliques[e]
+        remaining = n - len(perm)
+        for i in new:
+            variables[i] -= new
+            variables[i].discard(p)
+            element_of[i] -= absorbed
+            element_of[i] -= inside
+            d = len(variables[i]) + len(new) - 1 + sum(map(external.__getitem__, element_of[i]))
+            element_of[i].add(e_new)
+            degree[i] = min(remaining - 1, degree[i] + len(new), d)
+            heapq.heappush(heap, (degree[i], i))
+        variables[p], element_of[p] = set(), set()
+    return perm
+
+
+def amd(a, ata=False) -> list:
+    """
+    amd(a, ata=False)
+    The approximate minimum degree ordering of a square sparse matrix, which keeps the fill in
+    of a factorization low, see minimum_degree.
+
+    Parameters
+    ----------
+    a: CSR, CSC, DIA or BSR
+        The matrix, only its pattern is read.
+    ata: bool
+        If False the ordering is for the pattern of a + a.T, for a Cholesky factorization
+        of P a P.T. If True it is a column ordering for the pattern of a.T @ a, for an LU
+        factorization of a[:, perm] with row pivoting.
+
+    Returns
+    -------
+    list, perm[k] is the row and column, or the column if ata, that goes to position k.
+    """
+    csc = sparse_pattern(a)
+    n = csc.shape[0]
+    if ata:
+        # Every row of a is a clique of the columns it has a nonzero in.
+        rows = [[] for _ in range(n)]
+        for j, (start, stop) in enumerate(itertools.pairwise(csc.indptr)):
+            for i in csc.indices[start:stop]:
+                rows[i].append(j)
+        return minimum_degree(n, [()] * n, rows)
+    adjacency = [set() for _ in range(n)]
+    for j, (start, stop) in enumerate(itertools.pairwise(csc.indptr)):
+        for i in csc.indices[start:stop]:
+            if i != j:
+                adjacency[i].add(j)
+                adjacency[j].add(i)
+    return minimum_degree(n, adjacency)
+
+
+def elimination_tree(indptr, indices, n, ata=False):
+    """
+    elimination_tree(indptr, indices, n, ata=False)
+    The elimination tree of the CSC pattern with n columns, of its upper triangle for a symmetric
+    matrix or of a.T @ a if ata, by Liu's algorithm with path compression, nearly O(nnz).
+    parent[j] is the row of the first nonzero below the diagonal in column j of the Cholesky factor.
+
+    Returns
+    -------
+    list, parent[j] or -1 for a root.
+    """
+    parent, ancestor = [-1] * n, [-1] * n
+    previous = [-1] * n if ata else None
+    for k, (start, stop) in enumerate(itertools.pairwise(indptr)):
+        for i in indices[start:stop]:
+            if ata:
+                # The columns of a.T @ a that meet column k are the earlier columns with a nonzero in row i.
+                i, previous[i] = previous[i], k
+            while i != -1 and i < k:
+                following = ancestor[i]
+                ancestor[i] = k
+                if following == -1:
+                    parent[i] = k
+                i = following
+    return parent
+
+
+def postorder(parent):
+    """
+    postorder(parent)
+    A depth first postorder of the tree, every subtree is numbered contiguously and before its root.
+    Reordering a matrix by the postorder of its elimination tree does not change the fill in.
+
+    Returns
+    -------
+    list, order[k] is the k-th node.
+    """
+    n = len(parent)
+    children = [[] for _ in range(n)]
+    for j in range(n - 1, -1, -1):
+        if parent[j] != -1:
+            children[parent[j]].append(j)
+    order = []
+    for root in range(n):
+        if parent[root] != -1:
+            continue
+        stack = [root]
+        while stack:
+            j = stack[-1]
+            if children[j]:
+                stack.append(children[j].pop())
+            else:
+                order.append(stack.pop())
+    return order
+
+
+def row_patterns(indptr, indices, parent):
+    """
+    row_patterns(indptr, indices, parent)
+    The pattern of every row of the Cholesky factor L of a symmetric CSC pattern, left of the diagonal.
+    Row k is the union of the paths in the elimination tree from the nonzeros above the diagonal in
+    column k up to k, which is found in O(nnz of the row) by marking the visited nodes.
+
+    Returns
+    -------
+    list, one sorted list of columns per row.
+    """
+    n = len(parent)
+    mark = [-1] * n
+    rows = []
+    for k, (start, stop) in enumerate(itertools.pairwise(indptr)):
+        mark[k] = k
+        row = []
+        for i in indices[start:stop]:
+            while i < k and mark[i] != k:
+                row.append(i)
+                mark[i] = k
+                i = parent[i]
+        row.sort()
+        rows.append(row)
+    return rows
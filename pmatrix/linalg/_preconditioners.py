@@ -0,0 +1,225 @@
+"""
+Preconditioners for the iterative solvers: Jacobi, SSOR and ILU(0).
+
+A preconditioner M approximates A, the solvers apply M^-1 to a residual every
+iteration. All of them are built once from the CSR rows of A and write M^-1 r
+into a given buffer, so applying them allocates no vectors.
+"""
+
+from __future__ import annotations
+from .._core._dmatrix import DMatrix
+from .._core._dvec import DVec
+from .._core._storage import make_buffer, zeros
+from ..sparse._cbase import CBase
+from ..sparse._csr import CSR
+from ..sparse._compressed import write_chunks
+from ._triangular import factor_dtype
+import bisect, itertools, operator
+
+
+def csr_rows(a, name="Matrix"):
+    """
+    csr_rows(a, [name])
+    The CSR arrays of a square sparse matrix or DMatrix, other sparse formats are converted with to_csr.
+
+    Returns
+    -------
+    (indptr, indices, data, dtype)
+    """
+    if isinstance(a, DMatrix):
+        a = CSR.from_dmatrix(a)
+    if not isinstance(a, CBase): raise TypeError(f"{name} must be a sparse matrix or DMatrix, not {type(a)}")
+    if a.shape[0] != a.shape[1]: raise ValueError(f"{name} must be square, not of shape {a.shape}")
+    a = a.to_csr()
+    return a.indptr, a.indices, a.data, factor_dtype(a.dtype)
+
+
+def diagonal_positions(indptr, indices):
+    # The position of the diagonal item of every row in data, found by bisection in the sorted row.
+    positions = []
+    for i, (start, stop) in enumerate(itertools.pairwise(indptr)):
+        p = bisect.bisect_left(indices, i, start, stop)
+        if p == stop or indices[p] != i: raise ValueError(f"Matrix has no diagonal item in row {i}")
+        positions.append(p)
+    return positions
+
+
+class Preconditioner:
+    """
+    The base of the preconditioners, solve applies M^-1 to a vector.
+    """
+    shape: tuple
+    dtype: type
+
+    def solve(self, r) -> DVec:
+        """
+        Preconditioner.solve(r)
+        The vector M^-1 r.
+
+        Parameters
+        ----------
+        r: DVec, list or array
+            A vector with shape[0] items.
+
+        Returns
+        -------
+        DVec, a column vector.
+        """
+        data = r._items() if isinstance(r, DVec) else r
+        if len(data) != self.shape[0]: raise ValueError(f"Vector of length {len(data)} does not match a preconditioner of shape {self.shape}")
+        dtype = complex if self.dtype is complex or isinstance(data[0], complex) else float
+        z = zeros(self.shape[0], dtype)
+        self._solve_into(data, z, dtype)
+        return DVec._from_buffer(z, dtype, 'c')
+
+    def _solve_into(self, r, z, dtype):
+        # Writes M^-1 r into the buffer z of type dtype, r and z are not the same buffer.
+        raise NotImplementedError
+
+
+class Jacobi(Preconditioner):
+    """
+    The Jacobi preconditioner M = diag(A), made by jacobi.
+    """
+    def __init__(self, inverse, dtype):
+        self._inverse = inverse
+        self.shape = (len(inverse), len(inverse))
+        self.dtype = dtype
+
+    def _solve_into(self, r, z, dtype):
+        write_chunks(map(operator.__mul__, self._inverse, r), self.shape[0], z, dtype)
+
+
+class _Sweeps(Preconditioner):
+    """
+    A preconditioner applied as one forward and one backward sweep over the rows,
+    z[i] = (scale * r[i] - sum(lower[i] * z)) * forward[i], then z[i] = z[i] * backward[i] - sum(upper[i] * z).
+    The strictly lower and upper parts are kept as one tuple of columns and one of values per row,
+    the garbage collector stops tracking tuples of numbers.
+    """
+    def __init__(self, lower, upper, forward, backward, scale, dtype):
+        self._lower, self._upper = lower, upper
+        self._forward, self._backward = forward, backward
+        self._scale = scale
+        self.shape = (len(forward), len(forward))
+        self.dtype = dtype
+
+    def _solve_into(self, r, z, dtype):
+        mul = operator.__mul__
+        scale, get = self._scale, z.__getitem__
+        for i, ((cols, vals), f) in enumerate(zip(self._lower, self._forward)):
+            z[i] = (scale * r[i] - sum(map(mul, vals, map(get, cols)))) * f
+        for i in range(self.shape[0] - 1, -1, -1):
+            cols, vals = self._upper[i]
+            z[i] = z[i] * self._backward[i] - sum(map(mul, vals, map(get, cols)))
+
+
+class SSOR(_Sweeps):
+    """
+    The symmetric successive over-relaxation preconditioner
+    M = (D + omega L) D^-1 (D + omega U) / (omega * (2 - omega)), made by ssor.
+    """
+
+
+class ILU0(_Sweeps):
+    """
+    The incomplete LU factorization without fill in, A ~ L U on the pattern of A, made by ilu0.
+    """
+
+
+def jacobi(a) -> Jacobi:
+    """
+    jacobi(a)
+    The Jacobi preconditioner, which divides by the diagonal of A. It costs O(n) to build and to apply
+    and works well for diagonally dominant matrices whose diagonal varies a lot.
+
+    Parameters
+    ----------
+    a: CSR, CSC, DIA, BSR or DMatrix
+        A square matrix with a nonzero diagonal.
+
+    Returns
+    -------
+    Jacobi
+    """
+    indptr, indices, data, dtype = csr_rows(a)
+    diagonal = [data[p] for p in diagonal_positions(indptr, indices)]
+    if 0 in diagonal: raise ValueError(f"Matrix has a zero on the diagonal in row {diagonal.index(0)}")
+    return Jacobi(make_buffer([1 / d for d in diagonal], dtype), dtype)
+
+
+def ssor(a, omega=1.0) -> SSOR:
+    """
+    ssor(a, omega=1.0)
+    The SSOR preconditioner, one forward and one backward Gauss-Seidel sweep relaxed by omega.
+    It is symmetric for a symmetric A, so it can be used with cg. Applying it costs O(nnz).
+
+    Parameters
+    ----------
+    a: CSR, CSC, DIA, BSR or DMatrix
+        A square matrix with a nonzero diagonal.
+    omega: float
+        The relaxation factor, 0 < omega < 2, omega = 1 is symmetric Gauss-Seidel.
+
+    Returns
+    -------
+    SSOR
+    """
+    if not 0 < omega < 2: raise ValueError(f"omega must be between 0 and 2, not {omega}")
+    indptr, indices, data, dtype = csr_rows(a)
+    positions = diagonal_positions(indptr, indices)
+    lower, upper, forward, backward = [], [], [], []
+    for (start, stop), p in zip(itertools.pairwise(indptr), positions):
+        d = data[p]
+        if d == 0: raise ValueError(f"Matrix has a zero on the diagonal in row {len(forward)}")
+        # Forward: (D + omega L) y = omega (2 - omega) r, backward: (D + omega U) z = D y.
+        lower.append((tuple(indices[start:p]), tuple(omega * v for v in data[start:p])))
+        upper.append((tuple(indices[p + 1:stop]), tuple(omega * v / d for v in data[p + 1:stop])))
+        forward.append(1 / d)
+        backward.append(1.0)
+    return SSOR(lower, upper, forward, backward, omega * (2 - omega), dtype)
+
+
+def ilu0(a) -> ILU0:
+    """
+    ilu0(a)
+    The incomplete LU factorization ILU(0): Gaussian elimination that only keeps the items on the
+    pattern of A, so L and U together have the nonzeros of A. Row i is eliminated with the rows k < i
+    it has a nonzero in, the IKJ order, in O(sum over the rows of the nonzeros of their rows k).
+    Applying it is one forward and one backward substitution in O(nnz).
+
+    Parameters
+    ----------
+    a: CSR, CSC, DIA, BSR or DMatrix
+        A square matrix with a nonzero diagonal.
+
+    Returns
+    -------
+    ILU0
+    """
+    indptr, indices, data, dtype = csr_rows(a)
+    positions = diagonal_positions(indptr, indices)
+    sub, mul = operator.__sub__, operator.__mul__
+    # The strictly upper part of every eliminated row, as a {column: value} map, and the pivots.
+    upper_rows, pivots = [], []
+    lower, upper, forward, backward = [], [], [], []
+    for i, ((start, stop), p) in enumerate(zip(itertools.pairwise(indptr), positions)):
+        row = dict(zip(indices[start:stop], map(dtype, data[start:stop])))
+        for k in indices[start:p]:
+            factor = row[k] / pivots[k]
+            row[k] = factor
+            if factor:
+                # Only the columns of row k that are in the pattern of row i are updated.
+                common = row.keys() & upper_rows[k].keys()
+                if common:
+                    u = upper_rows[k]
+                    row.update(zip(common, map(sub, map(row.__getitem__, common), map(mul, itertools.repeat(factor), map(u.__getitem__, common)))))
+        pivot = row[i]
+        if pivot == 0: raise ValueError(f"Zero pivot in row {i} of the incomplete factorization")
+        pivots.append(pivot)
+        upper_rows.append({j: row[j] for j in indices[p + 1:stop]})
+        lower.append((tuple(indices[start:p]), tuple(map(row.__getitem__, indices[start:p]))))
+        upper.append((tuple(indices[p + 1:stop]), tuple(row[j] / pivot for j in indices[p + 1:stop])))
+        forward.append(1.0)
+        backward.append(1 / pivot)
+    return ILU0(lower, upper, forward, backward, 1.0, dtype)
@@ -0,0 +1,357 @@
+"""
+Householder QR factorization, least squares and a streaming TSQR.
+
+The factorization works on the columns of the matrix as python lists. Every
+reflector is kept in the column it zeroed, below R, and a block of reflectors is
+applied at once in the compact WY form Q = I - V T V.H, with two gemm calls
+instead of one rank one update per reflector. Q is only formed when asked for,
+least squares applies Q.H to the right hand side the same way.
+"""
+
+from __future__ import annotations
+from .._core._dmatrix import DMatrix
+from .._core._dvec import DVec
+from .._core._gemm import gemm, _dot
+from .._core._storage import make_buffer, chain_buffers
+from ._triangular import factor_dtype, rhs_columns, back_substitution
+import itertools, operator, math, sys
+
+# Number of reflectors applied to the trailing columns as one block.
+QR_BLOCK_SIZE = 32
+
+
+def _conj_dot(x, y, dtype):
+    # x.H @ y
+    if dtype is complex:
+        return sum(map(operator.__mul__, map(complex.conjugate, x), y))
+    return _dot(x, y)
+
+
+def householder(col, j, dtype):
+    """
+    householder(col, j, dtype)
+    The reflector H = I - tau v v.H with H.H col[j:] = (beta, 0, ..., 0), in place of col: col[j] becomes beta
+    and col[j + 1:] the part of v below its leading 1. beta is real, with the sign that avoids cancellation.
+
+    Returns
+    -------
+    tau
+    """
+    alpha = col[j]
+    tail_norm = math.hypot(*map(abs, col[j + 1:]))
+    if tail_norm == 0 and alpha.imag == 0:
+        return dtype(0)
+    beta = -math.copysign(math.hypot(abs(alpha), tail_norm), alpha.real)
+    scale = 1 / (alpha - beta)
+    col[j + 1:] = map(operator.__mul__, col[j + 1:], itertools.repeat(scale))
+    col[j] = dtype(beta)
+    return (beta - alpha) / beta
+
+
+def _reflect(col, c, j, tau, dtype):
+    # c = H.H c for the reflector of col from row j, on the rows j: of the column c.
+    w = c[j] + _conj_dot(col[j + 1:], c[j + 1:], dtype)
+    w *= tau.conjugate()
+    if w:
+        c[j] -= w
+        c[j + 1:] = map(operator.__sub__, c[j + 1:], map(operator.__mul__, col[j + 1:], itertools.repeat(w)))
+
+
+def _block_vectors(cols, k0, k1, dtype):
+    # The reflectors k0:k1 as full columns on the rows k0:, with the leading 1 and zeros above it.
+    return [[dtype(0)] * (j - k0) + [dtype(1)] + cols[j][j + 1:] for j in range(k0, k1)]
+
+
+def _block_t(vectors, taus, dtype):
+    # The upper triangular T of Q = H_0 ... H_b-1 = I - V T V.H, column by column like LAPACK's larft.
+    b = len(vectors)
+    t = [[dtype(0)] * b for _ in range(b)]
+    for i in range(b):
+        t[i][i] = taus[i]
+        if i:
+            z = [_conj_dot(vectors[l][i:], vectors[i][i:], dtype) for l in range(i)]
+            for l in range(i):
+                t[l][i] = -taus[i] * sum(t[l][r] * z[r] for r in range(l, i))
+    return t
+
+
+def apply_block(vectors, t, k0, targets, adjoint, dtype):
+    """
+    apply_block(vectors, t, k0, targets, adjoint, dtype)
+    Applies Q.H = I - V T.H V.H, or Q = I - V T V.H if not adjoint, to the rows k0: of every column in targets,
+    in place. W = V.H C and V (T W) are both one gemm call.
+    """
+    if not targets:
+        return
+    sub, conj = operator.__sub__, complex.conjugate
+    b, nt = len(vectors), len(targets)
+    v_h = [list(map(conj, v)) for v in vectors] if dtype is complex else vectors
+    w = gemm(v_h, [c[k0:] for c in targets])
+    w_cols = [w[c::nt] for c in range(nt)]
+    t_rows = [[(t[l][i].conjugate() if adjoint else t[i][l]) for l in range(b)] for i in range(b)]
+    w = gemm(t_rows, w_cols)
+    update = gemm(list(zip(*vectors)), [w[c::nt] for c in range(nt)])
+    for c, col in enumerate(targets):
+        col[k0:] = map(sub, col[k0:], update[c::nt])
+
+
+def householder_qr(cols, dtype, block=None):
+    """
+    householder_qr(cols, dtype, [block])
+    Factorizes the matrix with the python lists cols as columns in place into Q R. Afterwards cols holds R on
+    and above the diagonal and the reflectors below it.
+
+    A panel of block columns is factorized with one reflector at a time, applied to the panel only. The trailing
+    columns are then updated with the whole panel at once, see apply_block, where the O(m n**2) work is done.
+
+    Returns
+    -------
+    (taus, blocks), the tau of every reflector and (k0, k1, T) for every panel.
+    """
+    block = QR_BLOCK_SIZE if block is None else block
+    m, n = len(cols[0]), len(cols)
+    k = min(m, n)
+    taus, blocks = [], []
+    for k0 in range(0, k, block):
+        k1 = min(k0 + block, k)
+        for j in range(k0, k1):
+            tau = householder(cols[j], j, dtype)
+            taus.append(tau)
+            if tau:
+                for c in cols[j + 1:k1]:
+                    _reflect(cols[j], c, j, tau, dtype)
+        vectors = _block_vectors(cols, k0, k1, dtype)
+        t = _block_t(vectors, taus[k0:k1], dtype)
+        blocks.append((k0, k1, t))
+        apply_block(vectors, t, k0, cols[k1:], True, dtype)
+    return taus, blocks
+
+
+def apply_qh(cols, blocks, targets, dtype):
+    """
+    apply_qh(cols, blocks, targets, dtype)
+    Applies Q.H of a householder_qr to the columns in targets in place, block by block, without forming Q.
+    """
+    for k0, k1, t in blocks:
+        apply_block(_block_vectors(cols, k0, k1, dtype), t, k0, targets, True, dtype)
+
+
+def apply_q(cols, blocks, targets, dtype):
+    """
+    apply_q(cols, blocks, targets, dtype)
+    Applies Q of a householder_qr to the columns in targets in place, the blocks in reverse order.
+    """
+    for k0, k1, t in reversed(blocks):
+        apply_block(_block_vectors(cols, k0, k1, dtype), t, k0, targets, False, dtype)
+
+
+def _columns_to_dmatrix(cols, n_rows, dtype):
+    # The DMatrix with the first n_rows items of every column, stored column by column.
+    return DMatrix._from_buffer(chain_buffers([c[:n_rows] for c in cols], dtype), (n_rows, len(cols)), dtype, (1, n_rows))
+
+
+def _upper(cols, n_rows, dtype):
+    # The columns of R, the items on and above the diagonal of the first n_rows rows, zeros below.
+    return [c[:min(j + 1, n_rows)] + [dtype(0)] * (n_rows - min(j + 1, n_rows)) for j, c in enumerate(cols)]
+
+
+def _qr_columns(a):
+    if not isinstance(a, DMatrix): raise TypeError(f"Matrix must be a DMatrix, not {type(a)}")
+    dtype = factor_dtype(a.dtype)
+    return [list(map(dtype, col)) for col in a._cols()], dtype
+
+
+def qr(a, mode="full", block=None):
+    """
+    qr(a, [mode, block])
+    The QR factorization a = Q R of an m x n DMatrix with blocked Householder reflectors, in O(m n**2).
+    Q is unitary and R upper triangular, with k = min(m, n).
+
+    Parameters
+    ----------
+    a: DMatrix
+        The matrix, int and float matrices are factorized in floats.
+    mode: str
+        'full' for Q of m x m and R of m x n, 'economic' for Q of m x k and R of k x n,
+        'r' for only the R of k x n, then Q is never formed.
+    block: int, optional
+        The number of reflectors applied as one block, defaults to QR_BLOCK_SIZE.
+
+    Returns
+    -------
+    (Q, R) as DMatrix, or R for mode 'r'.
+    """
+    if mode not in ("full", "economic", "r"): raise ValueError(f"mode must be 'full', 'economic' or 'r', not {mode}")
+    cols, dtype = _qr_columns(a)
+    m, n = a.shape
+    k = min(m, n)
+    _, blocks = householder_qr(cols, dtype, block)
+    r_rows = m if mode == "full" else k
+    r = _columns_to_dmatrix(_upper(cols, r_rows, dtype), r_rows, dtype)
+    if mode == "r":
+        return r
+    q_cols = [[dtype(i == j) for i in range(m)] for j in range(m if mode == "full" else k)]
+    apply_q(cols, blocks, q_cols, dtype)
+    return _columns_to_dmatrix(q_cols, m, dtype), r
+
+
+def _solve_r(cols, y_cols, n, m):
+    # Solves R x = y[:n] for the square R of the first n columns of a factorization, which must have full rank.
+    rows = [list(row) for row in zip(*[c[:n] for c in cols[:n]])]
+    largest = max((abs(rows[i][i]) for i in range(n)), default=0)
+    if any(abs(rows[i][i]) <= max(m, n) * sys.float_info.epsilon * largest for i in range(n)) or largest == 0:
+        raise ValueError("Matrix is rank deficient")
+    return [back_substitution(rows, y[:n]) for y in y_cols]
+
+
+def _like(b, x_cols, n, dtype):
+    # The solution columns as a column DVec for a DVec b, else as a DMatrix.
+    if isinstance(b, DVec):
+        return DVec._from_buffer(make_buffer(x_cols[0], dtype), dtype, 'c')
+    return _columns_to_dmatrix(x_cols, n, dtype)
+
+
+def lstsq(a, b, block=None):
+    """
+    lstsq(a, b, [block])
+    The least squares solution x that minimizes norm(a @ x - b), for an m x n DMatrix a with m >= n and full rank.
+    a = Q R, then x solves R x = (Q.H b)[:n] and the squared residual is the sum of |(Q.H b)[n:]|**2. Q.H is
+    applied to b block by block without forming Q, and a.T @ a is never formed, so the condition number is not squared.
+
+    Parameters
+    ----------
+    a: DMatrix
+        A tall or square matrix of full column rank.
+    b: DVec or DMatrix
+        One right hand side with m items, or one per column of a DMatrix.
+    block: int, optional
+        The number of reflectors applied as one block, defaults to QR_BLOCK_SIZE.
+
+    Returns
+    -------
+    (x, residuals), x is a DVec or DMatrix like b, residuals the squared residual norm, one per column for a DMatrix.
+    """
+    cols, dtype = _qr_columns(a)
+    m, n = a.shape
+    if m < n: raise ValueError(f"Matrix of shape {a.shape} has more columns than rows")
+    y_cols, _ = rhs_columns(b, m, dtype)
+    if dtype is float and isinstance(y_cols[0][0], complex):
+        cols, dtype = [list(map(complex, c)) for c in cols], complex
+    _, blocks = householder_qr(cols, dtype, block)
+    apply_qh(cols, blocks, y_cols, dtype)
+    residuals = [sum(abs(v) ** 2 for v in y[n:]) for y in y_cols]
+    x_cols = _solve_r(cols, y_cols, n, m)
+    return _like(b, x_cols, n, dtype), residuals[0] if isinstance(b, DVec) else residuals
+
+
+def tsqr(chunks, block=None) -> TSQR:
+    """
+    tsqr(chunks, [block])
+    Feeds an iterable of row chunks to a TSQR, see TSQR.update.
+
+    Parameters
+    ----------
+    chunks: iterable
+        DMatrix chunks of rows, or (a, b) pairs of a DMatrix and its rows of the right hand side.
+
+    Returns
+    -------
+    TSQR
+    """
+    factor = TSQR(block)
+    for chunk in chunks:
+        if isinstance(chunk, tuple):
+            factor.update(*chunk)
+        else:
+            factor.update(chunk)
+    return factor
+
+
+class TSQR:
+    """
+    The R of a tall matrix that is given as chunks of rows, the flat tree variant of the tall skinny QR.
+    Every chunk is stacked under the current R and only the new R is kept, since
+    R.H R = a.H a does not depend on the rows that gave it. Memory is O(n**2 + chunk size), whatever the
+    number of rows. With right hand sides, the columns of b are factorized along as extra columns,
+    their part of R is Q.H b, which is all lstsq needs.
+
+    TSQR.R
+        The R of all rows so far, as a DMatrix of k x n.
+    TSQR.rows
+        The number of rows so far.
+    """
+    def __init__(self, block=None):
+        self._block = block
+        self._cols = None
+        self._n = self._nrhs = None
+        self._dtype = float
+        self.rows = 0
+
+    def update(self, a, b=None) -> TSQR:
+        """
+        TSQR.update(a, [b])
+        Adds the rows of the DMatrix a, and their items of the right hand side b, in O((n + chunk) n**2).
+
+        Parameters
+        ----------
+        a: DMatrix
+            The next rows, all chunks have the same number of columns.
+        b: DVec or DMatrix, optional
+            The items of the right hand side for these rows, given with every chunk or with none.
+
+        Returns
+        -------
+        self
+        """
+        chunk, dtype = _qr_columns(a)
+        nrhs = 0
+        if b is not None:
+            y_cols, _ = rhs_columns(b, a.shape[0], dtype)
+            chunk += y_cols
+            nrhs = len(y_cols)
+        if self._n is None:
+            self._n, self._nrhs = a.shape[1], nrhs
+        if a.shape[1] != self._n: raise ValueError(f"Chunk has {a.shape[1]} columns, the first chunk had {self._n}")
+        if nrhs != self._nrhs: raise ValueError("A right hand side must be given with every chunk or with none")
+        if self._dtype is float and any(isinstance(c[0], complex) for c in chunk):
+            # The R of the float chunks so far is promoted along with the dtype.
+            self._dtype = complex
+            if self._cols is not None:
+                self._cols = [list(map(complex, c)) for c in self._cols]
+        if self._dtype is complex:
+            chunk = [list(map(complex, c)) for c in chunk]
+        if self._cols is not None:
+            chunk = [r + c for r, c in zip(self._cols, chunk)]
+        self.rows += a.shape[0]
+        householder_qr(chunk, self._dtype, self._block)
+        k = min(len(chunk[0]), len(chunk))
+        self._cols = _upper(chunk, k, self._dtype)
+        return self
+
+    @property
+    def R(self) -> DMatrix:
+        if self._cols is None: raise ValueError("No rows were given")
+        k = min(len(self._cols[0]), self._n)
+        return _columns_to_dmatrix(self._cols[:self._n], k, self._dtype)
+
+    def lstsq(self):
+        """
+        TSQR.lstsq()
+        The least squares solution for all rows so far, from R and Q.H b, see lstsq.
+
+        Returns
+        -------
+        (x, residuals), x is a column DVec for one right hand side, else a DMatrix, and the squared residual norms.
+        """
+        if self._cols is None: raise ValueError("No rows were given")
+        if not self._nrhs: raise ValueError("No right hand side was given")
+        n = self._n
+        if self.rows < n: raise ValueError(f"{self.rows} rows are not enough for {n} columns")
+        y_cols = self._cols[n:]
+        # Below the first n rows the columns of b hold the upper triangle S of their own factorization,
+        # the residual of column c is the norm of its part of S.
+        residuals = [sum(abs(v) ** 2 for v in y[n:]) for y in y_cols]
+        x_cols = _solve_r(self._cols, y_cols, n, self.rows)
+        if self._nrhs == 1:
+            return DVec._from_buffer(make_buffer(x_cols[0], self._dtype), self._dtype, 'c'), residuals[0]
+        return _columns_to_dmatrix(x_cols, n, self._dtype), residuals
@@ -0,0 +1,475 @@
+"""
+Sparse direct solvers over CSC: an up-looking Cholesky factorization for symmetric
+positive definite matrices and a left-looking LU factorization with partial pivoting.
+
+Both are split into a symbolic analysis, which only reads the pattern, and a numeric
+factorization. The analysis orders the matrix to keep the fill in low and computes
+its elimination tree, it is kept on the factor and can be passed back in to factorize
+a matrix with the same pattern and new values without analysing it again.
+"""
+
+from __future__ import annotations
+from .._core._storage import make_buffer, cast_buffer
+from ..sparse._csc import CSC
+from ._ordering import sparse_pattern, amd, elimination_tree, postorder, row_patterns
+from ._triangular import factor_dtype, rhs_columns
+import itertools, operator, math
+
+
+def _ordering(csc, ordering, ata):
+    # The permutation for an ordering name, or the checked permutation that was given.
+    n = csc.shape[0]
+    if ordering == "amd":
+        return amd(csc, ata)
+    if ordering == "amd_symmetric" and ata:
+        return amd(csc)
+    if ordering == "natural":
+        return list(range(n))
+    if isinstance(ordering, str): raise ValueError(f"Unknown ordering {ordering}")
+    perm = list(ordering)
+    if sorted(perm) != list(range(n)): raise ValueError(f"Ordering is not a permutation of range({n})")
+    return perm
+
+
+def _inverse(perm):
+    inverse = [0] * len(perm)
+    for k, i in enumerate(perm):
+        inverse[i] = k
+    return inverse
+
+
+def _sorted_csc(indptr, indices, values, n, dtype):
+    # A CSC matrix from columns whose row indices are in any order.
+    order = [sorted(range(start, stop), key=indices.__getitem__) for start, stop in itertools.pairwise(indptr)]
+    order = list(itertools.chain.from_iterable(order))
+    return CSC._from_compressed(make_buffer(list(indptr), int), make_buffer(list(map(indices.__getitem__, order)), int),
+                                cast_buffer(list(map(values.__getitem__, order)), dtype), (n, n), dtype)
+
+
+class _Symbolic:
+    """
+    The part of an analysis shared by LU and Cholesky: the pattern it was made for.
+    """
+    def _check(self, csc):
+        # A factorization with this analysis needs the pattern it was made for.
+        if csc.shape != self.shape: raise ValueError(f"Matrix of shape {csc.shape} does not match the analysis of shape {self.shape}")
+        if tuple(csc.indptr) != self._indptr or tuple(csc.indices) != self._indices:
+            raise ValueError("Matrix does not have the pattern of the analysis")
+
+
+class CholeskySymbolic(_Symbolic):
+    """
+    The symbolic analysis of a sparse Cholesky factorization P A P.T = L L.H, made by analyze_cholesky.
+
+    CholeskySymbolic.perm
+        Row and column k of P A P.T are row and column perm[k] of A.
+    CholeskySymbolic.parent
+        The elimination tree of P A P.T.
+    CholeskySymbolic.nnz
+        The number of nonzeros of L.
+    """
+    def __init__(self, csc, perm):
+        n = csc.shape[0]
+        self.shape = csc.shape
+        self._indptr, self._indices = tuple(csc.indptr), tuple(csc.indices)
+        self.perm = perm
+        pinv = _inverse(perm)
+        # The upper triangle of C = P A P.T by columns, with the position in A.data of every item. Of the two
+        # items A[i][j] and A[j][i] of a symmetric matrix only the one that lands on or above the diagonal is read.
+        columns = [[] for _ in range(n)]
+        for j, (start, stop) in enumerate(itertools.pairwise(csc.indptr)):
+            cj = pinv[j]
+            for p in range(start, stop):
+                ci = pinv[csc.indices[p]]
+                if ci <= cj:
+                    columns[cj].append((ci, p))
+        for column in columns:
+            column.sort()
+        self._c_indptr = [0, *itertools.accumulate(map(len, columns))]
+        self._c_indices = [ci for column in columns for ci, _ in column]
+        self._c_map = [p for column in columns for _, p in column]
+        self.parent = elimination_tree(self._c_indptr, self._c_indices, n)
+        # Row k of L left of the diagonal, and the columns of L with the diagonal first and then the rows in order.
+        self._rows = [tuple(row) for row in row_patterns(self._c_indptr, self._c_indices, self.parent)]
+        counts = [1] * n
+        for row in self._rows:
+            for j in row:
+                counts[j] += 1
+        self._l_indptr = [0, *itertools.accumulate(counts)]
+        self.nnz = self._l_indptr[-1]
+        l_indices = [0] * self.nnz
+        following = self._l_indptr[:-1]
+        for k, row in enumerate(self._rows):
+            l_indices[following[k]] = k
+            following[k] += 1
+            for j in row:
+                l_indices[following[j]] = k
+                following[j] += 1
+        self._l_indices = l_indices
+
+
+class LUSymbolic(_Symbolic):
+    """
+    The symbolic analysis of a sparse LU factorization P A Q = L U, made by analyze_lu.
+
+    LUSymbolic.perm_c
+        Column k of A Q is column perm_c[k] of A.
+    LUSymbolic.parent
+        The column elimination tree of A Q, the elimination tree of (A Q).T (A Q).
+    """
+    def __init__(self, csc, perm_c):
+        n = csc.shape[0]
+        self.shape = csc.shape
+        self._indptr, self._indices = tuple(csc.indptr), tuple(csc.indices)
+        indptr, indices = csc.indptr, csc.indices
+        # The columns are put in a postorder of their elimination tree, which keeps the fill in and makes the
+        # columns of every subtree contiguous.
+        q_indptr = [0, *itertools.accumulate(indptr[j + 1] - indptr[j] for j in perm_c)]
+        q_indices = list(itertools.chain.from_iterable(indices[indptr[j]:indptr[j + 1]] for j in perm_c))
+        parent = elimination_tree(q_indptr, q_indices, n, ata=True)
+        order = postorder(parent)
+        position = _inverse(order)
+        self.perm_c = [perm_c[k] for k in order]
+        self.parent = [position[parent[k]] if parent[k] != -1 else -1 for k in order]
+
+
+def analyze_cholesky(a, ordering="amd") -> CholeskySymbolic:
+    """
+    analyze_cholesky(a, [ordering])
+    The symbolic analysis of a sparse Cholesky factorization: the fill reducing ordering, the elimination
+    tree of the ordered matrix and from it the exact pattern of L, in O(nnz of L) after the ordering.
+
+    Parameters
+    ----------
+    a: CSC, CSR, DIA or BSR
+        A square matrix, only the pattern is read.
+    ordering: str or list
+        'amd' for the approximate minimum degree ordering of a + a.T, 'natural' for none,
+        or a permutation.
+
+    Returns
+    -------
+    CholeskySymbolic
+    """
+    csc = sparse_pattern(a)
+    return CholeskySymbolic(csc, _ordering(csc, ordering, False))
+
+
+def analyze_lu(a, ordering="amd") -> LUSymbolic:
+    """
+    analyze_lu(a, [ordering])
+    The symbolic analysis of a sparse LU factorization: the fill reducing column ordering, postordered
+    by the column elimination tree. The rows are only ordered by the pivoting of the numeric factorization.
+
+    Parameters
+    ----------
+    a: CSC, CSR, DIA or BSR
+        A square matrix, only the pattern is read.
+    ordering: str or list
+        'amd' for the approximate minimum degree ordering of a.T @ a, which bounds the fill in for any
+        row pivoting, 'amd_symmetric' for the ordering of a + a.T, which gives less fill in for a mostly
+        symmetric pattern whose diagonal is pivoted on, see the threshold of splu, 'natural' for none,
+        or a permutation of the columns.
+
+    Returns
+    -------
+    LUSymbolic
+    """
+    csc = sparse_pattern(a)
+    return LUSymbolic(csc, _ordering(csc, ordering, True))
+
+
+def spcholesky(a, ordering="amd", symbolic=None) -> SparseCholesky:
+    """
+    spcholesky(a, [ordering, symbolic])
+    The sparse Cholesky factorization P A P.T = L L.T of a symmetric positive definite matrix, or L L.H of a
+    Hermitian one. Only the items on and above the diagonal of P A P.T are read.
+
+    The up-looking algorithm computes row k of L by a sparse triangular solve with the rows above it, on
+    the pattern found by the analysis, so the work is the flops of the factorization and no dense row or
+    column is ever formed.
+
+    Parameters
+    ----------
+    a: CSC, CSR, DIA or BSR
+        A square symmetric positive definite matrix, other formats are converted to CSC.
+    ordering: str or list
+        The ordering of the analysis, see analyze_cholesky.
+    symbolic: CholeskySymbolic, optional
+        The analysis of a matrix with the same pattern, like the symbolic of an earlier factor,
+        then only the numeric factorization is done.
+
+    Returns
+    -------
+    SparseCholesky
+    """
+    csc = sparse_pattern(a)
+    if symbolic is None:
+        symbolic = CholeskySymbolic(csc, _ordering(csc, ordering, False))
+    else:
+        symbolic._check(csc)
+    n = csc.shape[0]
+    dtype = factor_dtype(csc.dtype)
+    data = csc.data
+    c_indptr, c_indices = symbolic._c_indptr, symbolic._c_indices
+    c_data = list(map(dtype, map(data.__getitem__, symbolic._c_map)))
+    l_indptr, l_indices = symbolic._l_indptr, symbolic._l_indices
+    l_data = [dtype(0)] * symbolic.nnz
+    following = [start + 1 for start in l_indptr[:-1]]
+    x = [dtype(0)] * n
+    for k, row in enumerate(symbolic._rows):
+        for p in range(c_indptr[k], c_indptr[k + 1]):
+            x[c_indices[p]] = c_data[p]
+        d = x[k]
+        x[k] = 0
+        # L[:k, :k] y = C[:k, k] on the pattern of row k, whose columns in increasing order are a topological order.
+        for j in row:
+            y = x[j] / l_data[l_indptr[j]]
+            x[j] = 0
+            for p in range(l_indptr[j] + 1, following[j]):
+                x[l_indices[p]] -= l_data[p] * y
+            l_data[following[j]] = y.conjugate()
+            following[j] += 1
+            d -= abs(y) ** 2
+        if dtype is complex:
+            d = d.real
+        if not d > 0: raise ValueError(f"Matrix is not positive definite, pivot {k} is {d}")
+        l_data[l_indptr[k]] = dtype(math.sqrt(d))
+    return SparseCholesky(symbolic, l_data, dtype)
+
+
+class SparseCholesky:
+    """
+    The sparse Cholesky factorization P A P.T = L L.H, made by spcholesky.
+
+    SparseCholesky.L
+        The lower triangular factor as a CSC matrix.
+    SparseCholesky.perm
+        Row and column k of P A P.T are row and column perm[k] of A.
+    SparseCholesky.symbolic
+        The analysis, which factorizes a matrix with the same pattern again, see spcholesky.
+    """
+    def __init__(self, symbolic, l_data, dtype):
+        self.symbolic = symbolic
+        self.perm = symbolic.perm
+        self.shape = symbolic.shape
+        self.dtype = dtype
+        self._l_data = l_data
+
+    @property
+    def L(self) -> CSC:
+        s = self.symbolic
+        return CSC._from_compressed(make_buffer(s._l_indptr, int), make_buffer(s._l_indices, int), cast_buffer(self._l_data, self.dtype), self.shape, self.dtype)
+
+    @property
+    def nnz(self):
+        return self.symbolic.nnz
+
+    def solve(self, b):
+        """
+        SparseCholesky.solve(b)
+        Solves A x = b by permuting b, then solving with L and with L.H, in O(nnz of L) per column.
+
+        Parameters
+        ----------
+        b: DVec or DMatrix
+            One right hand side, or one per column of a DMatrix.
+
+        Returns
+        -------
+        DVec or DMatrix, like b.
+        """
+        n = self.shape[0]
+        cols, wrap = rhs_columns(b, n, self.dtype)
+        indptr, indices, data = self.symbolic._l_indptr, self.symbolic._l_indices, self._l_data
+        conjugate = data if self.dtype is not complex else list(map(complex.conjugate, data))
+        mul = operator.__mul__
+        for col in cols:
+            y = list(map(col.__getitem__, self.perm))
+            for j in range(n):
+                start, stop = indptr[j], indptr[j + 1]
+                y[j] = yj = y[j] / data[start]
+                if yj:
+                    for p in range(start + 1, stop):
+                        y[indices[p]] -= data[p] * yj
+            for j in range(n - 1, -1, -1):
+                start, stop = indptr[j], indptr[j + 1]
+                y[j] = (y[j] - sum(map(mul, conjugate[start + 1:stop], map(y.__getitem__, indices[start + 1:stop])))) / conjugate[start]
+            for k, i in enumerate(self.perm):
+                col[i] = y[k]
+        return wrap(cols)
+
+
+def splu(a, ordering="amd", symbolic=None, threshold=1.0) -> SparseLU:
+    """
+    splu(a, [ordering, symbolic, threshold])
+    The sparse LU factorization P A Q = L U of a square matrix, with partial pivoting by rows.
+
+    The left-looking Gilbert-Peierls algorithm computes column k of L and U by a sparse triangular solve
+    with the columns before it: a depth first search in the graph of L from the nonzeros of the column
+    gives the pattern of the solution in topological order, so the work is the flops of the factorization.
+
+    Parameters
+    ----------
+    a: CSC, CSR, DIA or BSR
+        A square matrix, other formats are converted to CSC.
+    ordering: str or list
+        The column ordering of the analysis, see analyze_lu.
+    symbolic: LUSymbolic, optional
+        The analysis of a matrix with the same pattern, like the symbolic of an earlier factor,
+        then only the numeric factorization is done.
+    threshold: float
+        The diagonal item of a column of A is the pivot when it is at least threshold times the
+        largest candidate, 1.0 is partial pivoting, smaller values keep more of the ordering.
+
+    Returns
+    -------
+    SparseLU
+    """
+    if not 0 < threshold <= 1: raise ValueError(f"threshold must be in (0, 1], not {threshold}")
+    csc = sparse_pattern(a)
+    if symbolic is None:
+        symbolic = LUSymbolic(csc, _ordering(csc, ordering, True))
+    else:
+        symbolic._check(csc)
+    n = csc.shape[0]
+    dtype = factor_dtype(csc.dtype)
+    indptr, indices, data = csc.indptr, csc.indices, csc.data
+    # L by columns with the rows of A, the pivot first with a 1, and U by columns with the pivot positions, the diagonal last.
+    l_indptr, l_indices, l_data = [0], [], []
+    u_indptr, u_indices, u_data = [0], [], []
+    pinv, pivots = [-1] * n, []
+    x = [dtype(0)] * n
+    mark = [-1] * n
+    for k, col in enumerate(symbolic.perm_c):
+        start, stop = indptr[col], indptr[col + 1]
+        # The rows reachable from the nonzeros of the column in the graph of L, in reverse postorder.
+        finished = []
+        for r in indices[start:stop]:
+            if mark[r] == k:
+                continue
+            mark[r] = k
+            stack, heads = [r], [l_indptr[pinv[r]] + 1 if pinv[r] >= 0 else 0]
+            while stack:
+                j = stack[-1]
+                jn = pinv[j]
+                if jn >= 0:
+                    p, end = heads[-1], l_indptr[jn + 1]
+                    while p < end and mark[l_indices[p]] == k:
+                        p += 1
+                    if p < end:
+                        heads[-1] = p + 1
+                        i = l_indices[p]
+                        mark[i] = k
+                        stack.append(i)
+                        heads.append(l_indptr[pinv[i]] + 1 if pinv[i] >= 0 else 0)
+                        continue
+                finished.append(stack.pop())
+                heads.pop()
+        finished.reverse()
+        for p in range(start, stop):
+            x[indices[p]] = dtype(data[p])
+        for j in finished:
+            jn = pinv[j]
+            if jn >= 0 and x[j]:
+                xj = x[j]
+                for p in range(l_indptr[jn] + 1, l_indptr[jn + 1]):
+                    x[l_indices[p]] -= l_data[p] * xj
+        best, largest = -1, -1.0
+        for j in finished:
+            if pinv[j] >= 0:
+                u_indices.append(pinv[j])
+                u_data.append(x[j])
+            elif abs(x[j]) > largest:
+                best, largest = j, abs(x[j])
+        if largest <= 0: raise ValueError(f"Matrix is singular, column {col} has no nonzero pivot")
+        if pinv[col] < 0 and mark[col] == k and abs(x[col]) >= threshold * largest:
+            best = col
+        pivot = x[best]
+        u_indices.append(k)
+        u_data.append(pivot)
+        u_indptr.append(len(u_indices))
+        pinv[best] = k
+        pivots.append(best)
+        l_indices.append(best)
+        l_data.append(dtype(1))
+        for j in finished:
+            if pinv[j] < 0:
+                l_indices.append(j)
+                l_data.append(x[j] / pivot)
+        l_indptr.append(len(l_indices))
+        for j in finished:
+            x[j] = 0
+    return SparseLU(symbolic, pivots, (l_indptr, l_indices, l_data), (u_indptr, u_indices, u_data), dtype)
+
+
+class SparseLU:
+    """
+    The sparse LU factorization P A Q = L U, made by splu.
+
+    SparseLU.L, SparseLU.U
+        The unit lower and the upper triangular factor as CSC matrices.
+    SparseLU.perm_r
+        Row k of P A is row perm_r[k] of A.
+    SparseLU.perm_c
+        Column k of A Q is column perm_c[k] of A.
+    SparseLU.symbolic
+        The analysis, which factorizes a matrix with the same pattern again, see splu.
+    """
+    def __init__(self, symbolic, pivots, l, u, dtype):
+        self.symbolic = symbolic
+        self.perm_r = pivots
+        self.perm_c = symbolic.perm_c
+        self.shape = symbolic.shape
+        self.dtype = dtype
+        self._l, self._u = l, u
+
+    @property
+    def L(self) -> CSC:
+        indptr, indices, data = self._l
+        pinv = _inverse(self.perm_r)
+        return _sorted_csc(indptr, list(map(pinv.__getitem__, indices)), data, self.shape[0], self.dtype)
+
+    @property
+    def U(self) -> CSC:
+        return _sorted_csc(*self._u, self.shape[0], self.dtype)
+
+    @property
+    def nnz(self):
+        return len(self._l[1]) + len(self._u[1])
+
+    def solve(self, b):
+        """
+        SparseLU.solve(b)
+        Solves A x = b with L, which keeps the row indices of A so b needs no permutation, then with U,
+        and permutes the solution by perm_c, in O(nnz of L and U) per column.
+
+        Parameters
+        ----------
+        b: DVec or DMatrix
+            One right hand side, or one per column of a DMatrix.
+
+        Returns
+        -------
+        DVec or DMatrix, like b.
+        """
+        n = self.shape[0]
+        cols, wrap = rhs_columns(b, n, self.dtype)
+        l_indptr, l_indices, l_data = self._l
+        u_indptr, u_indices, u_data = self._u
+        for col in cols:
+            y = []
+            for k, r in enumerate(self.perm_r):
+                y.append(yk := col[r])
+                if yk:
+                    for p in range(l_indptr[k] + 1, l_indptr[k + 1]):
+                        col[l_indices[p]] -= l_data[p] * yk
+            for k in range(n - 1, -1, -1):
+                start, stop = u_indptr[k], u_indptr[k + 1] - 1
+                y[k] = yk = y[k] / u_data[stop]
+                if yk:
+                    for p in range(start, stop):
+                        y[u_indices[p]] -= u_data[p] * yk
+            for k, j in enumerate(self.perm_c):
+                col[j] = y[k]
+        return wrap(cols)
@@ -0,0 +1,156 @@
+"""
+Shared pieces of the dense factorizations: reading a DMatrix into python rows,
+the right hand sides of a solve, and forward and back substitution.
+
+The factorizations work on a list of python lists, one per row, so swapping
+two rows only swaps two references and every row update is a C-level map.
+"""
+
+from .._core._dmatrix import DMatrix
+from .._core._dvec import DVec
+from .._core._gemm import gemm, _dot
+from .._core._storage import make_buffer, chain_buffers
+import itertools, operator
+
+def factor_dtype(dtype):
+    # The items of a factorization are floats, or complex numbers for a complex matrix.
+    return complex if dtype is complex else float
+
+
+def square_rows(a, name="Matrix"):
+    """
+    square_rows(a, [name])
+    The rows of a square DMatrix as python lists of floats or complex numbers, which can be factorized in place.
+
+    Returns
+    -------
+    (rows, dtype)
+    """
+    if not isinstance(a, DMatrix): raise TypeError(f"{name} must be a DMatrix, not {type(a)}")
+    if a.shape[0] != a.shape[1]: raise ValueError(f"{name} must be square, not of shape {a.shape}")
+    dtype = factor_dtype(a.dtype)
+    return [list(map(dtype, row)) for row in a._rows()], dtype
+
+
+def lower_rows(a, name="Matrix"):
+    """
+    lower_rows(a, [name])
+    The lower triangle of a square DMatrix, row i as a python list of its i + 1 items up to the diagonal.
+    The upper triangle is never read, a symmetric matrix only needs one.
+
+    Returns
+    -------
+    (rows, dtype)
+    """
+    if not isinstance(a, DMatrix): raise TypeError(f"{name} must be a DMatrix, not {type(a)}")
+    if a.shape[0] != a.shape[1]: raise ValueError(f"{name} must be square, not of shape {a.shape}")
+    dtype = factor_dtype(a.dtype)
+    return [list(map(dtype, row[:i + 1])) for i, row in enumerate(a._rows())], dtype
+
+
+def rhs_columns(b, n, dtype):
+    """
+    rhs_columns(b, n, dtype)
+    The columns of a right hand side b with n rows as python lists, and a function that turns
+    the solved columns into the type of b: a column DVec for a DVec, else a DMatrix.
+
+    Returns
+    -------
+    (columns, wrap)
+    """
+    if isinstance(b, DVec):
+        if b.length != n: raise ValueError(f"Right hand side of length {b.length} does not match a matrix with {n} rows")
+        rhs_dtype = factor_dtype(dtype if b.dtype is not complex else complex)
+        def wrap(cols):
+            return DVec._from_buffer(make_buffer(cols[0], rhs_dtype), rhs_dtype, 'c')
+        return [list(map(rhs_dtype, b._items()))], wrap
+    if isinstance(b, DMatrix):
+        if b.shape[0] != n: raise ValueError(f"Right hand side of shape {b.shape} does not match a matrix with {n} rows")
+        rhs_dtype = factor_dtype(dtype if b.dtype is not complex else complex)
+        def wrap(cols):
+            # The columns one after another are the buffer of the matrix read column by column.
+            return DMatrix._from_buffer(chain_buffers(cols, rhs_dtype), (n, len(cols)), rhs_dtype, (1, n))
+        return [list(map(rhs_dtype, col)) for col in b._cols()], wrap
+    raise TypeError(f"Right hand side must be a DVec or DMatrix, not {type(b)}")
+
+
+def forward_substitution(rows, y, unit=False):
+    """
+    forward_substitution(rows, y, unit=False)
+    Solves L x = y in place of y, where L is the lower triangle of rows, with ones on the diagonal if unit.
+    Every step is one dot product of a row of L with the solved part of x, O(n**2).
+    """
+    for i, row in enumerate(rows):
+        if i:
+            y[i] -= _dot(row[:i], y[:i])
+        if not unit:
+            y[i] /= row[i]
+    return y
+
+
+def back_substitution(rows, y, unit=False):
+    """
+    back_substitution(rows, y, unit=False)
+    Solves U x = y in place of y, where U is the upper triangle of rows, with ones on the diagonal if unit, O(n**2).
+    """
+    n = len(rows)
+    for i in range(n - 1, -1, -1):
+        row = rows[i]
+        if i < n - 1:
+            y[i] -= _dot(row[i + 1:], y[i + 1:])
+        if not unit:
+            y[i] /= row[i]
+    return y
+
+
+def transposed_back_substitution(rows, y, unit=False, conjugate=False):
+    """
+    transposed_back_substitution(rows, y, unit=False, conjugate=False)
+    Solves L.T x = y in place of y, or L.H x = y if conjugate, where L is the lower triangle of rows.
+    Once x[j] is known it is removed from the earlier equations with one scaled column of L.T, which is row j of L, O(n**2).
+    """
+    sub, mul = operator.__sub__, operator.__mul__
+    for j in range(len(rows) - 1, -1, -1):
+        row = rows[j]
+        if not unit:
+            y[j] /= row[j].conjugate() if conjugate else row[j]
+        if j and y[j]:
+            column = map(complex.conjugate, row[:j]) if conjugate else row[:j]
+            y[:j] = map(sub, y[:j], map(mul, column, itertools.repeat(y[j])))
+    return y
+
+
+def lower_update(rows, w, k0, k, block):
+    """
+    lower_update(rows, w, k0, k, block)
+    The trailing update A[i][j] -= sum over t in k0:k of rows[i][t] * w[j - k][t - k0], for k <= j <= i, of the lower
+    triangle in rows. The gemm kernel computes it in tiles of block rows, only the tile on the diagonal is
+    partly wasted on the upper triangle.
+    """
+    n = len(rows)
+    sub = operator.__sub__
+    left = [row[k0:k] for row in rows[k:]]
+    for i0 in range(k, n, block):
+        i1 = min(i0 + block, n)
+        m = i1 - k
+        update = gemm(left[i0 - k:i1 - k], w[:m])
+        for r, row in enumerate(rows[i0:i1]):
+            stop = i0 + r + 1 - k
+            row[k:k + stop] = map(sub, row[k:k + stop], update[r * m:r * m + stop])
+
+
+def columns_of(rows, start=0, stop=None):
+    """
+    columns_of(rows, [start, stop])
+    The columns start:stop of the rows as python lists, the transpose that the gemm kernel takes as right operand.
+    """
+    return list(map(list, zip(*[row[start:stop] for row in rows])))
+
+
+def rows_to_dmatrix(rows, dtype):
+    """
+    rows_to_dmatrix(rows, dtype)
+    A DMatrix with the python lists as rows.
+    """
+    n, m = len(rows), len(rows[0]) if rows else 0
+    return DMatrix._from_buffer(make_buffer(list(itertools.chain.from_iterable(rows)), dtype), (n, m), dtype)
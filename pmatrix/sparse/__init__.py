@@ -1,12 +1,20 @@
 """
 2D sparse arrays.
+BSR: Block Sparse Row matrix, dense r x c blocks under block level indices.
+COO: Coordinate matrix, assembles CSR and CSC matrices from (row, col, value) triplets.
 CSC: Compressed Sparse Column matrix.
 CSR: Compressed Sparse row matrix.
 DIA: Diagonal sparse matrix.
 
 All these matrices allow matrix multiplaction with X @ Y, where X and Y are any sparse matrix, or DMatrix.
+
+Element wise operations on CSR and CSC stay sparse when they map zeros to zero: +, - and * between
+matrices of the same shape, and scaling or comparing (<, >, !=) with a scalar. Other element wise
+operations, like adding a scalar, give a DMatrix.
 """
 
+from ._bsr import BSR
+from ._coo import COO
 from ._csc import CSC
 from ._csr import CSR
 from ._dia import DIA
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""
+Block sparse row matrix.
+
+The nonzeros are dense r x c blocks under block level indptr and indices, like a CSR
+matrix whose entries are blocks. The blocks of a block row are stored side by side in
+data as one dense r x (nnzb_row * c) row major strip, so a block row is a dense matrix
+for the gemm kernel of DMatrix and block (I, J) is read with plain slices.
+"""
+
+from __future__ import annotations
+from .._core._dmatrix import DMatrix
+from .._core._gemm import gemm
+from .._core._storage import zeros
+from ._cbase import CBase, _is_scalar
+from ._csr import CSR
+from ._compressed import result_dtype, transpose_compressed, keeps_sparsity, write_chunks
+import bisect, itertools, operator
+
+class BSR(CBase):
+    """
+    Block Sparse Row matrix, with dense blocks of blocksize (r, c). This matrix is created with:
+    BSR.from_csr(matrix, blocksize=(r, c))
+        From a CSR, CSC or DIA matrix, every r x c block with a nonzero is stored.
+    BSR.from_dmatrix(matrix, blocksize=(r, c))
+    The shape has to be a multiple of the blocksize.
+    The product of two BSR matrices with matching blocksizes is a BSR, computed block by block with the dense
+    gemm kernel. Other products and element wise operations with a sparse matrix go through to_csr.
+    """
+    _orientation = 'r'
+    def __init__(self):
+        CBase.__init__(self)
+        self._format = "BSR"
+
+    @classmethod
+    def _from_blocks(cls, indptr, indices, data, shape, blocksize, dtype):
+        # Wraps the block level indptr and indices and the block row strips of data without copying them.
+        new = cls()
+        new.indptr, new.indices, new.data = indptr, indices, data
+        new.shape, new.blocksize, new.dtype = shape, blocksize, dtype
+        return new
+
+    @staticmethod
+    def _check_blocksize(shape, blocksize):
+        if not isinstance(blocksize, tuple) or len(blocksize) != 2 or not all(isinstance(b, int) and b > 0 for b in blocksize):
+            raise ValueError(f"Blocksize needs to be a length 2 tuple of positive integers, not {blocksize}")
+        if shape[0] % blocksize[0] or shape[1] % blocksize[1]: raise ValueError(f"Shape {shape} is not a multiple of blocksize {blocksize}")
+
+    @property
+    def nnzb(self):
+        """
+        BSR.nnzb
+        The number of stored blocks.
+        """
+        return len(self.indices)
+
+    def _strip(self, block_row):
+        # The offset in data and the width of the strip of a block row.
+        start, stop = self.indptr[block_row], self.indptr[block_row + 1]
+        r, c = self.blocksize
+        return start * r * c, (stop - start) * c
+
+    def _strip_rows(self, block_row):
+        # The r rows of the strip of a block row.
+        base, width = self._strip(block_row)
+        return [self.data[base + t * width:base + (t + 1) * width] for t in range(self.blocksize[0])]
+
+    def _strip_cols(self, block_row):
+        # The column indices of the strip of a block row.
+        start, stop = self.indptr[block_row], self.indptr[block_row + 1]
+        c = self.blocksize[1]
+        return itertools.chain.from_iterable(range(J * c, J * c + c) for J in self.indices[start:stop])
+
+    @classmethod
+    def from_csr(cls, matrix, blocksize) -> BSR:
+        """
+        BSR.from_csr(matrix, blocksize)
+        The BSR matrix with every block of the matrix that holds a stored entry, in O(nnz + nnzb * r * c).
+
+        Parameters
+        ----------
+        matrix: CSR, CSC or DIA
+        blocksize: tuple (r, c)
+            The shape of the dense blocks, shape has to be a multiple of it.
+
+        Returns
+        -------
+        BSR
+        """
+        if getattr(matrix, "_format", None) not in ("CSR", "CSC", "DIA", "BSR"): raise TypeError(f"Matrix must be a sparse matrix, not {type(matrix)}")
+        matrix = matrix.to_csr()
+        cls._check_blocksize(matrix.shape, blocksize)
+        r, c = blocksize
+        zero = matrix.dtype(0)
+        indptr, indices, data = [0], [], []
+        for I in range(matrix.shape[0] // r):
+            start, stop = matrix.indptr[I * r], matrix.indptr[I * r + r]
+            block_cols = sorted({j // c for j in matrix.indices[start:stop]})
+            position = {J: k * c for k, J in enumerate(block_cols)}
+            width = len(block_cols) * c
+            strip = [zero] * (r * width)
+            for t in range(r):
+                row_start, row_stop = matrix.indptr[I * r + t], matrix.indptr[I * r + t + 1]
+                offset = t * width
+                for j, v in zip(matrix.indices[row_start:row_stop], matrix.data[row_start:row_stop]):
+                    strip[offset + position[j // c] + j % c] = v
+            indices.extend(block_cols)
+            data.extend(strip)
+            indptr.append(len(indices))
+        return cls._from_blocks(indptr, indices, data, matrix.shape, blocksize, matrix.dtype)
+
+    @classmethod
+    def from_dmatrix(cls, matrix, blocksize) -> BSR:
+        """
+        BSR.from_dmatrix(matrix, blocksize)
+        The BSR matrix of the blocks of a DMatrix that are not all zero.
+
+        Parameters
+        ----------
+        matrix: DMatrix
+        blocksize: tuple (r, c)
+            The shape of the dense blocks, shape has to be a multiple of it.
+
+        Returns
+        -------
+        BSR
+        """
+        if not isinstance(matrix, DMatrix): raise ValueError(f"Matrix is not of type DMatrix")
+        return cls.from_csr(CSR.from_dmatrix(matrix), blocksize)
+
+    def to_csr(self) -> CSR:
+        """
+        BSR.to_csr()
+        The same matrix in CSR format in O(nnzb * r * c), the zeros inside the blocks are dropped.
+
+        Returns
+        -------
+        CSR
+        """
+        indptr, indices, data = [0], [], []
+        for I in range(len(self.indptr) - 1):
+            cols = list(self._strip_cols(I))
+            for row in self._strip_rows(I):
+                indices.extend(itertools.compress(cols, row))
+                data.extend(itertools.compress(row, row))
+                indptr.append(len(indices))
+        return CSR._from_compressed(indptr, indices, data, self.shape, self.dtype)
+
+    def to_csc(self):
+        """
+        BSR.to_csc()
+        The same matrix in CSC format, see to_csr.
+        """
+        return self.to_csr().to_csc()
+
+    def to_dmatrix(self) -> DMatrix:
+        """
+        BSR.to_dmatrix()
+        The dense matrix, the strips are copied into a zero buffer.
+
+        Returns
+        -------
+        DMatrix
+        """
+        n = self.shape[1]
+        buf = zeros(self.shape[0] * n, self.dtype)
+        r = self.blocksize[0]
+        for I in range(len(self.indptr) - 1):
+            cols = list(self._strip_cols(I))
+            for t, row in enumerate(self._strip_rows(I)):
+                offset = (I * r + t) * n
+                for j, v in zip(cols, row):
+                    buf[offset + j] = v
+        return DMatrix._from_buffer(buf, self.shape, self.dtype)
+
+    def _matvec(self, x, out=None, dtype=None):
+        # The entries of x are gathered a block at a time: the block indices of a block row, repeated for its r strip
+        # rows, pick blocks of x in the order of data. Like gather_matvec all products are one lazy stream that is
+        # summed strip row by strip row, only one index per block is read instead of one per entry.
+        r, c = self.blocksize
+        indptr = self.indptr
+        # x is cut into tuples of c items, the garbage collector stops tracking tuples of numbers, slices of a list
+        # or array would stay tracked and make it sweep all live data.
+        x_blocks = list(zip(*(itertools.islice(x, u, None, c) for u in range(c))))
+        block_rows = map(self.indices.__getitem__, map(slice, indptr, itertools.islice(indptr, 1, None)))
+        strip_indices = itertools.chain.from_iterable(map(operator.__mul__, block_rows, itertools.repeat(r)))
+        products = map(operator.__mul__, self.data, itertools.chain.from_iterable(map(x_blocks.__getitem__, strip_indices)))
+        widths = map(operator.__mul__, map(operator.__sub__, itertools.islice(indptr, 1, None), indptr), itertools.repeat(c))
+        zero = self.dtype(0) * type(x[0])(0)
+        widths = itertools.chain.from_iterable(map(itertools.repeat, widths, itertools.repeat(r)))
+        if out is not None:
+            return write_chunks(map(sum, map(itertools.islice, itertools.repeat(products), widths), itertools.repeat(zero)), self.shape[0], out, dtype)
+        return [sum(itertools.islice(products, width), zero) for width in widths]
+
+    def _rmatvec(self, x):
+        # The rows of every strip, scaled by their entry of x, are summed and scattered onto the block columns.
+        r, c = self.blocksize
+        y = [self.dtype(0) * type(x[0])(0)] * self.shape[1]
+        for I, (start, stop) in enumerate(itertools.pairwise(self.indptr)):
+            if start == stop:
+                continue
+            rows = self._strip_rows(I)
+            acc = list(map(operator.__mul__, rows[0], itertools.repeat(x[I * r])))
+            for t in range(1, r):
+                acc = list(map(operator.__add__, acc, map(operator.__mul__, rows[t], itertools.repeat(x[I * r + t]))))
+            for k, J in enumerate(self.indices[start:stop]):
+                y[J * c:J * c + c] = map(operator.__add__, y[J * c:J * c + c], acc[k * c:k * c + c])
+        return y
+
+    def _bsr_matmul(self, other) -> BSR:
+        # Block row I of the product is the strip of A's block row I times the block rows K of B stacked, with
+        # the blocks of every B[K, :] placed under their block column J of the union and zeros elsewhere.
+        # That is one dense gemm per block row, whose flat row major result is the strip of the product.
+        r, c = self.blocksize
+        s = other.blocksize[1]
+        b_indptr, b_indices, b_data = other.indptr, other.indices, other.data
+        zero = self.dtype(0) * other.dtype(0)
+        indptr, indices, data = [0], [], []
+        for I, (start, stop) in enumerate(itertools.pairwise(self.indptr)):
+            block_rows = self.indices[start:stop]
+            block_cols = sorted(set(itertools.chain.from_iterable(b_indices[b_indptr[K]:b_indptr[K + 1]] for K in block_rows)))
+            if not block_cols:
+                indptr.append(len(indices))
+                continue
+            position = {J: p * s for p, J in enumerate(block_cols)}
+            height = len(block_rows) * c
+            b_cols = [[zero] * height for _ in range(len(block_cols) * s)]
+            for k, K in enumerate(block_rows):
+                b_start, b_stop = b_indptr[K], b_indptr[K + 1]
+                base, width = b_start * c * s, (b_stop - b_start) * s
+                end = base + c * width
+                for kb, J in enumerate(b_indices[b_start:b_stop]):
+                    col, offset = position[J], base + kb * s
+                    for v in range(s):
+                        b_cols[col + v][k * c:k * c + c] = b_data[offset + v:end:width]
+            data.extend(gemm(self._strip_rows(I), b_cols))
+            indices.extend(block_cols)
+            indptr.append(len(indices))
+        return BSR._from_blocks(indptr, indices, data, (self.shape[0], other.shape[1]), (r, s), result_dtype(self.dtype, other.dtype))
+
+    def T(self, inplace=False) -> BSR:
+        """
+        BSR.T(inplace=False)
+        The transpose as a BSR matrix with blocksize (c, r), the blocks are transposed and
+        sorted into their block rows by a counting sort, in O(nnzb * r * c + n).
+
+        Parameters
+        ----------
+        inplace: bool
+            If True self is transposed and returned.
+
+        Returns
+        -------
+        BSR
+        """
+        r, c = self.blocksize
+        n_blocks = len(self.indices)
+        block_rows = list(itertools.chain.from_iterable(itertools.repeat(I, stop - start) for I, (start, stop) in enumerate(itertools.pairwise(self.indptr))))
+        t_indptr, t_indices, order = transpose_compressed(self.indptr, self.indices, list(range(n_blocks)), self.shape[1] // c)
+        data = []
+        for start, stop in itertools.pairwise(t_indptr):
+            # Row u of the new strip is column u of every block, a strided slice of the old strip.
+            parts = []
+            for k in order[start:stop]:
+                base, width = self._strip(block_rows[k])
+                parts.append((base + (k - self.indptr[block_rows[k]]) * c, base + r * width, width))
+            for u in range(c):
+                for offset, end, width in parts:
+                    data.extend(self.data[offset + u:end:width])
+        self_t = self if inplace else BSR()
+        self_t.indptr, self_t.indices, self_t.data = t_indptr, t_indices, data
+        self_t.shape, self_t.blocksize, self_t.dtype = (self.shape[1], self.shape[0]), (c, r), self.dtype
+        return self_t
+
+    def _sparse_operator(self, other, opp):
+        # Against a scalar that maps zeros to 0 the blocks are mapped in place of their pattern,
+        # a sparse matrix of the same shape is merged as a CSR.
+        if _is_scalar(other):
+            if not keeps_sparsity(opp, self.dtype(0), other):
+                return None
+            data = list(map(opp, self.data, itertools.repeat(other, len(self.data))))
+            return BSR._from_blocks(self.indptr, self.indices, data, self.shape, self.blocksize, type(opp(self.dtype(1), other)))
+        if getattr(other, "_format", None) not in ("CSR", "CSC", "DIA", "BSR"):
+            return None
+        return self.to_csr()._sparse_operator(other, opp)
+
+    def _get_element(self, i, j):
+        # Block (i // r, j // c) is found by binary search in its block row.
+        r, c = self.blocksize
+        I, t = divmod(i, r)
+        J, u = divmod(j, c)
+        start, stop = self.indptr[I], self.indptr[I + 1]
+        k = bisect.bisect_left(self.indices, J, start, stop)
+        if k == stop or self.indices[k] != J:
+            return self.dtype(0)
+        base, width = self._strip(I)
+        return self.data[base + t * width + (k - start) * c + u]
+
+    def _select(self, rows, cols):
+        return self.to_csr()._select(rows, cols)
+
+    def get_row_data(self, row_i):
+        I, t = divmod(row_i, self.blocksize[0])
+        row = self._strip_rows(I)[t]
+        return [(j, v) for j, v in zip(self._strip_cols(I), row) if v]
+
+    def get_col_data(self, col_i):
+        r, c = self.blocksize
+        J, u = divmod(col_i, c)
+        col_d = []
+        for I, (start, stop) in enumerate(itertools.pairwise(self.indptr)):
+            k = bisect.bisect_left(self.indices, J, start, stop)
+            if k == stop or self.indices[k] != J:
+                continue
+            base, width = self._strip(I)
+            offset = base + (k - start) * c + u
+            col_d.extend((I * r + t, v) for t, v in enumerate(self.data[offset:base + r * width:width]) if v)
+        return col_d
+
+    def __str__(self):
+        return self.to_dmatrix().__str__()
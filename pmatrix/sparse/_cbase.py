@@ -1,9 +1,20 @@
+import operator
 from .._core._dmatrix import DMatrix
 from .._core._dvec import DVec
 from .._core._logiccore import LogicCore
+from .._core._broadcast import elementwise, rsub, rtruediv, rmod, rpow
+from .._core._storage import cast_buffer, _SAFE_CASTS
 from ._svec import SVec
+from ._compressed import result_dtype, transpose_compressed, spgemm, keeps_sparsity, merge_compressed, map_compressed, select_compressed
+import bisect
+
+def _is_scalar(x):
+    return isinstance(x, (int, float, complex, bool))
 
 class CBase(LogicCore):
+    # The same CSR or CSC matrix in the other compressed format, kept by to_csr/to_csc(cache=True).
+    _twin = None
+
     def __init__(self):
         self._shape = None
         self._format = "und"
@@ -12,37 +23,270 @@ class CBase(LogicCore):
             raise ValueError("This class is not intended"
                              " to be instantiated directly.")
 
+    @classmethod
+    def _from_compressed(cls, indptr, indices, data, shape, dtype):
+        """
+        Wraps the (indptr, indices, data) arrays of a CSR or CSC matrix without copying them.
+        """
+        new = cls()
+        new.indptr, new.indices, new.data = indptr, indices, data
+        new.shape = shape
+        new.dtype = dtype
+        return new
+
+    def _compressed_as(self, fmt):
+        # The (indptr, indices, data) of this CSR or CSC matrix in the layout of fmt, converted by a counting sort if needed.
+        if self._format == fmt:
+            return self.indptr, self.indices, self.data
+        if self._twin is not None:
+            return self._twin.indptr, self._twin.indices, self._twin.data
+        n_minor = self.shape[1] if self._format == "CSR" else self.shape[0]
+        return transpose_compressed(self.indptr, self.indices, self.data, n_minor)
+
+    def _convert(self, cls, cache):
+        # This CSR or CSC matrix as a matrix of cls, the other compressed format. With cache both are kept as each other's twin.
+        if self._twin is not None:
+            return self._twin
+        twin = cls._from_compressed(*self._compressed_as(cls.__name__), self.shape, self.dtype)
+        if cache:
+            self._twin, twin._twin = twin, self
+        return twin
+
+    def _transpose(self, inplace):
+        # The transpose in the format of self, its arrays are the arrays of self in the other compressed format.
+        indptr, indices, data = self._compressed_as("CSC" if self._format == "CSR" else "CSR")
+        if inplace:
+            if self._twin is not None:
+                self._twin._twin = None
+            self._twin = None
+            self_t = self
+        else:
+            self_t = type(self)()
+        self_t.indptr, self_t.indices, self_t.data = indptr, indices, data
+        self_t.shape = (self.shape[1], self.shape[0])
+        self_t.dtype = self.dtype
+        return self_t
+
+    def _spgemm(self, other):
+        # Gustavson's row by row product of two CSR or CSC matrices, the result has the format of self.
+        if self._format == "CSR":
+            arrays = spgemm(*self._compressed_as("CSR"), *other._compressed_as("CSR"))
+        else:
+            # The CSC arrays of self @ other are the CSR arrays of other.T @ self.T.
+            arrays = spgemm(*other._compressed_as("CSC"), *self._compressed_as("CSC"))
+        return type(self)._from_compressed(*arrays, (self.shape[0], other.shape[1]), result_dtype(self.dtype, other.dtype))
+
+    def _vector_data(self, x, length):
+        # The items of a DVec, list or array as a buffer that supports indexing and slicing.
+        data = x._items() if isinstance(x, DVec) else x
+        if len(data) != length: raise ValueError(f"Vector of length {len(data)} does not match matrix with shape {self.shape}")
+        return data
+
+    def _out_vector(self, out, dtype, x_data):
+        # Checks the out vector of a matvec and gives it its own contiguous buffer, which the kernels write into.
+        # A view of x is detached by copy-on-write, x itself gets a new buffer as the kernels read x_data while writing.
+        if not isinstance(out, DVec): raise TypeError(f"out must be a DVec, not {type(out).__name__}")
+        if out.length != self.shape[0]: raise ValueError(f"out has length {out.length}, the result has length {self.shape[0]}")
+        if out.dtype not in _SAFE_CASTS[dtype]: raise TypeError(f"Results of type {dtype.__name__} can not be written into a DVec of dtype {out.dtype.__name__}")
+        out._prepare_write()
+        if out._buf is x_data:
+            out.data = x_data[:]
+        elif not (out._offset == 0 and out._stride == 1 and len(out._buf) == out.length):
+            out.data = out.data
+        return out
+
+    def matvec(self, x, out=None) -> DVec:
+        """
+        CBase.matvec(x, out=None)
+        The matrix vector product self @ x, in O(nnz) without building any row or column objects.
+        CSR gathers the entries of x row by row, CSC scatters every column scaled by its entry of x,
+        DIA sweeps over the diagonals.
+
+        Parameters
+        ----------
+        x: DVec, list or array
+            A vector with shape[1] items.
+        out: DVec, optional
+            A vector with shape[0] items the product is written into, CHUNK_SIZE items at a time,
+            so repeated products, like the iterations of a solver, allocate no result vector.
+
+        Returns
+        -------
+        DVec, a column vector with shape[0] items, out if it is given.
+        """
+        x_data = self._vector_data(x, self.shape[1])
+        dtype = result_dtype(self.dtype, type(x_data[0]))
+        if out is not None:
+            out = self._out_vector(out, dtype, x_data)
+            self._matvec(x_data, out._buf, out.dtype)
+            return out
+        return DVec._from_buffer(cast_buffer(self._matvec(x_data), dtype), dtype, 'c')
+
+    def rmatvec(self, x) -> DVec:
+        """
+        CBase.rmatvec(x)
+        The vector matrix product x @ self, which is self.T @ x as a row vector, see matvec.
+
+        Parameters
+        ----------
+        x: DVec, list or array
+            A vector with shape[0] items.
+
+        Returns
+        -------
+        DVec, a row vector with shape[1] items.
+        """
+        x_data = self._vector_data(x, self.shape[0])
+        dtype = result_dtype(self.dtype, type(x_data[0]))
+        return DVec._from_buffer(cast_buffer(self._rmatvec(x_data), dtype), dtype, 'r')
+
     def __matmul__(self, other)-> DMatrix:
+        if isinstance(other, DVec):
+            return self.matvec(other)
         if not hasattr(other, "_format"): return NotImplemented
         if self.shape[1] != other.shape[0]: raise ValueError(f"Can not do a dot product with between matrices with size {self.shape} and {other.shape}")
+        if self._format == "DIA" and other._format == "DIA":
+            return self._dia_matmul(other)
+        if self._format == "BSR" and other._format == "BSR" and self.blocksize[1] == other.blocksize[0]:
+            return self._bsr_matmul(other)
+        if self._format in ("CSR", "CSC", "DIA", "BSR") and other._format in ("CSR", "CSC", "DIA", "BSR"):
+            left = self.to_csr() if self._format in ("DIA", "BSR") else self
+            return left._spgemm(other.to_csr() if other._format in ("DIA", "BSR") else other)
         if not hasattr(self, "get_row_data") or not hasattr(other, "get_col_data"): raise NotImplementedError
         row_d = [SVec(self.get_row_data(i), dtype=self.dtype, orientation='r', length=self.shape[1]) for i in range(self.shape[0])]
         col_d = [SVec(other.get_col_data(i), dtype=other.dtype, orientation='c', length=other.shape[0]) for i in range(other.shape[1])]
-        return DMatrix(data = [[row @ col for col in col_d] for row in row_d])
+        return DMatrix(data = [[row @ col for col in col_d] for row in row_d], dtype=result_dtype(self.dtype, other.dtype))
     
     def __rmatmul__(self, other) -> DMatrix:
+        if isinstance(other, DVec):
+            return self.rmatvec(other)
         if not hasattr(other, "_format"): return NotImplemented
         if other.shape[1] != self.shape[0]: raise ValueError(f"Can not do a dot product with between matrices with size {other.shape} and {self.shape}")
         if not hasattr(other, "get_row_data") or not hasattr(self, "get_col_data"): raise NotImplementedError
         row_d = [SVec(other.get_row_data(i), dtype=other.dtype, orientation='r', length=other.shape[1]) for i in range(other.shape[0])]
         col_d = [SVec(self.get_col_data(i), dtype=self.dtype, orientation='c', length=self.shape[0]) for i in range(self.shape[1])]
-        return DMatrix(data = [[row @ col for col in col_d] for row in row_d])
+        return DMatrix(data = [[row @ col for col in col_d] for row in row_d], dtype=result_dtype(self.dtype, other.dtype))
     
     def to_dmatrix(self) -> DMatrix:
         if not hasattr(self, "_to_full_data"): raise NotImplementedError
         data = self._to_full_data()
         return DMatrix(data=data)
     
-    def __match_operator(self, other):
-        if 1 in other.shape:
-            pass
-        elif 1 in self.shape:
-            pass
-        else:
-            if self.shape != other.shape: raise ValueError("Cannot do operation on mismatching shapes.")
+    def __add__(self, other) -> DMatrix:
+        return self.__match_operator(other, operator.__add__)
+
+    __radd__ = __add__
+
+    def __sub__(self, other) -> DMatrix:
+        return self.__match_operator(other, operator.__sub__)
+
+    def __rsub__(self, other) -> DMatrix:
+        return self.__match_operator(other, rsub)
+
+    def __mul__(self, other) -> DMatrix:
+        return self.__match_operator(other, operator.__mul__)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other) -> DMatrix:
+        return self.__match_operator(other, operator.__truediv__)
+
+    def __rtruediv__(self, other) -> DMatrix:
+        return self.__match_operator(other, rtruediv)
+
+    def __mod__(self, other) -> DMatrix:
+        return self.__match_operator(other, operator.__mod__)
+
+    def __rmod__(self, other) -> DMatrix:
+        return self.__match_operator(other, rmod)
+
+    def __pow__(self, other) -> DMatrix:
+        return self.__match_operator(other, operator.__pow__)
+
+    def __rpow__(self, other) -> DMatrix:
+        return self.__match_operator(other, rpow)
+
+    def __lt__(self, other):
+        return self.__match_operator(other, operator.__lt__)
+
+    def __le__(self, other):
+        return self.__match_operator(other, operator.__le__)
+
+    def __eq__(self, other):
+        return self.__match_operator(other, operator.__eq__)
+
+    def __ne__(self, other):
+        return self.__match_operator(other, operator.__ne__)
+
+    def __ge__(self, other):
+        return self.__match_operator(other, operator.__ge__)
+
+    def __gt__(self, other):
+        return self.__match_operator(other, operator.__gt__)
+
+    __hash__ = None
+
+    def __match_operator(self, other, opp):
+        # Stays sparse whenever _sparse_operator can do it, then only the nonzeros are visited. Everything else is
+        # element wise with broadcasting into a DMatrix, the rows of sparse operands are made dense one at a time.
+        result = self._sparse_operator(other, opp)
+        return elementwise(opp, self, other) if result is None else result
+
+    def _sparse_operator(self, other, opp):
+        # A CSR or CSC matrix stays sparse when opp maps its zeros to 0: against a scalar when opp(0, scalar) is 0,
+        # like scaling or comparing, and against a CSR, CSC, DIA or BSR matrix of the same shape when opp(0, 0) is 0,
+        # like adding or multiplying. A DIA or BSR operand is converted to CSR first.
+        # The result has the format of self, None if it is not sparse.
+        zero = self.dtype(0)
+        if _is_scalar(other):
+            if not keeps_sparsity(opp, zero, other):
+                return None
+            arrays = map_compressed(opp, self.indptr, self.indices, self.data, other)
+            return type(self)._from_compressed(*arrays, self.shape, type(opp(self.dtype(1), other)))
+        if getattr(other, "_format", None) not in ("CSR", "CSC", "DIA", "BSR") or tuple(other.shape) != tuple(self.shape):
+            return None
+        if not keeps_sparsity(opp, zero, other.dtype(0)):
+            return None
+        if other._format in ("DIA", "BSR"):
+            other = other.to_csr()
+        arrays = merge_compressed(opp, *self._compressed_as(self._format), *other._compressed_as(self._format), zero, other.dtype(0))
+        return type(self)._from_compressed(*arrays, self.shape, type(opp(self.dtype(1), other.dtype(1))))
 
     def __getitem__(self, key):
-        pass
+        """
+        CBase[key]
+        An element, or a sparse submatrix in the format of self, like DMatrix indexing.
+        CSR and CSC select their major lines by slicing, in proportion to the nnz they hold, and the minor
+        indices of every line by binary search. DIA keeps its diagonals for contiguous blocks, other
+        selections of a DIA give a CSR.
+
+        Parameters
+        ----------
+        key: int, slice, list of int, or a tuple of those for both axes
+            An int selects an axis with size 1, two ints select an element.
+        """
+        key = self._parse_getkey(key)
+        rows, cols = (DMatrix._key_range(k, self.shape[axis]) for axis, k in enumerate(key))
+        if isinstance(rows, int) and isinstance(cols, int):
+            return self._get_element(rows, cols)
+        rows = range(rows, rows + 1) if isinstance(rows, int) else rows
+        cols = range(cols, cols + 1) if isinstance(cols, int) else cols
+        return self._select(rows, cols)
+
+    def _get_element(self, i, j):
+        # The element (i, j) of a CSR or CSC matrix, by binary search in its line.
+        major, minor = (i, j) if self._format == "CSR" else (j, i)
+        start, stop = self.indptr[major], self.indptr[major + 1]
+        k = bisect.bisect_left(self.indices, minor, start, stop)
+        return self.data[k] if k < stop and self.indices[k] == minor else self.dtype(0)
+
+    def _select(self, rows, cols):
+        # The submatrix of the rows and cols, each a range or a list, of a CSR or CSC matrix.
+        if self._format == "CSR":
+            arrays = select_compressed(self.indptr, self.indices, self.data, rows, cols, self.shape[1])
+        else:
+            arrays = select_compressed(self.indptr, self.indices, self.data, cols, rows, self.shape[0])
+        return type(self)._from_compressed(*arrays, (len(rows), len(cols)), self.dtype)
 
     
     @classmethod
@@ -50,12 +294,10 @@ class CBase(LogicCore):
         if not isinstance(matrix, DMatrix): raise ValueError(f"Matrix is not of type DMatrix")
         if not hasattr(self, "self_from_svecs"): raise NotImplementedError
 
-        matrix._force_orientation(self._orientation)
-
-        if isinstance(matrix.data, DVec):
-            svecs = [SVec(matrix.data)]
+        if self._orientation == 'r':
+            svecs = [SVec(matrix.row(i)) for i in range(matrix.shape[0])]
         else:
-            svecs = [SVec(vec) for vec in matrix.data]
+            svecs = [SVec(matrix.col(i)) for i in range(matrix.shape[1])]
         
         if not hasattr(self, "self_from_svecs"): raise NotImplementedError
         return self.self_from_svecs(svecs, matrix.shape)
@@ -0,0 +1,362 @@
+"""
+Kernels on the compressed sparse layout shared by CSR and CSC.
+
+A compressed matrix is given by (indptr, indices, data): the nonzeros of major
+line i (a row for CSR, a column for CSC) are data[indptr[i]:indptr[i + 1]], at the
+minor positions indices[indptr[i]:indptr[i + 1]], sorted in increasing order.
+The CSR arrays of a matrix are the CSC arrays of its transpose, so every
+kernel works for both formats.
+"""
+
+from .._core._broadcast import CHUNK_SIZE
+from .._core._storage import store_into
+import itertools, operator, collections, bisect
+
+_DTYPE_ORDER = (bool, int, float, complex)
+
+# Operators that give 0 as soon as one operand is 0, their result only has nonzeros where both operands have one.
+_INTERSECTING = (operator.__mul__, operator.__and__)
+
+
+def result_dtype(*dtypes):
+    """
+    result_dtype(*dtypes)
+    The dtype that holds the results of arithmetic between all dtypes.
+    """
+    return max(dtypes, key=_DTYPE_ORDER.index)
+
+
+def transpose_compressed(indptr, indices, data, n_minor):
+    """
+    transpose_compressed(indptr, indices, data, n_minor)
+    Converts the CSR arrays of a matrix into its CSC arrays or the other way around,
+    with a counting sort over the minor indices in O(nnz + n).
+
+    Parameters
+    ----------
+    indptr, indices, data: lists
+        The compressed arrays.
+    n_minor: int
+        The size of the minor axis, the number of columns of a CSR matrix.
+
+    Returns
+    -------
+    (indptr, indices, data) with major and minor axis swapped, the new indices are sorted.
+    """
+    counts = collections.Counter(indices)
+    t_indptr = [0]
+    t_indptr.extend(itertools.accumulate(map(counts.__getitem__, range(n_minor))))
+    nnz = t_indptr[-1]
+    t_indices, t_data = [0] * nnz, [0] * nnz
+    # Next free slot of every minor line, the major lines are visited in order so the new indices come out sorted.
+    slots = t_indptr[:-1]
+    for i, (start, stop) in enumerate(itertools.pairwise(indptr)):
+        for j, d in zip(indices[start:stop], data[start:stop]):
+            p = slots[j]
+            t_indices[p] = i
+            t_data[p] = d
+            slots[j] = p + 1
+    return t_indptr, t_indices, t_data
+
+
+def counting_sort(keys, n):
+    """
+    counting_sort(keys, n)
+    The stable order of the positions of keys in range(n), with a counting sort in O(len(keys) + n).
+
+    Returns
+    -------
+    (indptr, order)
+        order[indptr[k]:indptr[k + 1]] are the positions with key k, in increasing order.
+    """
+    counts = collections.Counter(keys)
+    indptr = [0]
+    indptr.extend(itertools.accumulate(map(counts.__getitem__, range(n))))
+    order = [0] * len(keys)
+    slots = indptr[:-1]
+    for p, k in enumerate(keys):
+        order[slots[k]] = p
+        slots[k] += 1
+    return indptr, order
+
+
+def sum_duplicates(indptr, indices, data):
+    """
+    sum_duplicates(indptr, indices, data)
+    Sums the values with the same index in a line of compressed arrays, where equal indices are adjacent. O(nnz).
+
+    Returns
+    -------
+    (indptr, indices, data) without duplicates, the arrays themselves if there are none.
+    """
+    if not any(map(operator.__eq__, indices, itertools.islice(indices, 1, None))):
+        return indptr, indices, data
+    new_indptr, new_indices, new_data = [0], [], []
+    for start, stop in itertools.pairwise(indptr):
+        last = -1
+        for j, d in zip(indices[start:stop], data[start:stop]):
+            if j == last:
+                new_data[-1] += d
+            else:
+                new_indices.append(j)
+                new_data.append(d)
+                last = j
+        new_indptr.append(len(new_indices))
+    return new_indptr, new_indices, new_data
+
+
+def spgemm(a_indptr, a_indices, a_data, b_indptr, b_indices, b_data):
+    """
+    spgemm(a_indptr, a_indices, a_data, b_indptr, b_indices, b_data)
+    The product A @ B of two CSR matrices with Gustavson's row by row algorithm.
+    Row i of the product is the sum of the rows k of B, scaled by A[i, k], over the nonzeros of row i of A.
+    Only structural nonzeros are visited, the cost is the number of scalar products, not the size of the matrices.
+    The same call multiplies two CSC matrices as B.T @ A.T, see transpose_compressed.
+
+    Returns
+    -------
+    (indptr, indices, data) of the CSR product.
+    """
+    indptr, indices, data = [0], [], []
+    mul = operator.__mul__
+    for start, stop in itertools.pairwise(a_indptr):
+        if start == stop:
+            indptr.append(len(indices))
+            continue
+        a_row = zip(a_indices[start:stop], a_data[start:stop])
+        k, a = next(a_row)
+        b_start, b_stop = b_indptr[k], b_indptr[k + 1]
+        if stop - start == 1:
+            # A single scaled row of B, already sorted.
+            indices.extend(b_indices[b_start:b_stop])
+            data.extend(map(mul, itertools.repeat(a, b_stop - b_start), b_data[b_start:b_stop]))
+            indptr.append(len(indices))
+            continue
+
+        acc = dict(zip(b_indices[b_start:b_stop], map(mul, itertools.repeat(a, b_stop - b_start), b_data[b_start:b_stop])))
+        get = acc.get
+        for k, a in a_row:
+            b_start, b_stop = b_indptr[k], b_indptr[k + 1]
+            for j, b in zip(b_indices[b_start:b_stop], b_data[b_start:b_stop]):
+                acc[j] = get(j, 0) + a * b
+        cols = sorted(acc)
+        indices.extend(cols)
+        data.extend(map(acc.__getitem__, cols))
+        indptr.append(len(indices))
+    return indptr, indices, data
+
+
+def write_chunks(items, n, out, dtype):
+    """
+    write_chunks(items, n, out, dtype)
+    Writes the n items of an iterator into the buffer out of type dtype, CHUNK_SIZE items at a time,
+    so only one chunk of the results exists at once.
+
+    Returns
+    -------
+    out
+    """
+    for start in range(0, n, CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, n)
+        store_into(out, slice(start, stop), itertools.islice(items, stop - start), dtype)
+    return out
+
+
+def gather_matvec(indptr, indices, data, x, out=None, dtype=None):
+    """
+    gather_matvec(indptr, indices, data, x, [out, dtype])
+    The product of a CSR matrix with the vector x, every row gathers its entries of x.
+    The products of all nonzeros are one lazy stream, which is summed row by row, in O(nnz + n).
+    If the buffer out of type dtype is given the sums are written into it, see write_chunks.
+
+    Returns
+    -------
+    list, the product with one item per row, or out.
+    """
+    products = map(operator.__mul__, data, map(x.__getitem__, indices))
+    counts = map(operator.__sub__, itertools.islice(indptr, 1, None), indptr)
+    if out is not None:
+        return write_chunks(map(sum, map(itertools.islice, itertools.repeat(products), counts)), len(indptr) - 1, out, dtype)
+    return [sum(itertools.islice(products, count)) for count in counts]
+
+
+def scatter_matvec(indptr, indices, data, x, n, out=None, dtype=None):
+    """
+    scatter_matvec(indptr, indices, data, x, n, [out, dtype])
+    The product of a CSC matrix with n rows with the vector x, every column adds its nonzeros,
+    scaled by its entry of x, to the rows they are in, in O(nnz + n).
+    If the buffer out of type dtype is given it is zeroed and the products are added into it.
+
+    Returns
+    -------
+    list, the product with one item per row, or out.
+    """
+    if out is None:
+        y = [0] * n
+    else:
+        y = write_chunks(itertools.repeat(dtype(0)), n, out, dtype)
+    counts = map(operator.__sub__, itertools.islice(indptr, 1, None), indptr)
+    products = map(operator.__mul__, data, itertools.chain.from_iterable(map(itertools.repeat, x, counts)))
+    for i, p in zip(indices, products):
+        y[i] += p
+    return y
+
+
+def keeps_sparsity(opp, a, b):
+    """
+    keeps_sparsity(opp, a, b)
+    Whether opp(a, b) is 0, so opp only has to be done on the nonzeros.
+    An opp that fails on it, like a division by 0, has to be done densely.
+    """
+    try:
+        result = opp(a, b)
+    except ArithmeticError:
+        return False
+    return result == 0
+
+
+def merge_line(opp, a_indices, a_data, b_indices, b_data, a_zero, b_zero):
+    """
+    merge_line(opp, a_indices, a_data, b_indices, b_data, a_zero, b_zero)
+    opp element wise over two sparse lines, given by their sorted indices and their values,
+    where opp(a_zero, b_zero) is 0. Operators in _INTERSECTING only visit the common indices,
+    all others the union of both, where the missing values are a_zero or b_zero.
+    Explicit zeros of the result are pruned. O(nnz_a + nnz_b).
+
+    Returns
+    -------
+    (indices, data) of the result.
+    """
+    if a_indices == b_indices:
+        indices, data = a_indices, list(map(opp, a_data, b_data))
+    elif opp in _INTERSECTING:
+        b_values = dict(zip(b_indices, b_data))
+        common = [(j, a) for j, a in zip(a_indices, a_data) if j in b_values]
+        if not common:
+            return [], []
+        indices, a_common = map(list, zip(*common))
+        data = list(map(opp, a_common, map(b_values.__getitem__, indices)))
+    else:
+        indices, data = [], []
+        i = j = 0
+        a_len, b_len = len(a_indices), len(b_indices)
+        while i < a_len and j < b_len:
+            a_j, b_j = a_indices[i], b_indices[j]
+            if a_j == b_j:
+                indices.append(a_j)
+                data.append(opp(a_data[i], b_data[j]))
+                i += 1
+                j += 1
+            elif a_j < b_j:
+                indices.append(a_j)
+                data.append(opp(a_data[i], b_zero))
+                i += 1
+            else:
+                indices.append(b_j)
+                data.append(opp(a_zero, b_data[j]))
+                j += 1
+        # At most one of the lines has items left.
+        indices.extend(a_indices[i:])
+        data.extend(map(opp, a_data[i:], itertools.repeat(b_zero)))
+        indices.extend(b_indices[j:])
+        data.extend(map(opp, itertools.repeat(a_zero), b_data[j:]))
+    if all(data):
+        return indices, data
+    return list(itertools.compress(indices, data)), list(itertools.compress(data, data))
+
+
+def merge_compressed(opp, a_indptr, a_indices, a_data, b_indptr, b_indices, b_data, a_zero, b_zero):
+    """
+    merge_compressed(opp, a_indptr, a_indices, a_data, b_indptr, b_indices, b_data, a_zero, b_zero)
+    opp element wise over two matrices in the same compressed format, line by line with merge_line.
+
+    Returns
+    -------
+    (indptr, indices, data) of the result, without explicit zeros.
+    """
+    indptr, indices, data = [0], [], []
+    for (a_start, a_stop), (b_start, b_stop) in zip(itertools.pairwise(a_indptr), itertools.pairwise(b_indptr)):
+        line_indices, line_data = merge_line(opp, a_indices[a_start:a_stop], a_data[a_start:a_stop],
+                                             b_indices[b_start:b_stop], b_data[b_start:b_stop], a_zero, b_zero)
+        indices.extend(line_indices)
+        data.extend(line_data)
+        indptr.append(len(indices))
+    return indptr, indices, data
+
+
+def map_compressed(opp, indptr, indices, data, scalar):
+    """
+    map_compressed(opp, indptr, indices, data, scalar)
+    opp(x, scalar) over the nonzeros x of a compressed matrix, where opp(0, scalar) is 0,
+    like scaling or comparing with a scalar. Explicit zeros of the result are pruned. O(nnz).
+
+    Returns
+    -------
+    (indptr, indices, data) of the result.
+    """
+    data = list(map(opp, data, itertools.repeat(scalar, len(data))))
+    if all(data):
+        return indptr[:], indices[:], data
+    kept = list(map(bool, data))
+    new_indptr = [0]
+    new_indptr.extend(itertools.accumulate(sum(kept[start:stop]) for start, stop in itertools.pairwise(indptr)))
+    return new_indptr, list(itertools.compress(indices, kept)), list(itertools.compress(data, kept))
+
+
+def _select_line(indices, data, start, stop, minor, n_minor):
+    # The (positions in minor, values) of the nonzeros of the line indices[start:stop] at the minor indices,
+    # found by binary search over the sorted indices of the line.
+    if isinstance(minor, range):
+        if len(minor) == 0 or start == stop:
+            return [], []
+        if minor.step == 1 and len(minor) == n_minor:
+            return indices[start:stop], data[start:stop]
+        first, last = min(minor[0], minor[-1]), max(minor[0], minor[-1])
+        lo = bisect.bisect_left(indices, first, start, stop)
+        hi = bisect.bisect_right(indices, last, start, stop)
+        if minor.step == 1:
+            return list(map(operator.__sub__, indices[lo:hi], itertools.repeat(first, hi - lo))), data[lo:hi]
+        positions, values = [], []
+        for j, d in zip(indices[lo:hi], data[lo:hi]):
+            p, r = divmod(j - minor.start, minor.step)
+            if r == 0:
+                positions.append(p)
+                values.append(d)
+        if minor.step < 0:
+            positions.reverse()
+            values.reverse()
+        return positions, values
+
+    positions, values = [], []
+    for p, j in enumerate(minor):
+        k = bisect.bisect_left(indices, j, start, stop)
+        if k < stop and indices[k] == j:
+            positions.append(p)
+            values.append(data[k])
+    return positions, values
+
+
+def select_compressed(indptr, indices, data, major, minor, n_minor):
+    """
+    select_compressed(indptr, indices, data, major, minor, n_minor)
+    The submatrix of the major lines and minor indices of a compressed matrix, where major and minor are a range
+    or a list of indices. Selecting major lines costs the nnz they hold, the minor indices of every line are found
+    by binary search, a range takes two searches per line and a list one per index.
+
+    Returns
+    -------
+    (indptr, indices, data) of the submatrix, with sorted indices.
+    """
+    if isinstance(major, range) and major.step == 1 and isinstance(minor, range) and minor.step == 1 and len(minor) == n_minor:
+        # A block of whole lines, three slices.
+        first, last = indptr[major.start], indptr[major.stop] if len(major) else indptr[major.start]
+        new_indptr = list(map(operator.__sub__, indptr[major.start:major.start + len(major) + 1], itertools.repeat(first)))
+        return new_indptr, indices[first:last], data[first:last]
+
+    new_indptr, new_indices, new_data = [0], [], []
+    for i in major:
+        positions, values = _select_line(indices, data, indptr[i], indptr[i + 1], minor, n_minor)
+        new_indices.extend(positions)
+        new_data.extend(values)
+        new_indptr.append(len(new_indices))
+    return new_indptr, new_indices, new_data
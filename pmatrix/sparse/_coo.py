@@ -0,0 +1,119 @@
+"""
+Coordinate sparse matrix, a builder for CSR and CSC.
+"""
+
+from __future__ import annotations
+from ._csr import CSR
+from ._csc import CSC
+from ._compressed import result_dtype, counting_sort, sum_duplicates
+
+class COO:
+    """
+    Coordinate sparse matrix, a list of (row, col, value) triplets that is assembled into a CSR or CSC matrix.
+    This matrix can be initialized as:
+    COO(shape=(M,N), triplets=[(row, col, value),...], dtype=None)
+        More triplets are added with append and extend, the same position may be given more than once,
+        the values are summed on conversion. Nothing dense is ever created.
+    """
+    _format = "COO"
+
+    def __init__(self, shape, triplets=None, dtype=None) -> COO:
+        if not isinstance(shape, tuple) or len(shape) != 2 or not isinstance(shape[0], int) or not isinstance(shape[1], int):
+            raise ValueError("Shape needs to be a length 2 tuple of integers")
+        if dtype is not None and dtype not in (int, float, complex, bool): raise TypeError(f"Data must be of type int, float or complex, not {dtype}")
+        self.shape = shape
+        self.dtype = dtype
+        self.rows, self.cols, self.data = [], [], []
+        if triplets is not None:
+            self.extend(triplets)
+
+    def append(self, row, col, value):
+        """
+        COO.append(row, col, value)
+        Adds value at (row, col), on top of any value already given there.
+        """
+        if not 0 <= row < self.shape[0] or not 0 <= col < self.shape[1]: raise IndexError(f"Index ({row}, {col}) out of range for shape {self.shape}")
+        self.rows.append(row)
+        self.cols.append(col)
+        self.data.append(value)
+
+    def extend(self, triplets):
+        """
+        COO.extend(triplets)
+        Adds all (row, col, value) triplets of an iterable, see append.
+        """
+        triplets = list(triplets)
+        if not triplets:
+            return
+        rows, cols, data = zip(*triplets)
+        self.extend_arrays(rows, cols, data)
+
+    def extend_arrays(self, rows, cols, values):
+        """
+        COO.extend_arrays(rows, cols, values)
+        Adds the values at (rows[k], cols[k]) for all k, without building a triplet per value.
+
+        Parameters
+        ----------
+        rows, cols: iterables of int
+            The positions, as long as values.
+        values: iterable
+            The values.
+        """
+        rows, cols, values = list(rows), list(cols), list(values)
+        if not len(rows) == len(cols) == len(values): raise ValueError(f"Got {len(rows)} rows, {len(cols)} cols and {len(values)} values")
+        if not rows:
+            return
+        if min(rows) < 0 or max(rows) >= self.shape[0]: raise IndexError(f"Row index out of range for shape {self.shape}")
+        if min(cols) < 0 or max(cols) >= self.shape[1]: raise IndexError(f"Column index out of range for shape {self.shape}")
+        self.rows.extend(rows)
+        self.cols.extend(cols)
+        self.data.extend(values)
+
+    def _compress(self, major, minor, n_major, n_minor):
+        # The compressed arrays with major lines, a radix sort of two stable counting sorts, first on the minor
+        # and then on the major indices, so the minor indices of every line come out sorted in O(nnz + n).
+        # Duplicates are then adjacent and summed.
+        _, by_minor = counting_sort(minor, n_minor)
+        indptr, order = counting_sort(list(map(major.__getitem__, by_minor)), n_major)
+        order = list(map(by_minor.__getitem__, order))
+        indices = list(map(minor.__getitem__, order))
+        data = list(map(self.data.__getitem__, order))
+
+        types = set(map(type, data))
+        dtype = self.dtype or (result_dtype(*types) if types else int)
+        if types - {dtype}:
+            data = list(map(dtype, data))
+        return sum_duplicates(indptr, indices, data) + (dtype,)
+
+    def to_csr(self) -> CSR:
+        """
+        COO.to_csr()
+        The CSR matrix of the triplets, with the values at the same position summed and the column indices sorted,
+        in O(nnz + n). Values that sum to zero are kept, so the sparsity pattern is that of the triplets.
+
+        Returns
+        -------
+        CSR
+        """
+        indptr, indices, data, dtype = self._compress(self.rows, self.cols, self.shape[0], self.shape[1])
+        return CSR._from_compressed(indptr, indices, data, self.shape, dtype)
+
+    def to_csc(self) -> CSC:
+        """
+        COO.to_csc()
+        The CSC matrix of the triplets, with the values at the same position summed and the row indices sorted,
+        in O(nnz + n), see to_csr.
+
+        Returns
+        -------
+        CSC
+        """
+        indptr, indices, data, dtype = self._compress(self.cols, self.rows, self.shape[1], self.shape[0])
+        return CSC._from_compressed(indptr, indices, data, self.shape, dtype)
+
+    def to_dmatrix(self):
+        return self.to_csr().to_dmatrix()
+
+    def __str__(self):
+        return self.to_csr().__str__()
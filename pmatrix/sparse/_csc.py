@@ -1,6 +1,7 @@
 from __future__ import annotations
 from ._cbase import CBase
 from ._svec import SVec
+from ._compressed import gather_matvec, scatter_matvec
 import itertools, bisect
 
 class CSC(CBase):
@@ -14,34 +15,61 @@ class CSC(CBase):
         return list(zip(self.indices[start:stop], self.data[start:stop]))
 
     def get_row_data(self, row_i):
+        if self._twin is not None:
+            return self._twin.get_row_data(row_i)
         row_d = [(i,d) for i, (ind, d) in enumerate(zip(self.indices, self.data)) if ind==row_i]
         return [(bisect.bisect_right(self.indptr, i) - 1, d) for i, d in row_d]
 
     def T(self, inplace=False):
-        t_data, t_indptr, t_indices = [], [0], []
-        t_shape = (self.shape[1], self.shape[0])
-        t_dtype = self.dtype
-
-        for i in range(self.shape[0]):
-            row_d = self.get_row_data(i)
-            t_indptr.append(t_indptr[i] + len(row_d))
-            t_data += [d[1] for d in row_d]
-            t_indices += [d[0] for d in row_d]
-        
-        if inplace:
-            self_t = self
-        else:
-            self_t = CSC()
-
-        self_t.indptr = t_indptr
-        self_t.indices = t_indices
-        self_t.data = t_data
-        self_t.shape = t_shape
-        self_t.dtype = t_dtype
-        return self_t
-    
+        """
+        CSC.T(inplace=False)
+        The transpose as a CSC matrix, in O(nnz + n): its CSC arrays are the CSR arrays of self, see to_csr.
+
+        Parameters
+        ----------
+        inplace: bool
+            If True self is transposed and returned.
+
+        Returns
+        -------
+        CSC
+        """
+        return self._transpose(inplace)
+
+    def to_csc(self) -> CSC:
+        """
+        CSC.to_csc()
+        Returns self, which is a CSC matrix already.
+        """
+        return self
+
+    def to_csr(self, cache=False) -> CSR:
+        """
+        CSC.to_csr(cache=False)
+        The same matrix in CSR format, converted by a counting sort over the row indices in O(nnz + n).
+
+        Parameters
+        ----------
+        cache: bool
+            If True the CSR matrix is kept on self, later conversions, transposes and get_row_data
+            calls read from it, so a row costs O(nnz of the row) instead of O(nnz).
+            Both matrices share their arrays and must not be modified afterwards.
+
+        Returns
+        -------
+        CSR
+        """
+        from ._csr import CSR
+        return self._convert(CSR, cache)
+
+    def _matvec(self, x, out=None, dtype=None):
+        return scatter_matvec(self.indptr, self.indices, self.data, x, self.shape[0], out, dtype)
+
+    def _rmatvec(self, x):
+        return gather_matvec(self.indptr, self.indices, self.data, x)
+
     def _to_svecs(self):
-        return [SVec(list(zip(self.indices[start:stop], self.data[start:stop])), dtype=self.dtype, orientation='c', length=self.shape[0]) for start, stop in itertools.pairwise(self.indptr)]
+        return [SVec._from_parts(self.indices[start:stop], self.data[start:stop], self.dtype, 'c', self.shape[0]) for start, stop in itertools.pairwise(self.indptr)]
 
     def _to_full_data(self):
         return [svec.to_dvec() for svec in self._to_svecs()]
@@ -53,7 +81,7 @@ class CSC(CBase):
         self.dtype = svecs[0].dtype
         self.indices, self.data, self.indptr = [], [], [0]
         for svec in svecs:
-            self.indices += [d[0] for d in svec.data]
-            self.data += [d[1] for d in svec.data]
+            self.indices.extend(svec.indices)
+            self.data.extend(svec.values)
             self.indptr.append(len(self.data))
         return self
\ No newline at end of file
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from ._cbase import CBase
 from ._svec import SVec
+from ._compressed import gather_matvec, scatter_matvec
 import time, itertools, bisect
 
 class CSR(CBase):
@@ -14,33 +15,61 @@ class CSR(CBase):
         return list(zip(self.indices[start:stop], self.data[start:stop]))
 
     def get_col_data(self, col_i):
+        if self._twin is not None:
+            return self._twin.get_col_data(col_i)
         col_d = [(i,d) for i, (ind, d) in enumerate(zip(self.indices, self.data)) if ind==col_i]
         return [(bisect.bisect_right(self.indptr, i) - 1, d) for i, d in col_d]
     
     def T(self, inplace=False):
-        t_data, t_indptr, t_indices = [], [0], []
-        t_shape = (self.shape[1], self.shape[0])
-        t_dtype= self.dtype
-        for i in range(self.shape[0]):
-            col_d = self.get_col_data(i)
-            t_indptr.append(t_indptr[i] + len(col_d))
-            t_data += [d[1] for d in col_d]
-            t_indices += [d[0] for d in col_d]
-        
-        if inplace:
-            self_t = self
-        else:
-            self_t = CSR()
-
-        self_t.indptr = t_indptr
-        self_t.indices = t_indices
-        self_t.data = t_data
-        self_t.shape = t_shape
-        self_t.dtype = t_dtype
-        return self_t
-    
+        """
+        CSR.T(inplace=False)
+        The transpose as a CSR matrix, in O(nnz + n): its CSR arrays are the CSC arrays of self, see to_csc.
+
+        Parameters
+        ----------
+        inplace: bool
+            If True self is transposed and returned.
+
+        Returns
+        -------
+        CSR
+        """
+        return self._transpose(inplace)
+
+    def to_csr(self) -> CSR:
+        """
+        CSR.to_csr()
+        Returns self, which is a CSR matrix already.
+        """
+        return self
+
+    def to_csc(self, cache=False) -> CSC:
+        """
+        CSR.to_csc(cache=False)
+        The same matrix in CSC format, converted by a counting sort over the column indices in O(nnz + n).
+
+        Parameters
+        ----------
+        cache: bool
+            If True the CSC matrix is kept on self, later conversions, transposes and get_col_data
+            calls read from it, so a column costs O(nnz of the column) instead of O(nnz).
+            Both matrices share their arrays and must not be modified afterwards.
+
+        Returns
+        -------
+        CSC
+        """
+        from ._csc import CSC
+        return self._convert(CSC, cache)
+
+    def _matvec(self, x, out=None, dtype=None):
+        return gather_matvec(self.indptr, self.indices, self.data, x, out, dtype)
+
+    def _rmatvec(self, x):
+        return scatter_matvec(self.indptr, self.indices, self.data, x, self.shape[1])
+
     def _to_svecs(self):
-        return [SVec(list(zip(self.indices[start:stop], self.data[start:stop])), dtype=self.dtype, orientation='r', length=self.shape[1]) for start, stop in itertools.pairwise(self.indptr)]
+        return [SVec._from_parts(self.indices[start:stop], self.data[start:stop], self.dtype, 'r', self.shape[1]) for start, stop in itertools.pairwise(self.indptr)]
 
     def _to_full_data(self):
         return [svec.to_dvec() for svec in self._to_svecs()]
@@ -52,7 +81,7 @@ class CSR(CBase):
         self.dtype = svecs[0].dtype
         self.indices, self.data, self.indptr = [], [], [0]
         for svec in svecs:
-            self.indices += [d[0] for d in svec.data]
-            self.data += [d[1] for d in svec.data]
+            self.indices.extend(svec.indices)
+            self.data.extend(svec.values)
             self.indptr.append(len(self.data))
         return self
\ No newline at end of file
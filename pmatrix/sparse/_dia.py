@@ -4,9 +4,16 @@ Diagonal sparse matrix.
 
 
 from __future__ import annotations
+from .._core._dmatrix import DMatrix
+from .._core._dvec import DVec
+from .._core._broadcast import CHUNK_SIZE
+from .._core._storage import cast_buffer, zeros
 from ._cbase import CBase
+from ._csr import CSR
+from ._csc import CSC
 from ._svec import SVec
-import collections, operator, bisect
+from ._compressed import result_dtype, keeps_sparsity, select_compressed
+import collections, operator, bisect, itertools, math
 
 class DIA(CBase):
     """
@@ -15,6 +22,10 @@ class DIA(CBase):
         offset is an integer which counts the offset of the main diagonal. Where positive 
         integers are to the right.
         patern is a list containing a patern that gets wrapped when the end is reached.
+    Sums, differences and products of DIA matrices, and scaling, give a new DIA, the operands are not changed.
+    Paterns are combined into the least common multiple of their periods.
+    matvec, scaling, T, diagonal, sum and iter_rows work on the stored constants and paterns, so a DIA
+    of any size takes O(ndiag) memory and these only allocate their result.
     """
     def __init__(self, shape, cons_diags = None, repeat_diags= None, dtype=None) -> DIA:
         CBase.__init__(self)
@@ -24,6 +35,7 @@ class DIA(CBase):
         if not isinstance(shape, tuple) or not isinstance(shape[0], int) or not isinstance(shape[1], int):
             raise ValueError("Shape needs to be a length 2 tuple of integers")
         
+        self.dtype = dtype
         data = []
 
         if cons_diags:
@@ -54,47 +66,313 @@ class DIA(CBase):
         if any([count > 1 for count in counted_dict.values()]):
             raise ValueError(f"Cannot use 2 values on same diagonal(s) {[k for k,v in counted_dict.items() if v>1]}")
         
+        if self.dtype is None:
+            self.dtype = int
+
         data = sorted(data, key=lambda d: d[0])
         self.offsets = [d[0] for d in data]
         self.data = [d[1] for d in data]
         
 
-    def __add__(self, other) -> DIA:
-        return self.__match_operator(other, operator.__add__)
-    
-    __radd__ = __add__
-    
-    def __sub__(self, other) -> DIA:
-        return self.__match_operator(other, operator.__sub__)
-    
-    __rsub__ = __sub__
-    
-    def __match_operator(self, other, opp) -> DIA:
-        if not isinstance(other, DIA): return NotImplemented
-        if self.shape != other.shape: raise ValueError("Cannot do operation on mismatching shapes.")
-        
-        for offset, other_d in zip(other.offsets, other.data):
-            if offset in self.offsets:
-                index = self.offsets.index(offset)
-                if isinstance(other_d, list) and isinstance(self.data[index], list): 
-                    raise ValueError("Cannot do operation on paterns of different lengths")
-                if isinstance(other_d, list):
-                    self.data[index] = [opp(self.data[index], d) for d in other_d]
-                elif isinstance(self.data[index], list):
-                    self.data[index] = [opp(d,other_d) for d in self.data[index]]
-                else:
-                    self.data[index] = opp(self.data[index], other_d)
-            
+    @classmethod
+    def _from_diagonals(cls, shape, diagonals, dtype):
+        # A DIA from (offset, constant or patern) pairs, a patern of equal items becomes a constant and zero diagonals are left out.
+        cons_diags, repeat_diags = [], []
+        for offset, d in diagonals:
+            if isinstance(d, list) and d.count(d[0]) != len(d):
+                repeat_diags.append((offset, d))
+                continue
+            d = d[0] if isinstance(d, list) else d
+            if d != 0:
+                cons_diags.append((offset, d))
+        return cls(shape, cons_diags=cons_diags, repeat_diags=repeat_diags, dtype=dtype)
+
+    def _combine(self, opp, a, b, length):
+        # opp along a diagonal of length items, on constants or paterns. Two paterns give a patern with
+        # the least common multiple of their periods, as long as that is shorter than the diagonal.
+        if not isinstance(a, list) and not isinstance(b, list):
+            return opp(a, b)
+        period = min(math.lcm(len(a) if isinstance(a, list) else 1, len(b) if isinstance(b, list) else 1), length)
+        return list(map(opp, self._diagonal_values(a, period), self._diagonal_values(b, period)))
+
+    def _sparse_operator(self, other, opp):
+        # A DIA stays DIA when opp maps its zeros to 0, see CBase._sparse_operator. Against a scalar every diagonal is mapped,
+        # against another DIA the diagonals with the same offset are combined, and with CSR, CSC or BSR the result is CSR.
+        zero = self.dtype(0)
+        if isinstance(other, (int, float, complex, bool)):
+            if not keeps_sparsity(opp, zero, other):
+                return None
+            diagonals = [(o, [opp(x, other) for x in d] if isinstance(d, list) else opp(d, other)) for o, d in zip(self.offsets, self.data)]
+            return DIA._from_diagonals(self.shape, diagonals, type(opp(self.dtype(1), other)))
+        fmt = getattr(other, "_format", None)
+        if fmt in ("CSR", "CSC", "BSR"):
+            return self.to_csr()._sparse_operator(other, opp)
+        if fmt != "DIA" or tuple(other.shape) != tuple(self.shape):
+            return None
+        other_zero = other.dtype(0)
+        if not keeps_sparsity(opp, zero, other_zero):
+            return None
+        a, b = dict(zip(self.offsets, self.data)), dict(zip(other.offsets, other.data))
+        diagonals = []
+        for offset in sorted(a.keys() | b.keys()):
+            length = self._diagonal_range(offset)[1]
+            if length:
+                diagonals.append((offset, self._combine(opp, a.get(offset, zero), b.get(offset, other_zero), length)))
+        return DIA._from_diagonals(self.shape, diagonals, type(opp(self.dtype(1), other.dtype(1))))
+
+    def _dia_matmul(self, other) -> DIA:
+        # Diagonal p of self times diagonal q of other adds to diagonal p + q of the product, over the rows i where
+        # 0 <= i + p < shape[1]. When every term of a diagonal covers all of it, the diagonal is periodic with the
+        # least common multiple of the periods and only one period is computed. Otherwise it is computed in full.
+        n, inner, m = self.shape[0], self.shape[1], other.shape[1]
+        dtype = result_dtype(self.dtype, other.dtype)
+        terms = collections.defaultdict(list)
+        for p, a in zip(self.offsets, self.data):
+            for q, b in zip(other.offsets, other.data):
+                terms[p + q].append((p, q, a, b))
+
+        diagonals = []
+        for r, r_terms in sorted(terms.items()):
+            start = max(0, -r)
+            stop = min(n, m - r)
+            if stop <= start: continue
+            spans = [(max(start, -p), min(stop, inner - p)) for p, _, _, _ in r_terms]
+            if all(span == (start, stop) for span in spans):
+                periods = [len(d) for _, _, a, b in r_terms for d in (a, b) if isinstance(d, list)]
+                count = min(math.lcm(*periods), stop - start)
             else:
-                index = bisect.bisect_left(self.offsets, offset)
-                self.offsets.insert(index, offset)
-                if isinstance(other_d, list):
-                    self.data.insert(index, [opp(0, d) for d in other_d])
+                count = stop - start
+            values = [dtype(0)] * count
+            for (p, q, a, b), (lo, hi) in zip(r_terms, spans):
+                hi = min(hi, start + count)
+                if lo >= hi: continue
+                k, length = lo - start, hi - lo
+                products = map(operator.__mul__, self._diagonal_values(a, length, lo + min(0, p)), self._diagonal_values(b, length, lo + p + min(0, q)))
+                values[k:k + length] = map(operator.__add__, values[k:k + length], products)
+            diagonals.append((r, values))
+        return DIA._from_diagonals((n, m), diagonals, dtype)
+
+    def to_csr(self) -> CSR:
+        """
+        DIA.to_csr()
+        The same matrix as CSR, in O(ndiag * n) without building any row objects.
+        The rows are cut into at most 2 * ndiag + 1 blocks that are crossed by the same diagonals,
+        the rows of a block interleave those diagonals with zip.
+
+        Returns
+        -------
+        CSR
+        """
+        indptr, indices, data = [0], [], []
+        for r0, r1, active in self._segments():
+            indptr.extend(itertools.islice(itertools.accumulate(itertools.repeat(len(active), r1 - r0), initial=indptr[-1]), 1, None))
+            if not active: continue
+            indices.extend(itertools.chain.from_iterable(zip(*[range(r0 + offset, r1 + offset) for offset, _, _ in active])))
+            data.extend(itertools.chain.from_iterable(zip(*[self._diagonal_values(d, r1 - r0, r0 - start) for _, d, start in active])))
+        return CSR._from_compressed(indptr, indices, data, self.shape, self.dtype)
+
+    def to_csc(self) -> CSC:
+        """
+        DIA.to_csc()
+        The same matrix as CSC, through to_csr.
+        """
+        return self.to_csr().to_csc()
+
+    def _diagonal_range(self, offset):
+        # The first row and the length of the diagonal with this offset.
+        start = max(0, -offset)
+        return start, max(0, min(self.shape[0], self.shape[1] - offset) - start)
+
+    def _diagonal_values(self, d, length, start=0):
+        # The items start:start + length along a stored diagonal, a constant is repeated and a patern is wrapped.
+        if isinstance(d, list):
+            start %= len(d)
+            return itertools.islice(itertools.cycle(d), start, start + length)
+        return itertools.repeat(d, length)
+
+    def _segments(self):
+        # The row blocks r0:r1 that are crossed by the same diagonals, at most 2 * ndiag + 1 of them,
+        # with the (offset, d, start) of those diagonals.
+        diagonals = []
+        for offset, d in zip(self.offsets, self.data):
+            start, length = self._diagonal_range(offset)
+            if length:
+                diagonals.append((offset, d, start, start + length))
+        bounds = sorted({0, self.shape[0]}.union(*[(start, stop) for _, _, start, stop in diagonals]))
+        for r0, r1 in itertools.pairwise(bounds):
+            yield r0, r1, [(offset, d, start) for offset, d, start, stop in diagonals if start <= r0 and r1 <= stop]
+
+    def _row_block(self, r0, r1, x=None):
+        # The rows r0:r1 of self @ x, or the row sums if x is None, as a list. Every diagonal adds one slice.
+        acc = [0] * (r1 - r0)
+        for offset, d in zip(self.offsets, self.data):
+            start, length = self._diagonal_range(offset)
+            lo, hi = max(r0, start), min(r1, start + length)
+            if lo >= hi: continue
+            values = self._diagonal_values(d, hi - lo, lo - start)
+            if x is not None:
+                values = map(operator.__mul__, values, x[lo + offset:hi + offset])
+            acc[lo - r0:hi - r0] = map(operator.__add__, acc[lo - r0:hi - r0], values)
+        return acc
+
+    def _row_blocks(self, x, dtype, out=None):
+        # All rows of self @ x, or the row sums if x is None, as a buffer that is filled CHUNK_SIZE rows at a time.
+        # The rows are written into the buffer out of type dtype if it is given.
+        n = self.shape[0]
+        buf = zeros(n, dtype) if out is None else out
+        for r0 in range(0, n, CHUNK_SIZE):
+            r1 = min(r0 + CHUNK_SIZE, n)
+            buf[r0:r1] = cast_buffer(self._row_block(r0, r1, x), dtype)
+        return buf
+
+    def matvec(self, x, out=None) -> DVec:
+        """
+        DIA.matvec(x, out=None)
+        The matrix vector product self @ x, straight from the stored constants and paterns.
+        The rows are done in blocks of CHUNK_SIZE, apart from x and the result only one block
+        is in memory, whatever the size of the matrix.
+
+        Parameters
+        ----------
+        x: DVec, list or array
+            A vector with shape[1] items.
+        out: DVec, optional
+            A vector with shape[0] items the product is written into, see CBase.matvec.
+
+        Returns
+        -------
+        DVec, a column vector with shape[0] items, out if it is given.
+        """
+        x_data = self._vector_data(x, self.shape[1])
+        dtype = result_dtype(self.dtype, type(x_data[0]))
+        if out is not None:
+            out = self._out_vector(out, dtype, x_data)
+            self._matvec(x_data, out._buf, out.dtype)
+            return out
+        return DVec._from_buffer(self._row_blocks(x_data, dtype), dtype, 'c')
+
+    def _matvec(self, x, out, dtype):
+        # The kernel of matvec with an out buffer, like the _matvec of CSR and CSC.
+        return self._row_blocks(x, dtype, out)
+
+    def rmatvec(self, x) -> DVec:
+        """
+        DIA.rmatvec(x)
+        The vector matrix product x @ self, which is self.T() @ x as a row vector, see matvec.
+        """
+        x_data = self._vector_data(x, self.shape[0])
+        dtype = result_dtype(self.dtype, type(x_data[0]))
+        return DVec._from_buffer(self.T()._row_blocks(x_data, dtype), dtype, 'r')
+
+    def T(self, inplace=False) -> DIA:
+        """
+        DIA.T(inplace=False)
+        The transpose, in O(ndiag): the offsets change sign and the stored constants and paterns stay,
+        an item is stored at its position along the diagonal, which is the same in the transpose.
+
+        Parameters
+        ----------
+        inplace: bool
+            If True self is transposed and returned.
+
+        Returns
+        -------
+        DIA
+        """
+        self_t = self if inplace else DIA((self.shape[1], self.shape[0]), dtype=self.dtype)
+        offsets = [-offset for offset in reversed(self.offsets)]
+        data = [list(d) if isinstance(d, list) else d for d in reversed(self.data)]
+        self_t.shape = (self.shape[1], self.shape[0])
+        self_t.offsets, self_t.data = offsets, data
+        return self_t
+
+    def diagonal(self, offset=0) -> DVec:
+        """
+        DIA.diagonal(offset=0)
+        The diagonal with this offset as a column DVec, streamed from its constant or patern.
+        Positive offsets are to the right.
+        """
+        start, length = self._diagonal_range(offset)
+        if length == 0: raise ValueError(f"Offset {offset} is out of range for shape {self.shape}")
+        k = bisect.bisect_left(self.offsets, offset)
+        if k == len(self.offsets) or self.offsets[k] != offset:
+            return DVec._from_buffer(zeros(length, self.dtype), self.dtype, 'c')
+        values = self._diagonal_values(self.data[k], length)
+        return DVec._from_buffer(cast_buffer(values if self.dtype is float else list(values), self.dtype), self.dtype, 'c')
+
+    def sum(self, axis=None):
+        """
+        DIA.sum(axis=None)
+        The sum of all elements if axis is None, else the sums along an axis like DMatrix.sum,
+        computed from the stored diagonals. For the total a patern is summed once per period.
+        """
+        dtype = result_dtype(self.dtype, int)
+        if axis is None:
+            total = dtype(0)
+            for offset, d in zip(self.offsets, self.data):
+                length = self._diagonal_range(offset)[1]
+                if isinstance(d, list):
+                    periods, rest = divmod(length, len(d))
+                    total += periods * sum(d) + sum(d[:rest])
                 else:
-                    self.data.insert(index, opp(0, other_d))
-        
-        return self
-        
+                    total += length * d
+            return total
+        if axis == 0:
+            return DMatrix._from_buffer(self.T()._row_blocks(None, dtype), (1, self.shape[1]), dtype)
+        return DMatrix._from_buffer(self._row_blocks(None, dtype), (self.shape[0], 1), dtype)
+
+    def iter_rows(self, start=0, stop=None):
+        """
+        DIA.iter_rows(start=0, stop=None)
+        Streams the rows start:stop as lists of (col, value), like get_row_data.
+        Only one row exists at a time, the diagonals are walked along with iterators.
+        """
+        stop = self.shape[0] if stop is None else min(stop, self.shape[0])
+        for r0, r1, active in self._segments():
+            r0, r1 = max(r0, start), min(r1, stop)
+            if r0 >= r1: continue
+            if not active:
+                for _ in range(r1 - r0):
+                    yield []
+                continue
+            cols = zip(*[range(r0 + offset, r1 + offset) for offset, _, _ in active])
+            values = zip(*[self._diagonal_values(d, r1 - r0, r0 - d_start) for _, d, d_start in active])
+            for row_cols, row_values in zip(cols, values):
+                yield list(zip(row_cols, row_values))
+
+    def _get_element(self, i, j):
+        k = bisect.bisect_left(self.offsets, j - i)
+        if k == len(self.offsets) or self.offsets[k] != j - i:
+            return self.dtype(0)
+        d = self.data[k]
+        return d[min(i, j) % len(d)] if isinstance(d, list) else d
+
+    def _select(self, rows, cols):
+        # A contiguous block keeps the diagonals that cross it, a patern is rotated to the first item in the block.
+        # Any other selection gathers the rows and is returned as CSR.
+        if isinstance(rows, range) and isinstance(cols, range) and rows.step == 1 and cols.step == 1:
+            n, m = len(rows), len(cols)
+            r0, c0 = rows.start, cols.start
+            cons_diags, repeat_diags = [], []
+            for offset, d in zip(self.offsets, self.data):
+                new_offset = offset - c0 + r0
+                if not -n < new_offset < m: continue
+                if isinstance(d, list):
+                    shift = (min(r0, new_offset + c0) - min(0, new_offset)) % len(d)
+                    repeat_diags.append((new_offset, d[shift:] + d[:shift]))
+                else:
+                    cons_diags.append((new_offset, d))
+            return DIA((n, m), cons_diags=cons_diags, repeat_diags=repeat_diags, dtype=self.dtype)
+
+        indptr, indices, data = [0], [], []
+        for i in rows:
+            row_d = self.get_row_data(i)
+            indices.extend(j for j, _ in row_d)
+            data.extend(d for _, d in row_d)
+            indptr.append(len(indices))
+        arrays = select_compressed(indptr, indices, data, range(len(rows)), cols, self.shape[1])
+        return CSR._from_compressed(*arrays, (len(rows), len(cols)), self.dtype)
+
     def get_row_data(self, row_i):
         row_d = []
         for index, data in zip([offset + row_i for offset in self.offsets], self.data):
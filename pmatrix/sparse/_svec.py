@@ -1,9 +1,22 @@
+"""
+Sparse vector.
+
+The nonzeros are stored in two parallel buffers, indices with the sorted positions
+and values with the items, both in the storage backend of DVec: a float vector takes
+16 bytes per nonzero instead of a list of (index, value) tuples.
+"""
+
 from .._core._dvec import DVec
-import operator
+from .._core._broadcast import rsub, rtruediv
+from .._core._storage import make_buffer, cast_buffer, zeros
+from ._compressed import keeps_sparsity, merge_line, map_compressed
+import operator, itertools, bisect, math
 
 class SVec:
+    __slots__ = ("indices", "values", "dtype", "orientation", "length")
+    _format = "svec"
+
     def __init__(self, data, dtype=None, orientation='r', length=None):
-        self._format = "svec"
 
         if isinstance(data, DVec):
             self.from_dvec(data)
@@ -12,16 +25,16 @@ class SVec:
         self.orientation = orientation
         if not isinstance(data, list):
             raise TypeError(f"Vector data must be a list")
-        
+
         if len(data)==0 and length is None:
             raise ValueError("Can not initiate an empty sparse vector without a length")
-        
+
         elif len(data)==0:
-            self.data = []
-            self.length = length
             if dtype is None:
                 dtype = int
             self.dtype = dtype
+            self.indices, self.values = make_buffer([], int), make_buffer([], dtype)
+            self.length = length
 
         elif isinstance(data[0], tuple):
             self.from_indexed(data, length=length)
@@ -29,12 +42,19 @@ class SVec:
         else:
             self.from_dense(data, dtype=dtype)
 
+    @property
+    def data(self):
+        """
+        SVec.data
+        The nonzeros as a list of (index, value) tuples.
+        """
+        return list(zip(self.indices, self.values))
 
     def from_dvec(self, vec:DVec):
         self.dtype = vec.dtype
         self.length = vec.length
         self.orientation = vec.orientation
-        self.data = [(i, d) for i, d in enumerate(vec) if d]
+        self._set_dense(vec._items())
 
     def from_dense(self, data, dtype=None):
         if dtype is None:
@@ -48,70 +68,188 @@ class SVec:
             data = list(map(self.dtype, data))
         except (ValueError, TypeError)  as e:
             raise TypeError(f"Not all data can be converted into {self.dtype.__name__}, {e}")
-        
-        self.data = [(i, d) for i, d in enumerate(data) if d]
+
+        self._set_dense(data)
         self.length = len(data)
-    
+
+    def _set_dense(self, data):
+        # Keeps the nonzeros of a dense sequence of items of type dtype.
+        self.indices = make_buffer(list(itertools.compress(range(len(data)), data)), int)
+        self.values = make_buffer(list(itertools.compress(data, data)), self.dtype)
+
     def from_indexed(self, data, length):
         if length is None:
             raise ValueError(f"Unkown length")
         self.dtype = type(data[0][1])
         if not self.dtype in (int, float, complex, bool): raise TypeError(f"Data must be of type int, float or complex, not {self.dtype}")
-        try:
-            data = [(i, self.dtype(d)) for i, d in data]
-        except (ValueError, TypeError)  as e:
-            raise TypeError(f"Not all data can be converted into {self.dtype.__name__}, {e}")
-    
-        self.data = data
+        if any(a[0] >= b[0] for a, b in itertools.pairwise(data)):
+            data = sorted(data, key=operator.itemgetter(0))
+        indices, values = zip(*data)
+        self.indices = make_buffer(list(indices), int)
+        self.values = cast_buffer(values, self.dtype)
         self.length = length
 
+    @classmethod
+    def _from_parts(cls, indices, values, dtype, orientation, length):
+        # Wraps sorted indices and their nonzero values without checking them.
+        new = cls.__new__(cls)
+        new.indices, new.values = make_buffer(indices, int), cast_buffer(values, dtype)
+        new.dtype, new.orientation, new.length = dtype, orientation, length
+        return new
+
+    def _parts(self):
+        # The sorted indices and the values of the nonzeros.
+        return self.indices, self.values
+
+    def _entry(self, i):
+        # [(i, value)] if i is a nonzero, else [].
+        k = bisect.bisect_left(self.indices, i)
+        return [(i, self.values[k])] if k < len(self.indices) and self.indices[k] == i else []
+
     def get_row_data(self, row_i):
         if self.orientation == 'r' and row_i != 0:
             raise IndexError("Row vector only has 1 row")
         elif self.orientation == 'r':
             return self.data
         else:
-            return [d for d in self.data if d[0] == row_i]
-        
+            return self._entry(row_i)
+
     def get_col_data(self, col_i):
         if self.orientation == 'c' and col_i != 0:
             raise IndexError("column vector only has 1 column")
         elif self.orientation == 'c':
             return self.data
         else:
-            return [d for d in self.data if d[0] == col_i]
-    
+            return self._entry(col_i)
+
+    def __add__(self, other):
+        return self.__match_operator(other, operator.__add__)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self.__match_operator(other, operator.__sub__)
+
+    def __rsub__(self, other):
+        return self.__match_operator(other, rsub)
+
     def __mul__(self, other):
         return self.__match_operator(other, operator.__mul__)
-    
-    def __matmul__(self, other):
-        return sum([d[1] for d in (self * other).data])
 
-    def __match_operator(self, other, opp):
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return self.__match_operator(other, operator.__truediv__)
+
+    def __rtruediv__(self, other):
+        return self.__match_operator(other, rtruediv)
+
+    def __lt__(self, other):
+        return self.__match_operator(other, operator.__lt__)
+
+    def __le__(self, other):
+        return self.__match_operator(other, operator.__le__)
+
+    def __eq__(self, other):
+        return self.__match_operator(other, operator.__eq__)
+
+    def __ne__(self, other):
+        return self.__match_operator(other, operator.__ne__)
+
+    def __ge__(self, other):
+        return self.__match_operator(other, operator.__ge__)
+
+    def __gt__(self, other):
+        return self.__match_operator(other, operator.__gt__)
+
+    __hash__ = None
+
+    def __matmul__(self, other):
+        """
+        SVec @ SVec
+        The dot product, summed directly over the common indices without building a product vector.
+        When one vector has far fewer nonzeros than the other, every index of the sparser one is found
+        in the other by galloping: an exponential search from the last match, then a binary search.
+        That is O(nnz_small * log(nnz_large / nnz_small)) instead of O(nnz_small + nnz_large).
+        """
         if not isinstance(other, SVec):
             return NotImplemented
         if self.length != other.length:
             raise IndexError(f"Length {self.length} and {other.length} are not equal:")
-        i, j, opp_list = 0, 0, []
-        while i < len(self.data) and j < len(other.data):
-            if self.data[i][0] == other.data[j][0]:
-                opp_list.append((self.data[i][0], opp(self.data[i][1], other.data[j][1])))
+        small, large = (self, other) if len(self.indices) <= len(other.indices) else (other, self)
+        n_small, n_large = len(small.indices), len(large.indices)
+        if n_small == 0:
+            return small.dtype(0) * large.dtype(0)
+        if n_small * math.log2(n_large / n_small + 1) < n_large:
+            return self._gallop_dot(small, large)
+        return self._merge_dot(small, large)
+
+    @staticmethod
+    def _merge_dot(a, b):
+        # Walks both sorted index buffers once.
+        a_indices, a_values, b_indices, b_values = a.indices, a.values, b.indices, b.values
+        total = a.dtype(0) * b.dtype(0)
+        i = j = 0
+        n_a, n_b = len(a_indices), len(b_indices)
+        while i < n_a and j < n_b:
+            a_j, b_j = a_indices[i], b_indices[j]
+            if a_j == b_j:
+                total += a_values[i] * b_values[j]
                 i += 1
                 j += 1
-            elif self.data[i][0] > other.data[j][0]:
-                j += 1
+            elif a_j < b_j:
+                i += 1
             else:
-                i +=1
-        return SVec(opp_list, orientation=self.orientation, length=self.length)
-    
+                j += 1
+        return total
+
+    @staticmethod
+    def _gallop_dot(small, large):
+        # Every index of small is searched in large, starting from the position of the previous one.
+        indices, values = large.indices, large.values
+        total = small.dtype(0) * large.dtype(0)
+        lo, hi = 0, len(indices)
+        for j, a in zip(small.indices, small.values):
+            step = 1
+            while lo + step < hi and indices[lo + step] < j:
+                step *= 2
+            lo = bisect.bisect_left(indices, j, lo + step // 2, min(lo + step + 1, hi))
+            if lo == hi:
+                break
+            if indices[lo] == j:
+                total += a * values[lo]
+        return total
+
+    def __match_operator(self, other, opp):
+        # The result stays sparse when opp maps the zeros to 0, like adding or comparing two SVecs, or scaling by a scalar.
+        # Two SVecs are merged over the union of their indices, or the common ones for *, in O(nnz_a + nnz_b).
+        # Otherwise, like adding a scalar, the result is a DVec.
+        zero = self.dtype(0)
+        if isinstance(other, SVec):
+            if self.length != other.length:
+                raise IndexError(f"Length {self.length} and {other.length} are not equal:")
+            if not keeps_sparsity(opp, zero, other.dtype(0)):
+                return opp(self.to_dvec(), other.to_dvec())
+            indices, data = merge_line(opp, *self._parts(), *other._parts(), zero, other.dtype(0))
+            return SVec._from_parts(indices, data, type(opp(self.dtype(1), other.dtype(1))), self.orientation, self.length)
+        if isinstance(other, (int, float, complex, bool)):
+            if not keeps_sparsity(opp, zero, other):
+                return opp(self.to_dvec(), other)
+            indices, data = self._parts()
+            _, indices, data = map_compressed(opp, [0, len(indices)], indices, data, other)
+            return SVec._from_parts(indices, data, type(opp(self.dtype(1), other)), self.orientation, self.length)
+        if isinstance(other, DVec):
+            return opp(self.to_dvec(), other)
+        return NotImplemented
+
     def sum(self):
-        return sum([d[1] for d in self.data])
+        return sum(self.values)
 
     def to_dvec(self):
-        dense_data = [0] * self.length
-        for i, d in self.data:
+        dense_data = zeros(self.length, self.dtype)
+        for i, d in zip(self.indices, self.values):
             dense_data[i] = d
-        return DVec(dense_data, dtype=self.dtype, orientation=self.orientation)
-    
+        return DVec._from_buffer(dense_data, self.dtype, self.orientation)
+
     def __str__(self):
         return self.data.__str__()